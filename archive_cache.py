@@ -0,0 +1,282 @@
+# StudyShareBot: категория не іздеу нәтижелерін zip архиві ретінде жіберу (ағынмен құрастыру, бөліктер, кэш)
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from file_store import object_key
+from metrics import MetricsRegistry
+from storage_backend import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PART_SIZE = 49 * 1024 * 1024  # Telegram Bot API-дің 50MB жүктеу шегінен төмен
+ENTRY_OVERHEAD = 256  # Бір файлдың zip тақырыптары (local header, central directory, zip64), атаудан бөлек
+COPY_CHUNK_SIZE = 1024 * 1024
+DISCARD_GRACE = 300  # секунд: ескірген архив файлдары жіберіліп жатқан болуы мүмкін, бірден жойылмайды
+STALE_FILE_AGE = 86400  # Іске қосылғанда осыдан ескі қалдық файлдар жойылады
+# Мазмұны қазірдің өзінде сығылған форматтар қайта сығылмайды (CPU үнемі, өлшемі бәрібір өзгермейді)
+STORED_EXTENSIONS = frozenset({".zip", ".rar", ".7z", ".gz", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp3",
+                               ".mp4", ".mov", ".docx", ".xlsx", ".pptx", ".pdf"})
+
+
+class ArchiveItem(NamedTuple):
+    category: str
+    name: str
+    size: int
+    mtime: float
+
+
+@dataclass
+class ArchivePart:
+    path: Path
+    size: int
+    files: int
+    tg_file_id: Optional[str] = None  # Бір рет жіберілгеннен кейін қайта жүктелмейді
+
+
+@dataclass
+class Archive:
+    version: Any
+    parts: List[ArchivePart]
+    files: int
+    skipped: List[str] = field(default_factory=list)  # Бір бөлікке сыймайтын не табылмаған файлдар
+
+    @property
+    def size(self) -> int:
+        return sum(part.size for part in self.parts)
+
+
+class _BuildCancelled(Exception):
+    """Архивті күтетін ешкім қалмады: құрастыру келесі файлдың алдында тоқтатылады."""
+
+
+class _SharedBuild:
+    __slots__ = ("task", "stop", "waiters")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.stop = threading.Event()
+        self.waiters = 0
+
+
+def plan_parts(items: Sequence[ArchiveItem], part_size: int, flat: bool) -> Tuple[List[List[ArchiveItem]], List[str]]:
+    """
+    Файлдарды ретімен бөліктерге топтайды: әр бөліктің болжамды өлшемі part_size-тан аспайды.
+    Әр бөлік - өз алдына толық zip (көптомды архивті кез келген бағдарлама аша бермейді).
+    """
+    groups, skipped, current, current_size = [], [], [], 0
+    for item in items:
+        cost = item.size + ENTRY_OVERHEAD + 2 * len(arcname(item, flat).encode("utf-8"))
+        if cost > part_size:
+            skipped.append(arcname(item, flat))
+            continue
+        if current and current_size + cost > part_size:
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(item)
+        current_size += cost
+    if current:
+        groups.append(current)
+    return groups, skipped
+
+
+def arcname(item: ArchiveItem, flat: bool) -> str:
+    return item.name if flat else f"{item.category}/{item.name}"
+
+
+class ArchiveCache:
+    """
+    Архивтер бөлек ағындар пулында (файлдар пулын бөгемейді) бөліктермен құрастырылады: әр файл
+    бэкендтен COPY_CHUNK_SIZE бөліктермен оқылып, zip-ке тікелей жазылады, жадта толық буфер жоқ.
+    Дайын архив кілт бойынша (категория не іздеу нәтижелері) нұсқасымен бірге сақталады: нұсқа
+    өзгермесе, қайта сұрау ешқандай дискілік жұмыссыз орындалады, ал жіберілген бөліктердің Telegram
+    file_id-і сақталғандықтан қайта жүктелмейді. Бір архивті бірнеше пайдаланушы бір мезгілде сұраса,
+    ол бір рет құрастырылады; құрастыру соңғы күтуші бас тартқанда ғана тоқтатылады. Кэштің
+    жалпы өлшемі max_bytes-тан асса, ең ескі архивтер жойылады.
+    """
+
+    def __init__(self, backend: StorageBackend, directory: Path, part_size: int = DEFAULT_PART_SIZE,
+                 max_bytes: int = 2 * 1024 ** 3, max_workers: int = 1, registry: Optional[MetricsRegistry] = None):
+        self.backend = backend
+        self.directory = directory
+        self.part_size = part_size
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="archive")
+        self._archives: "OrderedDict[Hashable, Archive]" = OrderedDict()
+        self._building: Dict[Tuple[Hashable, Any], _SharedBuild] = {}
+        # Жою уақыты келмеген ескі архивтер: id -> (архив, жою таймері)
+        self._discarded: Dict[int, Tuple[Archive, asyncio.TimerHandle]] = {}
+        self._closed = False
+        if registry is not None:
+            self.requests = registry.counter("archive_requests_total", "Архив сұраныстары", ("result",))
+            self.build_seconds = registry.histogram("archive_build_seconds", "Архивті құрастыру уақыты")
+            registry.gauge("archive_cache_bytes", "Кэштегі архивтердің жалпы өлшемі", func=lambda: self.size)
+        else:
+            self.requests = self.build_seconds = None
+
+    @property
+    def size(self) -> int:
+        return sum(archive.size for archive in list(self._archives.values()))
+
+    def _count(self, result: str):
+        if self.requests is not None:
+            self.requests.inc(result)
+
+    # --- Іске қосу және тоқтату ---
+    def prepare(self):
+        """Директорияны жасайды және алдыңғы іске қосылудан қалған ескі файлдарды жояды."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and now - entry.stat().st_mtime > STALE_FILE_AGE:
+                    os.unlink(entry.path)
+
+    def close(self):
+        self._closed = True
+        # Таймерлер тоқтатылады: әйтпесе олар жабылған пулға тапсырма жіберіп, RuntimeError береді
+        for _, timer in self._discarded.values():
+            timer.cancel()
+        self.executor.shutdown(wait=True)
+        for archive in list(self._archives.values()) + [archive for archive, _ in self._discarded.values()]:
+            self._remove_files(archive)
+        self._archives.clear()
+        self._discarded.clear()
+
+    # --- Кэш ---
+    async def get(self, key: Hashable, version: Any, items: Sequence[ArchiveItem],
+                  flat: bool = True) -> Tuple[Archive, bool]:
+        """
+        (архив, кэштен алынды ма) қайтарады. version ретінде категорияның каталог нұсқасы
+        (не іздеу нәтижесіндегі категориялар нұсқаларының кортежі) беріледі.
+        """
+        archive = self._archives.get(key)
+        if archive is not None and archive.version == version:
+            self._archives.move_to_end(key)
+            self._count("cache")
+            return archive, True
+        build_key = (key, version)
+        build = self._building.get(build_key)
+        if build is not None:  # Дәл осы архив құрастырылуда: нәтижесін бөлісеміз
+            self._count("shared")
+        else:
+            build = self._building[build_key] = _SharedBuild()
+            build.task = asyncio.create_task(self._build_and_store(key, version, list(items), flat, build.stop))
+            build.task.add_done_callback(lambda _: self._forget(build_key, build))
+        build.waiters += 1
+        try:
+            # Бір күтушінің бас тартуы басқалардың құрастыруын тоқтатпайды
+            return await asyncio.shield(build.task), False
+        finally:
+            build.waiters -= 1
+            if not build.waiters and not build.task.done():
+                self._forget(build_key, build)  # Жаңа сұраныс тоқтатылып жатқан құрастыруға қосылмайды
+                build.stop.set()
+                build.task.cancel()
+
+    def _forget(self, build_key: Tuple[Hashable, Any], build: _SharedBuild):
+        if self._building.get(build_key) is build:
+            del self._building[build_key]
+
+    async def _build_and_store(self, key: Hashable, version: Any, items: List[ArchiveItem], flat: bool,
+                               stop: threading.Event) -> Archive:
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self._build, version, items, flat, stop)
+        try:
+            archive = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Ағын бірден тоқтамайды: ол аяқтаған соң кэшке түспеген бөліктерді жоямыз
+            future.add_done_callback(self._remove_orphan)
+            raise
+        if self.build_seconds is not None:
+            self.build_seconds.observe(time.perf_counter() - started)
+        self._count("built")
+        self._store(key, archive)
+        return archive
+
+    def _remove_orphan(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is None:
+            self._remove_files(future.result())
+
+    def _store(self, key: Hashable, archive: Archive):
+        old = self._archives.pop(key, None)
+        if old is not None:
+            self._discard(old)
+        self._archives[key] = archive
+        total = self.size
+        while total > self.max_bytes and len(self._archives) > 1:
+            _, evicted = self._archives.popitem(last=False)
+            total -= evicted.size
+            self._discard(evicted)
+
+    def _discard(self, archive: Archive):
+        # Ескі бөліктер басқа пайдаланушыға жіберіліп жатқан болуы мүмкін: біраз кейін жоямыз
+        if self._closed:  # close()-тан кейін аяқталған құрастыру: пул жабық, бірден жоямыз
+            self._remove_files(archive)
+            return
+        timer = asyncio.get_running_loop().call_later(DISCARD_GRACE, self._expire, archive)
+        self._discarded[id(archive)] = (archive, timer)
+
+    def _expire(self, archive: Archive):
+        if self._discarded.pop(id(archive), None) is not None:
+            asyncio.get_running_loop().run_in_executor(self.executor, self._remove_files, archive)
+
+    @staticmethod
+    def _remove_files(archive: Archive):
+        for part in archive.parts:
+            try:
+                part.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    # --- Құрастыру (archive пулында) ---
+    def _build(self, version: Any, items: List[ArchiveItem], flat: bool, stop: threading.Event) -> Archive:
+        groups, skipped = plan_parts(items, self.part_size, flat)
+        archive = Archive(version, [], 0, skipped)
+        path = None
+        try:
+            for group in groups:
+                path = self.directory / f"{uuid.uuid4().hex}.zip"
+                written = 0
+                with open(path, "wb") as raw, zipfile.ZipFile(raw, "w") as zf:
+                    for item in group:
+                        if stop.is_set():
+                            raise _BuildCancelled()
+                        if self._write_entry(zf, item, flat):
+                            written += 1
+                        else:
+                            archive.skipped.append(arcname(item, flat))
+                if not written:
+                    path.unlink()
+                    continue
+                archive.parts.append(ArchivePart(path, path.stat().st_size, written))
+                archive.files += written
+                path = None
+        except BaseException:
+            self._remove_files(archive)
+            if path is not None:  # Жазылып жатқан бөлік әлі archive.parts-та жоқ
+                path.unlink(missing_ok=True)
+            raise
+        return archive
+
+    def _write_entry(self, zf: zipfile.ZipFile, item: ArchiveItem, flat: bool) -> bool:
+        try:
+            source = self.backend.get(object_key(item.category, item.name))
+        except FileNotFoundError:  # Тізім алынғаннан кейін жойылған
+            return False
+        info = zipfile.ZipInfo(arcname(item, flat), date_time=time.localtime(max(item.mtime, 315532800))[:6])
+        stored = os.path.splitext(item.name)[1].lower() in STORED_EXTENSIONS
+        info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        with source, zf.open(info, "w") as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        return True
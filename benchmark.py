@@ -0,0 +1,387 @@
+# StudyShareBot: офлайн жүктеме генераторы және кідіріс бенчмаркы (Telegram-сыз, mock Bot сессиясы)
+#
+# Қолдану:
+#   python benchmark.py --files 10000 --users 20 --iterations 50 --output bench.json
+#   python benchmark.py --files 10000 --compare bench.json   # алдыңғы нәтижемен салыстыру
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, types
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetFile, SendDocument, TelegramMethod
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger("benchmark")
+
+BENCH_TOKEN = "123456789:BENCHMARKBENCHMARKBENCHMARKBENCHMAR"
+BENCH_USER_BASE = 10_000
+CATEGORIES = ["Математика", "Физика", "Бағдарламалау", "Диплом жұмыстары", "Информатика", "IT", "Ағылшын тілі",
+              "Тарих"]
+NAME_WORDS = ["дәріс", "зертханалық", "емтихан", "конспект", "lecture", "lab", "exam", "notes", "алгебра",
+              "геометрия", "механика", "python", "java", "деректер", "базасы", "желілер", "тарих", "grammar",
+              "курстық", "жоба", "силлабус", "тест", "шпаргалка", "оптика"]
+UPLOAD_PAYLOAD_SIZE = 256 * 1024
+# Сценарийлер және олардың салмағы (бір итерацияда бір сценарий таңдалады)
+SCENARIO_WEIGHTS = {"browse": 4, "search": 4, "upload": 1, "stats": 1, "archive": 1}
+# Өңделіп жатқан жаңартудың handler атауы (handler ішінде логқа жазылған қателерді соған жатқызу үшін)
+current_label: ContextVar[Optional[str]] = ContextVar("current_label", default=None)
+
+
+class MockSession(BaseSession):
+    """
+    Telegram Bot API-ға жүгінбейтін сессия: әр әдіске оның қайтару түріне сай жалған жауап береді,
+    InputFile мазмұнын қоймадан оқиды (нақты жіберудегідей) және соңғы inline-батырмаларды
+    чат бойынша есте сақтайды, сондықтан бенчмарк келесі қадамды нақты callback_data-мен жасай алады.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.payloads: Dict[str, bytes] = {}  # Telegram file_id -> жүктелетін файл мазмұны
+        self.last_buttons: Dict[int, List[str]] = {}
+        self.bytes_sent = 0
+        self._message_ids = itertools.count(1)
+
+    def _message(self, chat_id: Any, **extra) -> types.Message:
+        chat_id = chat_id if isinstance(chat_id, int) else 0
+        return types.Message(message_id=next(self._message_ids), date=datetime.now(),
+                             chat=types.Chat(id=chat_id, type="private"), **extra)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = getattr(method, "chat_id", None)
+        markup = getattr(method, "reply_markup", None)
+        if isinstance(markup, InlineKeyboardMarkup) and isinstance(chat_id, int):
+            self.last_buttons[chat_id] = [button.callback_data for row in markup.inline_keyboard for button in row
+                                          if button.callback_data]
+        if isinstance(method, GetFile):
+            payload = self.payloads.get(method.file_id, b"")
+            return types.File(file_id=method.file_id, file_unique_id=method.file_id, file_size=len(payload),
+                              file_path=f"documents/{method.file_id}").as_(bot)
+        if isinstance(method, SendDocument):
+            document = method.document
+            if not isinstance(document, str):
+                async for chunk in document.read(bot):
+                    self.bytes_sent += len(chunk)
+            file_id = document if isinstance(document, str) else f"tg-{next(self._message_ids)}"
+            return self._message(chat_id, document=types.Document(file_id=file_id, file_unique_id=file_id)).as_(bot)
+        if method.__returning__ is types.Message:
+            return self._message(chat_id).as_(bot)  # Нақты сессиядағыдай bot-қа байланған жауап
+        return True  # bool және Union[Message, bool] әдістері
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        self.calls["stream_content"] += 1
+        payload = self.payloads.get(url.rsplit("/", 1)[-1], b"")
+        for offset in range(0, len(payload), chunk_size):
+            yield payload[offset:offset + chunk_size]
+
+    async def close(self):
+        pass
+
+
+class ErrorLogCounter(logging.Handler):
+    """Handler ұстап, тек логқа жазған қателерді (ERROR және одан жоғары) сол handler-дің есебіне қосады."""
+
+    def __init__(self, errors: Counter):
+        super().__init__(logging.ERROR)
+        self.errors = errors
+
+    def emit(self, record: logging.LogRecord):
+        label = current_label.get()
+        if label is not None:
+            self.errors[label] += 1
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def generate_files(files_dir: Path, count: int, seed: int):
+    """files_dir ішінде категориялар бойынша count шағын PDF файл жасайды."""
+    rnd = random.Random(seed)
+    for category in CATEGORIES:
+        (files_dir / category).mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        name = "_".join(rnd.sample(NAME_WORDS, 3)) + f"_{i}.pdf"
+        with open(files_dir / category / name, "wb") as f:
+            f.write(b"%PDF-1.4\n" + str(i).encode() + b"\n" + os.urandom(32))
+
+
+def write_config(base_dir: Path, users: int):
+    admin_ids = ",".join(str(BENCH_USER_BASE + i) for i in range(users))
+    (base_dir / "config.ini").write_text(
+        "[Bot]\n"
+        f"token = {BENCH_TOKEN}\n"
+        f"admin_ids = {admin_ids}\n\n"
+        "[Files]\n"
+        f"max_file_size = {10 * UPLOAD_PAYLOAD_SIZE}\n"
+        "allowed_extensions = .pdf,.docx,.txt\n\n"
+        "[General]\n"
+        f"categories = {','.join(CATEGORIES)}\n\n"
+        "[RateLimit]\n"
+        "enabled = false\n", encoding="utf-8")  # Виртуал пайдаланушылар адамнан әлдеқайда жылдам
+
+
+class VirtualUser:
+    """Бір пайдаланушының сценарийлерін Update объектілері ретінде dp.feed_update арқылы жібереді."""
+
+    def __init__(self, bench: "Benchmark", index: int):
+        self.bench = bench
+        self.user_id = BENCH_USER_BASE + index
+        self.rnd = random.Random(bench.seed + index)
+        self._ids = itertools.count(1)
+
+    def _user(self) -> Dict[str, Any]:
+        return {"id": self.user_id, "is_bot": False, "first_name": "Bench", "username": f"bench{self.user_id}"}
+
+    def _chat(self) -> Dict[str, Any]:
+        return {"id": self.user_id, "type": "private"}
+
+    def _message(self, **fields) -> Dict[str, Any]:
+        return {"message_id": next(self._ids), "date": int(time.time()), "chat": self._chat(), "from": self._user(),
+                **fields}
+
+    async def send(self, label: str, **message_fields):
+        await self.bench.feed(label, {"update_id": next(self.bench.update_ids),
+                                      "message": self._message(**message_fields)})
+
+    async def click(self, label: str, data: str):
+        await self.bench.feed(label, {"update_id": next(self.bench.update_ids), "callback_query": {
+            "id": str(next(self._ids)), "from": self._user(), "chat_instance": "bench", "data": data,
+            "message": self._message(text="...")}})
+
+    def buttons(self, prefix: str) -> List[str]:
+        return [data for data in self.bench.session.last_buttons.get(self.user_id, []) if data.startswith(prefix)]
+
+    async def browse(self):
+        await self.send("show_categories_for_listing", text="/list")
+        await self.click("list_files_in_category", f"list_idx_{self.rnd.randrange(len(CATEGORIES))}")
+        pages = self.buttons("page_list_")
+        if pages:
+            await self.click("show_page_files", pages[-1])
+        downloads = self.buttons("download_")
+        if downloads:
+            await self.click("download_file_cmd", self.rnd.choice(downloads))
+
+    async def search(self):
+        await self.send("search_start_cmd", text="/search")
+        await self.send("perform_search_cmd", text=" ".join(self.rnd.sample(NAME_WORDS, self.rnd.randint(1, 2))))
+        pages = self.buttons("page_search_")
+        if pages:
+            await self.click("show_search_page", pages[-1])
+        downloads = self.buttons("download_")
+        if downloads:
+            await self.click("download_file_cmd", self.rnd.choice(downloads))
+
+    async def archive(self):
+        await self.send("show_categories_for_listing", text="/list")
+        await self.click("list_files_in_category", f"list_idx_{self.rnd.randrange(len(CATEGORIES))}")
+        archives = self.buttons("zip_")
+        if not archives:
+            return
+        await self.click("download_archive_cmd", archives[0])
+        # Архив фондық тапсырмада жіберіледі: оның толық уақытын бөлек өлшейміз
+        task = self.bench.main.archive_jobs.get(self.user_id)
+        if task is not None:
+            started = time.perf_counter()
+            await asyncio.gather(task, return_exceptions=True)
+            self.bench.latencies["send_archive"].append(time.perf_counter() - started)
+
+    async def upload(self):
+        await self.send("upload_start_cmd", text="/upload")
+        await self.click("category_chosen", f"category_idx_{self.rnd.randrange(len(CATEGORIES))}")
+        file_id = f"bench-{self.user_id}-{next(self._ids)}"
+        payload = b"%PDF-1.4\n" + os.urandom(UPLOAD_PAYLOAD_SIZE)
+        self.bench.session.payloads[file_id] = payload
+        await self.send("handle_file", document={
+            "file_id": file_id, "file_unique_id": file_id, "file_size": len(payload),
+            "file_name": "_".join(self.rnd.sample(NAME_WORDS, 2)) + ".pdf"})
+
+    async def stats(self):
+        await self.send("show_stats_cmd", text="/stats")
+        await self.send("show_all_stats_cmd", text="/allstats")
+
+    async def run(self, iterations: int, scenarios: List[str]):
+        weights = [SCENARIO_WEIGHTS[s] for s in scenarios]
+        for _ in range(iterations):
+            await getattr(self, self.rnd.choices(scenarios, weights)[0])()
+
+
+class Benchmark:
+    def __init__(self, main_module, session: MockSession, seed: int):
+        self.main = main_module
+        self.session = session
+        self.seed = seed
+        self.update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+
+    async def feed(self, label: str, raw: Dict[str, Any]):
+        update = types.Update.model_validate(raw, context={"bot": self.main.bot})
+        token = current_label.set(label)
+        started = time.perf_counter()
+        try:
+            await self.main.dp.feed_update(self.main.bot, update)
+        except Exception as e:
+            self.errors[label] += 1
+            logger.debug(f"{label}: {e}")
+        finally:
+            current_label.reset(token)
+        self.latencies[label].append(time.perf_counter() - started)
+
+
+def summarize(latencies: List[float], errors: int) -> Dict[str, float]:
+    values = sorted(latencies)
+    total = sum(values)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "ops_per_sec": len(values) / total if total else 0.0,  # Бір ағындағы өткізу қабілеті
+        "mean_ms": total / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    base_dir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="studyshare-bench-"))
+    base_dir.mkdir(parents=True, exist_ok=True)
+    files_dir = base_dir / "files"
+    generate_seconds = 0.0
+    if not files_dir.exists():  # Бар жұмыс директориясы қайта қолданылады (үлкен каталогтар үшін)
+        started = time.perf_counter()
+        generate_files(files_dir, args.files, args.seed)
+        generate_seconds = time.perf_counter() - started
+        logger.info(f"{args.files} файл жасалды: {generate_seconds:.1f}s ({files_dir})")
+    write_config(base_dir, args.users)
+
+    # main модулі жолдарды импорт кезінде анықтайды, сондықтан алдымен ортаны дайындаймыз
+    os.environ["STUDYSHARE_BASE_DIR"] = str(base_dir)
+    os.chdir(base_dir)
+    sys.path.insert(0, str(Path(__file__).parent))
+    import main
+    logging.getLogger().setLevel(logging.WARNING)  # Бот логтары өлшемге әсер етпеуі үшін
+
+    session = MockSession(latency=args.api_latency / 1000)
+    # main.py сессияға тіркеген request middleware-лер (шығыс кезек, жіберу шектегіші) сақталады,
+    # әйтпесе өлшем нақты жіберу жолын айналып өтер еді
+    for middleware in main.bot.session.middleware:
+        session.middleware(middleware)
+    main.bot.session = session
+    started = time.perf_counter()
+    await main.init_storage()
+    load_seconds = time.perf_counter() - started
+
+    bench = Benchmark(main, session, args.seed)
+    error_counter = ErrorLogCounter(bench.errors)
+    logging.getLogger().addHandler(error_counter)
+    users = [VirtualUser(bench, i) for i in range(args.users)]
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIO_WEIGHTS)
+    started = time.perf_counter()
+    await asyncio.gather(*(user.run(args.iterations, scenarios) for user in users))
+    wall_seconds = time.perf_counter() - started
+    await main.on_shutdown(main.dp)  # Фондық тапсырмалардың (архив) қателері де осы уақытқа дейін есептеледі
+    logging.getLogger().removeHandler(error_counter)
+
+    total_updates = sum(len(v) for v in bench.latencies.values())
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "files": sum(main.catalog.count(category) for category in main.CATEGORIES),
+            "users": args.users,
+            "iterations": args.iterations,
+            "scenarios": scenarios,
+            "api_latency_ms": args.api_latency,
+            "seed": args.seed,
+            "workdir": str(base_dir),
+        },
+        "generate_seconds": generate_seconds,
+        "startup_seconds": load_seconds,
+        "wall_seconds": wall_seconds,
+        "updates": total_updates,
+        "throughput_updates_per_sec": total_updates / wall_seconds if wall_seconds else 0.0,
+        "download_bytes": session.bytes_sent,
+        "api_calls": dict(session.calls),
+        "handlers": {label: summarize(values, bench.errors[label]) for label, values in sorted(bench.latencies.items())},
+    }
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"\nФайлдар: {result['meta']['files']}, пайдаланушылар: {result['meta']['users']}, "
+          f"іске қосу: {result['startup_seconds']:.2f}s, "
+          f"өткізу қабілеті: {result['throughput_updates_per_sec']:.1f} update/s")
+    header = f"{'handler':32} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    if baseline:
+        header += f" {'Δp50':>8} {'Δp95':>8}"
+    print(header)
+    for label, s in result["handlers"].items():
+        line = (f"{label:32} {s['count']:>7} {s['errors']:>5} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+                f"{s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+        old = (baseline or {}).get("handlers", {}).get(label)
+        if old:
+            delta = lambda key: (s[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            line += f" {delta('p50_ms'):>+7.1f}% {delta('p95_ms'):>+7.1f}%"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="StudyShareBot офлайн бенчмаркы")
+    parser.add_argument("--files", type=int, default=1000, help="жасалатын файлдар саны (1k-1M)")
+    parser.add_argument("--users", type=int, default=10, help="параллель виртуал пайдаланушылар")
+    parser.add_argument("--iterations", type=int, default=20, help="әр пайдаланушының сценарийлер саны")
+    parser.add_argument("--scenarios", default="", help=f"үтір арқылы: {','.join(SCENARIO_WEIGHTS)}")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="mock Bot API кідірісі, мс")
+    parser.add_argument("--workdir", default="", help="жұмыс директориясы (бар болса, файлдар қайта жасалмайды)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="нәтиже JSON файлы")
+    parser.add_argument("--compare", default="", help="салыстыруға арналған алдыңғы нәтиже JSON файлы")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    if args.scenarios and not set(args.scenarios.split(",")) <= set(SCENARIO_WEIGHTS):
+        sys.exit(f"Белгісіз сценарий: {args.scenarios}")
+    output = Path(args.output).resolve()
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    result = asyncio.run(run_benchmark(args))
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_report(result, baseline)
+    print(f"\nНәтиже сақталды: {output}")
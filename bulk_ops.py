@@ -0,0 +1,193 @@
+# StudyShareBot: әкімшінің жаппай операциялары (жою, категорияға көшіру, тазалау) бір фондық тапсырма ретінде
+import fnmatch
+import logging
+import re
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from catalog import CatalogEntry, FileCatalog
+from file_store import AsyncFileStore
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100  # Бір топта пулға жіберілетін файлдар
+PROGRESS_INTERVAL = 3.0  # секунд, статус хабарламасын өңдеу жиілігі
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3}
+AGE_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400}
+
+ACTION_DELETE = "delete"
+ACTION_MOVE = "move"
+
+
+class BulkArgsError(ValueError):
+    pass
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)b?", text.strip().lower())
+    if not match:
+        raise BulkArgsError(f"Өлшем дұрыс емес: {text} (мысалы: 500KB, 20MB)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) + "b" if match.group(2) else ""])
+
+
+def parse_age(text: str) -> float:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([hdw]?)", text.strip().lower())
+    if not match:
+        raise BulkArgsError(f"Мерзім дұрыс емес: {text} (мысалы: 12h, 30d, 8w)")
+    return float(match.group(1)) * AGE_UNITS[match.group(2) or "d"]
+
+
+@dataclass
+class FileFilter:
+    """Файлдарды таңдау шарттары: атау үлгілері (glob) және жасы мен өлшемі бойынша шектер."""
+    patterns: List[str] = field(default_factory=list)
+    older_than: Optional[float] = None  # секунд
+    larger_than: Optional[int] = None  # байт
+    smaller_than: Optional[int] = None
+
+    @property
+    def empty(self) -> bool:
+        return not self.patterns and self.older_than is None and self.larger_than is None \
+            and self.smaller_than is None
+
+    def matches(self, entry: CatalogEntry, now: float) -> bool:
+        if self.patterns:
+            name = entry.name.lower()
+            # Нақты атау да үлгі ретінде жарайды ("[1]" сияқты glob таңбалары бар атаулар үшін)
+            if not any(name == pattern.lower() or fnmatch.fnmatchcase(name, pattern.lower())
+                       for pattern in self.patterns):
+                return False
+        if self.older_than is not None and now - entry.mtime < self.older_than:
+            return False
+        if self.larger_than is not None and entry.size <= self.larger_than:
+            return False
+        if self.smaller_than is not None and entry.size >= self.smaller_than:
+            return False
+        return True
+
+    def select(self, entries: Sequence[CatalogEntry], now: Optional[float] = None) -> List[CatalogEntry]:
+        now = time.time() if now is None else now
+        return [entry for entry in entries if self.matches(entry, now)]
+
+
+def parse_bulk_args(text: str) -> Tuple[List[str], FileFilter, bool]:
+    """
+    Команда аргументтерін талдау. Тырмақшадағы атаулар бір аргумент болып саналады.
+    older=30d, larger=10MB, smaller=1KB - сүзгілер; dry - тек алдын ала қарау.
+    (позициялық аргументтер, сүзгі, dry) қайтарады; позициялық аргументтерді шақырушы бөледі.
+    """
+    try:
+        tokens = shlex.split(text)
+    except ValueError as e:
+        raise BulkArgsError(f"Тырмақшалар жабылмаған: {e}")
+    positional, file_filter, dry = [], FileFilter(), False
+    for token in tokens:
+        key, sep, value = token.partition("=")
+        key = key.lower()
+        if token.lower() == "dry":
+            dry = True
+        elif sep and key == "older":
+            file_filter.older_than = parse_age(value)
+        elif sep and key == "larger":
+            file_filter.larger_than = parse_size(value)
+        elif sep and key == "smaller":
+            file_filter.smaller_than = parse_size(value)
+        else:
+            positional.append(token)
+    return positional, file_filter, dry
+
+
+@dataclass
+class BulkResult:
+    matched: int = 0
+    done: int = 0
+    failed: int = 0
+    drive_synced: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+# (әрекет, бастапқы категория, мақсатты категория, [(ескі атау, жаңа атау не None)]) -> Drive-та өңделгендер саны
+DriveSync = Callable[[str, str, Optional[str], List[Tuple[str, Optional[str]]]], int]
+
+
+class BulkJob:
+    """
+    Таңдалған файлдарды BATCH_SIZE-тық топтармен өңдейді: әр топтың дискідегі/қоймадағы жұмысы
+    AsyncFileStore пулына бір рет жіберіледі, каталог пен тізілім топ бойынша бір транзакцияда
+    жаңартылады. Drive-тағы көшірмелер соңында бір рет, batch сұраныстарымен синхрондалады.
+    progress(өңделген, барлығы) PROGRESS_INTERVAL сайын шақырылады.
+    """
+
+    def __init__(self, file_store: AsyncFileStore, catalog: FileCatalog, action: str,
+                 selection: Dict[str, List[CatalogEntry]], target: Optional[str] = None,
+                 progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+                 drive_sync: Optional[DriveSync] = None):
+        if action == ACTION_MOVE and not target:
+            raise ValueError("Көшіру үшін мақсатты категория керек")
+        self.file_store = file_store
+        self.catalog = catalog
+        self.action = action
+        self.selection = selection
+        self.target = target
+        self.progress = progress
+        self.drive_sync = drive_sync
+        self.total = sum(len(entries) for entries in selection.values())
+
+    async def run(self) -> BulkResult:
+        result = BulkResult(matched=self.total)
+        processed, last_report = 0, time.monotonic()
+        for category, entries in self.selection.items():
+            changed: List[Tuple[str, Optional[str]]] = []
+            for start in range(0, len(entries), BATCH_SIZE):
+                chunk = entries[start:start + BATCH_SIZE]
+                try:
+                    changed.extend(await self._run_chunk(category, chunk, result))
+                except Exception as e:
+                    logger.error(f"Жаппай операция қатесі ({self.action}, {category}): {e}")
+                    result.errors.append(f"{category}: {e}")
+                processed += len(chunk)
+                if self.progress and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await self._report(processed)
+            result.done += len(changed)
+            if changed and self.drive_sync is not None:
+                try:
+                    result.drive_synced += await self.file_store.run(self.drive_sync, self.action, category,
+                                                                     self.target, changed)
+                except Exception as e:
+                    logger.error(f"Drive синхрондау қатесі ({self.action}, {category}): {e}")
+                    result.errors.append(f"Drive: {e}")
+        result.failed = result.matched - result.done
+        return result
+
+    async def _report(self, processed: int):
+        try:
+            await self.progress(processed, self.total)
+        except Exception as e:
+            logger.debug(f"Прогресс хабарламасын жаңарту мүмкін болмады: {e}")
+
+    async def _run_chunk(self, category: str, chunk: List[CatalogEntry],
+                         result: BulkResult) -> List[Tuple[str, Optional[str]]]:
+        names = [entry.name for entry in chunk]
+        if self.action == ACTION_DELETE:
+            deleted = await self.file_store.delete_many(category, names)
+            await self._update_catalog(result, category, deleted)
+            return [(name, None) for name in deleted]
+        uploaders = {entry.name: entry.uploader for entry in chunk}
+        moved = await self.file_store.move_many(category, names, self.target)
+        added = [CatalogEntry(stat.name, stat.size, stat.mtime, uploaders.get(old_name)) for old_name, stat in moved]
+        await self._update_catalog(result, category, [old_name for old_name, _ in moved])
+        await self._update_catalog(result, self.target, (), added)
+        return [(old_name, stat.name) for old_name, stat in moved]
+
+    async def _update_catalog(self, result: BulkResult, category: str, removed: Sequence[str] = (),
+                              added: Sequence[CatalogEntry] = ()):
+        try:
+            await self.file_store.run(self.catalog.apply_batch, category, removed, added)
+        except Exception as e:
+            # Қоймадағы өзгеріс болып қойды: каталог одан айырылмауы үшін категорияны қайта сканерлейміз
+            logger.error(f"Каталогты жаңарту қатесі ({self.action}, {category}): {e}")
+            result.errors.append(f"{category}: {e}")
+            await self.file_store.run(self.catalog.refresh, [category], True)
@@ -0,0 +1,306 @@
+# StudyShareBot: файлдар каталогының жадтағы индексі
+import bisect
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from storage_backend import ChangeStamp, StorageBackend, StorageError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CatalogEntry:
+    name: str
+    size: int
+    mtime: float
+    uploader: Optional[int] = None
+
+
+class _CategoryIndex:
+    """Бір категорияның атау бойынша сұрыпталған файлдар тізімі."""
+
+    def __init__(self):
+        self.names: List[str] = []  # bisect үшін сұрыпталған атаулар
+        self.entries: Dict[str, CatalogEntry] = {}
+        self.dir_mtime: Optional[ChangeStamp] = 0.0  # Соңғы сканерлеу белгісі (refresh() салыстырады)
+        self.saved_stamp: Optional[ChangeStamp] = 0.0  # Индекс файлына жазылатын белгі
+        self.version: int = 0
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[CatalogEntry], dir_mtime: Optional[ChangeStamp]) -> "_CategoryIndex":
+        """Толық сканерлеу не индекс файлы үшін: атаулар бір рет сұрыпталады (insort-тың O(n²) орнына)."""
+        index = cls()
+        index.entries = {entry.name: entry for entry in entries}
+        index.names = sorted(index.entries)
+        index.dir_mtime = index.saved_stamp = dir_mtime
+        return index
+
+    def insert(self, entry: CatalogEntry):
+        if entry.name not in self.entries:
+            bisect.insort(self.names, entry.name)
+        self.entries[entry.name] = entry
+        self.version += 1
+
+    def remove(self, name: str) -> Optional[CatalogEntry]:
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            pos = bisect.bisect_left(self.names, name)
+            if pos < len(self.names) and self.names[pos] == name:
+                del self.names[pos]
+            self.version += 1
+        return entry
+
+
+class FileCatalog:
+    """
+    Категориялар бойынша файлдар индексі. Бот іске қосылғанда бір рет жүктеледі,
+    кейін жүктеу/жою кезінде инкременттік түрде жаңартылады. Категория тек суық
+    іске қосылуда немесе файлдар боттан тыс өзгергенде (бэкендтің change_stamp белгісі,
+    жергілікті дискіде директория mtime) қайта сканерленеді.
+    """
+
+    def __init__(self, backend: StorageBackend, index_file: Path):
+        self.backend = backend
+        self.index_file = index_file
+        self._categories: Dict[str, _CategoryIndex] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._listeners = []
+
+    # --- Тыңдаушылар (мысалы, іздеу индексі) ---
+    def add_listener(self, listener):
+        """listener объектісінде on_catalog_add(category, entry) және on_catalog_remove(category, name) болуы керек."""
+        self._listeners.append(listener)
+
+    def _notify_hook(self, hook_name: str, *args):
+        # Міндетті емес хуктар: on_catalog_loading() және on_catalog_loaded(catalog)
+        for listener in self._listeners:
+            hook = getattr(listener, hook_name, None)
+            if hook is not None:
+                hook(*args)
+
+    def _notify_add(self, category: str, entry: CatalogEntry):
+        for listener in self._listeners:
+            listener.on_catalog_add(category, entry)
+
+    def _notify_remove(self, category: str, name: str):
+        for listener in self._listeners:
+            listener.on_catalog_remove(category, name)
+
+    # --- Жүктеу және сақтау ---
+    def load(self, categories: Iterable[str]):
+        snapshot = {}
+        if self.index_file.exists():
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f).get("categories", {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Каталог индексін оқу қатесі: {e}")
+                snapshot = {}
+
+        rescanned = []
+        with self._lock:
+            self._categories = {}
+            for category in categories:
+                cat_snapshot = snapshot.get(category)
+                dir_mtime = self._dir_mtime(category)
+                if dir_mtime is not None and cat_snapshot is not None and cat_snapshot.get("dir_mtime") == dir_mtime:
+                    self._categories[category] = _CategoryIndex.from_entries(
+                        (CatalogEntry(*row) for row in cat_snapshot.get("files", [])), dir_mtime)
+                else:
+                    known_uploaders = {row[0]: row[3] for row in cat_snapshot.get("files", [])} if cat_snapshot else {}
+                    self._categories[category] = self._scan_category(category, known_uploaders)
+                    rescanned.append(category)
+            if rescanned:
+                self._dirty = True
+
+        self._notify_hook("on_catalog_loading")
+        for category, index in self._categories.items():
+            for entry in index.entries.values():
+                self._notify_add(category, entry)
+        self._notify_hook("on_catalog_loaded", self)
+        if rescanned:
+            logger.info(f"Каталог қайта сканерленді: {rescanned}")
+            self.save()
+        logger.info(f"Каталог жүктелді: {sum(len(i.names) for i in self._categories.values())} файл")
+
+    def _dir_mtime(self, category: str) -> Optional[ChangeStamp]:
+        return self.backend.change_stamp(category)
+
+    def _scan_category(self, category: str, known_uploaders: Dict[str, Optional[int]]) -> _CategoryIndex:
+        # Жүктеушілер туралы ақпарат тек индексте сақталады, сондықтан оны ескі индекстен аламыз.
+        # Белгі тізімнен бұрын алынады: сканерлеу кезінде келген өзгеріс келесі refresh()-те көрінеді
+        dir_mtime = self._dir_mtime(category)
+        prefix = category + "/"
+        entries = []
+        for info in self.backend.list(prefix):
+            name = info.key[len(prefix):]
+            entries.append(CatalogEntry(name, info.size, info.mtime, known_uploaders.get(name)))
+        return _CategoryIndex.from_entries(entries, dir_mtime)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"categories": {}}
+            for category, index in self._categories.items():
+                # Боттың өз өзгерістерінен кейінгі белгі сақталады: әйтпесе әр жүктеуден соң қайта
+                # іске қосылғанда категория толық сканерленер еді (қараңыз: _record_stamp)
+                data["categories"][category] = {
+                    "dir_mtime": index.saved_stamp,
+                    "files": [[e.name, e.size, e.mtime, e.uploader] for e in
+                              (index.entries[n] for n in index.names)]
+                }
+            self._dirty = False
+        tmp_file = self.index_file.with_suffix(".tmp")
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            logger.error(f"Каталог индексін сақтау қатесі: {e}")
+            self._dirty = True
+
+    def refresh(self, categories: Iterable[str], force: bool = False) -> int:
+        """
+        Директория mtime-ы өзгерген категорияларды қайта сканерлеп, айырмашылықты тыңдаушыларға
+        жібереді. Басқа процесс (webhook жұмысшысы) қосқан не жойған файлдарды көру үшін қолданылады.
+        force=True: белгіге қарамай барлық категорияларды сканерлеу (әкімшінің /reindex командасы).
+        """
+        changes = []
+        with self._lock:
+            for category in categories:
+                old_index = self._categories.get(category)
+                if not force and old_index is not None and old_index.dir_mtime is not None \
+                        and old_index.dir_mtime == self._dir_mtime(category):
+                    continue
+                old_entries = old_index.entries if old_index is not None else {}
+                new_index = self._scan_category(category, {n: e.uploader for n, e in old_entries.items()})
+                for name, entry in new_index.entries.items():
+                    old_entry = old_entries.get(name)
+                    if old_entry is None or (old_entry.size, old_entry.mtime) != (entry.size, entry.mtime):
+                        changes.append((category, entry, None))
+                changes.extend((category, None, name) for name in old_entries if name not in new_index.entries)
+                if old_index is not None:  # Нұсқа тек өседі (беттер кэші соған сүйенеді)
+                    new_index.version = max(new_index.version, old_index.version + 1)
+                self._categories[category] = new_index
+            if changes:
+                self._dirty = True
+        for category, entry, removed_name in changes:
+            if entry is not None:
+                self._notify_add(category, entry)
+            else:
+                self._notify_remove(category, removed_name)
+        return len(changes)
+
+    # --- Инкременттік жаңартулар ---
+    def _record_stamp(self, category: str):
+        """
+        Бот өз өзгерісін қолданғаннан кейінгі белгіні индекс файлы үшін жазады. Жадтағы
+        dir_mtime өзгермейді: басқа жұмысшының өзгерістері refresh()-те әлі де көрінеді. Бағасы:
+        соңғы refresh()-тен кейін боттан тыс енгізілген өзгеріс (ботпен бір категорияда) келесі
+        refresh() + save() не /reindex-ке дейін қайта іске қосылғанда байқалмайды.
+        """
+        try:
+            stamp = self._dir_mtime(category)
+        except (StorageError, OSError) as e:  # Ескі белгі қалады: қайта іске қосылғанда сканерленеді
+            logger.warning(f"Категория белгісін алу қатесі ({category}): {e}")
+            return
+        with self._lock:
+            index = self._categories.get(category)
+            if index is not None:
+                index.saved_stamp = stamp
+
+    def add(self, category: str, name: str, size: int, mtime: float, uploader: Optional[int] = None) -> CatalogEntry:
+        entry = CatalogEntry(name, size, mtime, uploader)
+        with self._lock:
+            self._categories.setdefault(category, _CategoryIndex()).insert(entry)
+            self._dirty = True
+        self._record_stamp(category)
+        self._notify_add(category, entry)
+        return entry
+
+    def remove(self, category: str, name: str) -> Optional[CatalogEntry]:
+        with self._lock:
+            index = self._categories.get(category)
+            entry = index.remove(name) if index else None
+            if entry is not None:
+                self._dirty = True
+        if entry is not None:
+            self._record_stamp(category)
+            self._notify_remove(category, name)
+        return entry
+
+    def apply_batch(self, category: str, removed: Iterable[str] = (), added: Iterable[CatalogEntry] = ()):
+        """
+        Жаппай операцияның нәтижесін бір құлыппен қолданады. Тыңдаушыларға әдеттегідей
+        хабарланады, бірақ on_catalog_batch_begin()/on_catalog_batch_end() хуктарының арасында
+        (мысалы, тізілім мыңдаған өзгерісті бір транзакцияда жазады).
+        """
+        removed_names, added_entries = [], list(added)
+        with self._lock:
+            index = self._categories.get(category)
+            for name in removed:
+                if index is not None and index.remove(name) is not None:
+                    removed_names.append(name)
+            if added_entries:
+                index = self._categories.setdefault(category, _CategoryIndex())
+                for entry in added_entries:
+                    index.insert(entry)
+            if removed_names or added_entries:
+                self._dirty = True
+        if removed_names or added_entries:
+            self._record_stamp(category)
+        self._notify_hook("on_catalog_batch_begin")
+        try:
+            for name in removed_names:
+                self._notify_remove(category, name)
+            for entry in added_entries:
+                self._notify_add(category, entry)
+        finally:
+            self._notify_hook("on_catalog_batch_end")
+
+    def add_category(self, category: str):
+        with self._lock:
+            if category not in self._categories:
+                self._categories[category] = self._scan_category(category, {})
+                self._dirty = True
+        self.save()
+
+    # --- Оқу ---
+    def count(self, category: str) -> int:
+        index = self._categories.get(category)
+        return len(index.names) if index else 0
+
+    def get(self, category: str, name: str) -> Optional[CatalogEntry]:
+        index = self._categories.get(category)
+        return index.entries.get(name) if index else None
+
+    def version(self, category: str) -> int:
+        index = self._categories.get(category)
+        return index.version if index else 0
+
+    def page(self, category: str, page: int, page_size: int) -> Tuple[List[CatalogEntry], int]:
+        """Беттегі файлдарды (O(page_size)) және жалпы беттер санын қайтарады."""
+        with self._lock:
+            index = self._categories.get(category)
+            if not index or not index.names:
+                return [], 0
+            total_pages = (len(index.names) + page_size - 1) // page_size
+            if page < 1:
+                return [], total_pages
+            start_idx = (page - 1) * page_size
+            names = index.names[start_idx:start_idx + page_size]
+            return [index.entries[n] for n in names], total_pages
+
+    def entries(self, category: str) -> List[CatalogEntry]:
+        with self._lock:
+            index = self._categories.get(category)
+            if not index:
+                return []
+            return [index.entries[n] for n in index.names]
@@ -0,0 +1,237 @@
+# StudyShareBot: мазмұн хэші (SHA-256) бойынша дедупликацияланған файл қоймасы
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR_NAME = ".blobs"
+INCOMING_DIR_NAME = ".incoming"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class HashingWriter:
+    """Жазылған байттардың SHA-256 хэшін ағынмен есептейтін файл орауышы (bot.download үшін)."""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# Hardlink қолдау таппайтын жағдайлар (басқа файлдық жүйе, FAT, сілтемелер шегі)
+LINK_UNSUPPORTED_ERRNOS = frozenset({errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP})
+
+
+def link_or_copy(src: Path, dst: Path):
+    """
+    dst-ны src-ке hardlink етеді, ол мүмкін болмаса көшірме жасайды. dst бұрыннан болса
+    FileExistsError көтеріледі (ешқашан қайта жазылмайды): атауды басқа процесс алған болуы
+    мүмкін, шақырушы жаңа атау таңдауы керек.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+            raise
+        with open(src, "rb") as fsrc, open(dst, "xb") as fdst:  # "x": бар файлды қайта жазбау
+            shutil.copyfileobj(fsrc, fdst, HASH_CHUNK_SIZE)
+        shutil.copystat(src, dst)
+
+
+class ContentStore:
+    """
+    Әр бірегей мазмұн FILES_DIR/.blobs/<хэш[:2]>/<хэш> ретінде бір рет сақталады, ал категориядағы
+    әр файл осы blob-қа hardlink болады. refs кестесі "категория/файл" -> хэш сәйкестігін сақтайды,
+    соңғы сілтеме жойылғанда blob та жойылады.
+    """
+
+    def __init__(self, files_dir: Path, db_file: Path):
+        self.files_dir = files_dir
+        self.blobs_dir = files_dir / BLOBS_DIR_NAME
+        self.incoming_dir = files_dir / INCOMING_DIR_NAME
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS refs ("
+                           " category TEXT NOT NULL, name TEXT NOT NULL, sha256 TEXT NOT NULL,"
+                           " PRIMARY KEY (category, name))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS refs_sha256 ON refs (sha256)")
+        self._conn.commit()
+        self._blobs: Dict[str, int] = dict(self._conn.execute("SELECT sha256, size FROM blobs"))
+        self._refs: Dict[Tuple[str, str], str] = {}
+        for category, name, sha in self._conn.execute("SELECT category, name, sha256 FROM refs"):
+            self._refs[(category, name)] = sha
+
+    def _set_ref(self, category: str, name: str, sha: str):
+        if self._refs.get((category, name)) == sha:
+            return
+        self._refs[(category, name)] = sha
+        self._conn.execute("INSERT OR REPLACE INTO refs (category, name, sha256) VALUES (?, ?, ?)",
+                           (category, name, sha))
+
+    def blob_path(self, sha: str) -> Path:
+        return self.blobs_dir / sha[:2] / sha
+
+    def has_blob(self, sha: str) -> bool:
+        return sha in self._blobs
+
+    def sha_for(self, category: str, name: str) -> Optional[str]:
+        return self._refs.get((category, name))
+
+    def new_incoming_path(self) -> Path:
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        return self.incoming_dir / f"{uuid.uuid4().hex}.part"
+
+    def commit(self, temp_path: Path, sha: str, dest_path: Path) -> bool:
+        """
+        Жүктелген уақытша файлды қоймаға қосып, dest_path-қа сілтеме жасайды.
+        Мазмұн бұрыннан болса, True қайтарады (уақытша файл жойылады, жаңа көшірме жоқ).
+        dest_path бос болмаса FileExistsError көтеріледі, ал қойма мен уақытша файл өзгермейді.
+        """
+        category, name = dest_path.parent.name, dest_path.name
+        with self._lock:
+            blob = self.blob_path(sha)
+            # Дискідегі blob - бірнеше webhook жұмысшысына ортақ шындық көзі
+            duplicate = False
+            if blob.exists():
+                try:
+                    link_or_copy(blob, dest_path)
+                    duplicate = True
+                except FileNotFoundError:
+                    pass  # blob-ты басқа жұмысшы дәл осы сәтте жойды
+            if duplicate:
+                temp_path.unlink()
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                # Алдымен атауға сілтеме: атау бос болмаса, ештеңе өзгермей тұрып қате шығады
+                link_or_copy(temp_path, dest_path)
+                os.replace(temp_path, blob)
+                self._blobs[sha] = blob.stat().st_size
+                self._conn.execute("INSERT OR REPLACE INTO blobs (sha256, size) VALUES (?, ?)", (sha, self._blobs[sha]))
+            self._set_ref(category, name, sha)
+            self._conn.commit()
+            return duplicate
+
+    def release(self, category: str, name: str):
+        """Категориядағы файл жойылғаннан кейін шақырылады; басқа сілтеме қалмаса blob-ты жояды."""
+        self.release_many([(category, name)])
+
+    def release_many(self, keys: Iterable[Tuple[str, str]]):
+        """release() бірнеше файл үшін, бір транзакцияда (жаппай жою кезінде)."""
+        with self._lock:
+            for category, name in keys:
+                self._release(category, name)
+            self._conn.commit()
+
+    def _release(self, category: str, name: str):
+        sha = self._refs.pop((category, name), None)
+        if sha is None:
+            # Сілтемені басқа webhook жұмысшысы жасаған болуы мүмкін
+            row = self._conn.execute("SELECT sha256 FROM refs WHERE category = ? AND name = ?",
+                                     (category, name)).fetchone()
+            if row is None:
+                return
+            sha = row[0]
+        self._conn.execute("DELETE FROM refs WHERE category = ? AND name = ?", (category, name))
+        # Басқа сілтеме қалмаса blob-ты жою (кесте бірнеше webhook жұмысшысына ортақ)
+        if not self._conn.execute("SELECT 1 FROM refs WHERE sha256 = ? LIMIT 1", (sha,)).fetchone():
+            self._blobs.pop(sha, None)
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha,))
+            try:
+                self.blob_path(sha).unlink()
+            except FileNotFoundError:
+                pass
+
+    def move_ref(self, category: str, name: str, new_category: str, new_name: str):
+        """Файл басқа категорияға/атауға көшірілгенде blob сілтемесін бірге көшіру."""
+        with self._lock:
+            sha = self._refs.pop((category, name), None)
+            if sha is None:
+                row = self._conn.execute("SELECT sha256 FROM refs WHERE category = ? AND name = ?",
+                                         (category, name)).fetchone()
+                sha = row[0] if row else None
+            self._conn.execute("DELETE FROM refs WHERE category = ? AND name = ?", (category, name))
+            if sha is not None:
+                self._set_ref(new_category, new_name, sha)
+            self._conn.commit()
+
+    def migrate(self) -> Tuple[int, int]:
+        """
+        Бір реттік көшіру: FILES_DIR ішіндегі бар файлдарды хэштеп, қайталанатындарын
+        бір blob-қа hardlink етеді. (өңделген файлдар, үнемделген байттар) қайтарады.
+        """
+        processed, saved_bytes = 0, 0
+        with self._lock:
+            for category_dir in sorted(self.files_dir.iterdir()):
+                if not category_dir.is_dir() or category_dir.name.startswith("."):
+                    continue
+                for file_path in sorted(category_dir.iterdir()):
+                    if not file_path.is_file():
+                        continue
+                    sha = hash_file(file_path)
+                    blob = self.blob_path(sha)
+                    if sha in self._blobs and blob.exists():
+                        if not os.path.samefile(blob, file_path):
+                            saved_bytes += file_path.stat().st_size
+                            # Атомды ауыстыру: алдымен уақытша сілтеме, содан кейін os.replace
+                            tmp_link = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}")
+                            link_or_copy(blob, tmp_link)
+                            os.replace(tmp_link, file_path)
+                    else:
+                        blob.parent.mkdir(parents=True, exist_ok=True)
+                        link_or_copy(file_path, blob)
+                        self._blobs[sha] = blob.stat().st_size
+                        self._conn.execute("INSERT OR REPLACE INTO blobs (sha256, size) VALUES (?, ?)",
+                                           (sha, self._blobs[sha]))
+                    self._set_ref(category_dir.name, file_path.name, sha)
+                    processed += 1
+            self._conn.commit()
+        return processed, saved_bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Қолдану: python dedup_store.py [FILES_DIR] [DB_FILE]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+    base_dir = Path(__file__).parent
+    files_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else base_dir / "files"
+    db_file = Path(sys.argv[2]) if len(sys.argv) > 2 else base_dir / "content_store.db"
+    store = ContentStore(files_dir, db_file)
+    count, saved = store.migrate()
+    store.close()
+    logger.info(f"Дедупликация аяқталды: {count} файл өңделді, {saved // 1024 // 1024}MB үнемделді")
@@ -0,0 +1,241 @@
+# StudyShareBot: Google Drive-ға фондық жүктеу кезегі (SQLite) және жұмысшылар пулы
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_UPLOAD_TIMEOUT = 30  # секунд: тоқтағанда жүріп жатқан бөліктің аяқталуын күту
+
+
+class PermanentUploadError(Exception):
+    """Қайталаудан пайда жоқ қате (файл жоқ, сұраныс не рұқсат қате): тапсырма бірден сәтсіз болады."""
+
+
+class UploadInterrupted(Exception):
+    """Кезек тоқтап жатыр: жүктеу келесі бөліктің алдында үзіледі, тапсырма resume URI-імен кезекте қалады."""
+
+
+@dataclass
+class DriveJob:
+    id: int
+    file_path: str
+    category: str
+    chat_id: Optional[int]
+    attempts: int = 0
+    resume_uri: Optional[str] = None  # Бот қайта іске қосылса, жүктеу осы сессиядан жалғасады
+    status_message_id: Optional[int] = None  # Прогресс көрсетілетін хабарлама
+    last_progress_report: float = 0.0
+
+
+class DriveUploadQueue:
+    """
+    Drive-ға жүктеу тапсырмаларын SQLite-та сақтайды және оларды ағындар пулында орындайды.
+    Сәтсіз әрекеттер экспоненциалды кідіріспен қайталанады (upload_func көтерген қате мәтіні
+    last_error-ға жазылады, PermanentUploadError мен FileNotFoundError қайталанбайды); бот қайта
+    іске қосылғанда аяқталмаған тапсырмалар кезекке қайта қойылады. SQLite-қа жазу event loop-та
+    емес, бөлек бір ағында орындалады.
+    """
+
+    def __init__(self, db_file: Path, upload_func: Callable[[DriveJob], Optional[str]],
+                 workers: int = 2, max_attempts: int = 5, base_delay: float = 5.0, max_delay: float = 600.0):
+        self.upload_func = upload_func
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_done: Optional[Callable[[DriveJob, str], Awaitable[None]]] = None
+        self.on_failed: Optional[Callable[[DriveJob, str], Awaitable[None]]] = None
+        self.on_progress: Optional[Callable[[DriveJob, int, int], Awaitable[None]]] = None
+        self.progress_interval = 5.0  # секунд, прогресс хабарламаларының жиілігі
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS drive_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " file_path TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " chat_id INTEGER,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " drive_id TEXT,"
+            " last_error TEXT,"
+            " resume_uri TEXT,"
+            " status_message_id INTEGER,"
+            " created_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(drive_jobs)")}
+        for column, column_type in (("resume_uri", "TEXT"), ("status_message_id", "INTEGER")):
+            if column not in columns:  # Ескі схемадан көшіру
+                self._conn.execute(f"ALTER TABLE drive_jobs ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Жазулар бір ағында ретімен орындалады: ұзақ жүктеулер бос болғанша күтпейді
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="drive-db")
+        self._tasks = []
+        self._stopping = threading.Event()
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    async def _execute_async(self, sql: str, params=()):
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, self._execute, sql, params)
+
+    async def start(self, resume_pending: bool = True):
+        """
+        resume_pending=False: аяқталмаған тапсырмалар қайта қойылмайды (бірнеше webhook жұмысшысы
+        болса, оларды тек біреуі жалғастырады, әйтпесе бір файл бірнеше рет жүктеледі).
+        """
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="drive")
+        rows = []
+        if resume_pending:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, file_path, category, chat_id, attempts, resume_uri, status_message_id"
+                    " FROM drive_jobs WHERE status = 'pending'"
+                    " ORDER BY id").fetchall()
+        for row in rows:
+            self._queue.put_nowait(DriveJob(*row))
+        if rows:
+            logger.info(f"Drive кезегі: {len(rows)} аяқталмаған тапсырма қайта қойылды")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = SHUTDOWN_UPLOAD_TIMEOUT):
+        """
+        Жүктеу ағындарына тоқтау белгісін береді (олар ағымдағы бөлікті аяқтап, resume URI-ді
+        сақтап шығады) және оларды timeout секундқа дейін күтеді. Ағындар үлгермесе, SQLite
+        қосылымы жабылмайды: кеш сақталатын resume URI жоғалмауы керек.
+        """
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        finished = True
+        if self._executor:
+            try:
+                await asyncio.wait_for(asyncio.to_thread(self._executor.shutdown, wait=True), timeout)
+            except asyncio.TimeoutError:
+                finished = False
+                logger.warning(f"Drive кезегі: жүктеу ағындары {timeout}s ішінде тоқтамады")
+        self._db_executor.shutdown(wait=True)
+        if finished:
+            with self._lock:
+                self._conn.close()
+
+    async def enqueue(self, file_path: str, category: str, chat_id: Optional[int] = None,
+                      status_message_id: Optional[int] = None) -> DriveJob:
+        cursor = await self._execute_async(
+            "INSERT INTO drive_jobs (file_path, category, chat_id, status_message_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            (file_path, category, chat_id, status_message_id, time.time()))
+        job = DriveJob(cursor.lastrowid, file_path, category, chat_id, status_message_id=status_message_id)
+        if self._queue is not None:
+            self._queue.put_nowait(job)
+        return job
+
+    # --- Жаппай операциялар үшін ---
+    def drive_ids(self, file_paths: Iterable[str]) -> Dict[str, str]:
+        """Drive-ға сәтті жүктелген файлдардың жол -> Drive ID картасы."""
+        paths = list(file_paths)
+        result = {}
+        with self._lock:
+            for start in range(0, len(paths), 500):  # SQLite параметрлер шегі
+                chunk = paths[start:start + 500]
+                result.update(self._conn.execute(
+                    f"SELECT file_path, drive_id FROM drive_jobs WHERE status = 'done' AND drive_id IS NOT NULL"
+                    f" AND file_path IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+        return result
+
+    def mark_deleted(self, file_paths: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("UPDATE drive_jobs SET status = 'deleted' WHERE file_path = ? AND status = 'done'",
+                                   [(path,) for path in file_paths])
+            self._conn.commit()
+
+    def relocate(self, moves: Iterable[tuple]):
+        """moves: (ескі жол, жаңа жол, жаңа категория) - көшірілген файлдардың жазбаларын жаңарту."""
+        with self._lock:
+            self._conn.executemany("UPDATE drive_jobs SET file_path = ?, category = ? WHERE file_path = ?",
+                                   [(new_path, category, old_path) for old_path, new_path, category in moves])
+            self._conn.commit()
+
+    # --- Жұмысшы ағындарынан шақырылатын функциялар ---
+    def save_resume_uri(self, job: DriveJob, resume_uri: Optional[str]):
+        job.resume_uri = resume_uri
+        self._execute("UPDATE drive_jobs SET resume_uri = ? WHERE id = ?", (resume_uri, job.id))
+
+    def report_progress(self, job: DriveJob, sent: int, total: int):
+        if self._stopping.is_set() and sent < total:
+            raise UploadInterrupted(job.file_path)
+        now = time.monotonic()
+        if sent < total and now - job.last_progress_report < self.progress_interval:
+            return
+        job.last_progress_report = now
+        if self.on_progress and self._loop:
+            self._loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self._safe_callback(self.on_progress, job, sent, total)))
+
+    def pending_count(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _retry_later(self, job: DriveJob):
+        delay = min(self.base_delay * (2 ** (job.attempts - 1)), self.max_delay)
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            error = None
+            drive_id = None
+            permanent = False
+            try:
+                drive_id = await loop.run_in_executor(self._executor, self.upload_func, job)
+                if not drive_id:
+                    error = "Drive ID қайтарылмады"
+            except (PermanentUploadError, FileNotFoundError) as e:
+                error, permanent = f"{type(e).__name__}: {e}", True
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+
+            if drive_id:
+                await self._execute_async("UPDATE drive_jobs SET status = 'done', drive_id = ?, attempts = ?, resume_uri = NULL"
+                              " WHERE id = ?",
+                              (drive_id, job.attempts + 1, job.id))
+                if self.on_done:
+                    await self._safe_callback(self.on_done, job, drive_id)
+                continue
+
+            job.attempts += 1
+            if permanent or job.attempts >= self.max_attempts:
+                await self._execute_async("UPDATE drive_jobs SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                              (job.attempts, error, job.id))
+                logger.error(f"Drive-ға жүктеу біржола сәтсіз ({job.file_path}): {error}")
+                if self.on_failed:
+                    await self._safe_callback(self.on_failed, job, error)
+            else:
+                await self._execute_async("UPDATE drive_jobs SET attempts = ?, last_error = ? WHERE id = ?",
+                              (job.attempts, error, job.id))
+                logger.warning(f"Drive-ға жүктеу қатесі ({job.file_path}), әрекет {job.attempts}: {error}")
+                self._retry_later(job)
+
+    @staticmethod
+    async def _safe_callback(callback, job: DriveJob, *args):
+        try:
+            await callback(job, *args)
+        except Exception as e:
+            logger.error(f"Drive кезегі хабарламасын жіберу қатесі: {e}")
@@ -1,44 +1,294 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
+import google_auth_httplib2
+import httplib2
+import json
 import os
+import threading
 import logging # Логирование қосылды
 
 # Google Drive папкасының ID-сын осында қойыңыз. Қауіпсіздік үшін оны қоршаған орта айнымалысынан алған дұрыс.
 FOLDER_ID = '1ETI_E2HE-CH709nYiMreE5C_VUOeg20V' # Нақты ID-мен ауыстырыңыз
 SERVICE_ACCOUNT_FILE = 'credentials.json' # Сервистік тіркелгі файлының жолы
+SCOPES = ['https://www.googleapis.com/auth/drive']
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+HTTP_TIMEOUT = 60
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 256 КБ-қа еселі болуы керек
+# Осыдан кіші файлдар бір multipart сұранысымен жүктеледі (resumable сессия кемінде 2 сұраныс)
+MULTIPART_THRESHOLD = 5 * 1024 * 1024
+BATCH_LIMIT = 100  # Drive API бір batch сұранысындағы ішкі сұраныстар шегі
+# 403 жауабының уақытша себептері (қалғандары - рұқсат не квота, қайталаудан пайда жоқ)
+RATE_LIMIT_REASONS = frozenset({'rateLimitExceeded', 'userRateLimitExceeded', 'backendError'})
 
-# Google Drive-қа жүктеу функциясы
-def upload_to_drive(file_path, file_name):
-    """Файлды Google Drive-қа жүктейді және файлдың ID-сын қайтарады."""
-    SCOPES = ['https://www.googleapis.com/auth/drive']
 
+def is_permanent_error(error):
+    """Drive қатесін қайталау керек пе: жоқ файл, 400/404 және жиілікке қатысы жоқ 403 - тұрақты қателер."""
+    if isinstance(error, FileNotFoundError):
+        return True
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 403:
+        details = error.error_details if isinstance(error.error_details, list) else []
+        return not any(isinstance(d, dict) and d.get('reason') in RATE_LIMIT_REASONS for d in details)
+    return status in (400, 404)
+
+
+class DriveClient:
+    """
+    Ұзақ өмір сүретін Drive клиенті: credentials бір рет оқылады (токен google-auth арқылы
+    автоматты жаңартылады), әр ағынның өз HTTP қосылымы мен service объектісі қайта
+    қолданылады, ал категория -> папка ID картасы дискіде сақталады.
+    """
+
+    def __init__(self, credentials_file, folder_map_file=None):
+        self.credentials_file = str(credentials_file)
+        self.folder_map_file = str(folder_map_file) if folder_map_file else None
+        self.credentials = service_account.Credentials.from_service_account_file(
+            self.credentials_file, scopes=SCOPES
+        )
+        self._local = threading.local()  # httplib2 ағындар арасында қауіпсіз емес
+        self._folder_lock = threading.Lock()
+        self._folder_ids = self._load_folder_map()
+
+    # --- HTTP/service пулы ---
+    def http(self):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            self._local.http = http
+        return http
+
+    def service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            # static_discovery: discovery құжаты пакеттің ішінен алынады, желіге сұраныс жоқ
+            service = build('drive', 'v3', http=self.http(), cache_discovery=False, static_discovery=True)
+            self._local.service = service
+        return service
+
+    # --- Категория -> папка ID картасы ---
+    def _load_folder_map(self):
+        if not self.folder_map_file or not os.path.exists(self.folder_map_file):
+            return {}
+        try:
+            with open(self.folder_map_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Drive папкалар картасын оқу қатесі: {e}")
+            return {}
+
+    def _save_folder_map(self):
+        if not self.folder_map_file:
+            return
+        tmp_file = self.folder_map_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._folder_ids, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_file, self.folder_map_file)
+
+    def folder_id(self, category):
+        """Категория папкасының ID-сын қайтарады; картада жоқ болса, Drive-тан табады немесе жасайды."""
+        folder_id = self._folder_ids.get(category)
+        if folder_id:
+            return folder_id
+        with self._folder_lock:
+            folder_id = self._folder_ids.get(category)
+            if folder_id:
+                return folder_id
+            escaped_name = category.replace('\\', '\\\\').replace("'", "\\'")
+            results = self.service().files().list(
+                q=f"name='{escaped_name}' and mimeType='{FOLDER_MIME_TYPE}' and trashed=false",
+                spaces='drive', fields='files(id)').execute()
+            if results.get('files'):
+                folder_id = results['files'][0]['id']
+            else:
+                folder = self.service().files().create(
+                    body={'name': category, 'mimeType': FOLDER_MIME_TYPE}, fields='id').execute()
+                folder_id = folder.get('id')
+            self._folder_ids[category] = folder_id
+            self._save_folder_map()
+            return folder_id
+
+    def warm(self, categories):
+        """Іске қосылғанда барлық категориялардың папка ID-ларын алдын ала жүктеу."""
+        for category in categories:
+            try:
+                self.folder_id(category)
+            except Exception as e:
+                logging.error(f"Drive папкасын дайындау қатесі ({category}): {e}")
+
+    # --- Жүктеу ---
+    def upload(self, file_path, file_name, parent_id, resumable=False):
+        """Файлды бір API сұранысымен жүктейді және файл ID-сын қайтарады."""
+        file_metadata = {'name': file_name, 'parents': [parent_id]}
+        media = MediaFileUpload(file_path, resumable=resumable)
+        file = self.service().files().create(body=file_metadata, media_body=media, fields='id').execute()
+        return file.get('id')
+
+    def upload_file(self, file_path, file_name, parent_id, chunk_size=DEFAULT_CHUNK_SIZE,
+                    resume_uri=None, on_resume_uri=None, on_progress=None):
+        """
+        Кіші файлдарды (MULTIPART_THRESHOLD-тан аспайтын) бір multipart сұранысымен, қалғандарын
+        upload_resumable() арқылы жүктейді. Басталған resume сессиясы әрқашан жалғастырылады.
+        """
+        size = os.path.getsize(file_path)
+        if resume_uri is None and size <= MULTIPART_THRESHOLD:
+            file_id = self.upload(file_path, file_name, parent_id)
+            if on_progress:
+                on_progress(size, size)
+            return file_id
+        return self.upload_resumable(file_path, file_name, parent_id, chunk_size,
+                                     resume_uri, on_resume_uri, on_progress)
+
+    def upload_resumable(self, file_path, file_name, parent_id, chunk_size=DEFAULT_CHUNK_SIZE,
+                         resume_uri=None, on_resume_uri=None, on_progress=None):
+        """
+        Файлды бөліктермен (resumable) жүктейді. resume_uri берілсе, жүктеу сервер қабылдаған
+        байттан жалғасады. on_resume_uri(uri) жаңа сессия URI-ін сақтау үшін,
+        on_progress(sent, total) әр бөліктен кейін шақырылады.
+        """
+        file_metadata = {'name': file_name, 'parents': [parent_id]}
+        media = MediaFileUpload(file_path, resumable=True, chunksize=chunk_size)
+        request = self.service().files().create(body=file_metadata, media_body=media, fields='id')
+
+        def restart():
+            # Resume сессиясының мерзімі өтті: басынан бастаймыз
+            logging.warning(f"Drive resume сессиясы жарамсыз ({file_name}), жүктеу басынан басталады")
+            if on_resume_uri:
+                on_resume_uri(None)
+            return self.upload_resumable(file_path, file_name, parent_id, chunk_size,
+                                         None, on_resume_uri, on_progress)
+
+        if resume_uri:
+            try:
+                offset, file_id = self.upload_status(resume_uri, media.size())
+            except HttpError as e:
+                if e.resp.status in (404, 410):
+                    return restart()
+                raise
+            if file_id:  # Алдыңғы әрекетте соңғы бөлік жеткен, тек жауабы жоғалған
+                if on_progress:
+                    on_progress(media.size(), media.size())
+                return file_id
+            request.resumable_uri = resume_uri
+            request.resumable_progress = offset
+
+        saved_uri = resume_uri
+        response = None
+        while response is None:
+            try:
+                status, response = request.next_chunk(num_retries=3)
+            except HttpError as e:
+                if resume_uri and e.resp.status in (404, 410):
+                    return restart()
+                raise
+            if request.resumable_uri != saved_uri:
+                saved_uri = request.resumable_uri
+                if on_resume_uri:
+                    on_resume_uri(saved_uri)
+            if status and on_progress:
+                on_progress(status.resumable_progress, status.total_size)
+        if on_progress:
+            on_progress(media.size(), media.size())
+        return response.get('id')
+
+    def upload_status(self, resume_uri, total_size):
+        """
+        Resumable сессияның күйін құжатталған протоколмен сұрайды: бос PUT, Content-Range: bytes */total.
+        (сервер қабылдаған байттар, файл ID не None) қайтарады. 308 жауабының Range тақырыбы
+        (bytes=0-N) қабылданған соңғы байтты көрсетеді, тақырып жоқ болса ештеңе қабылданбаған;
+        200/201 - жүктеу аяқталған. Сессия жарамсыз болса (404/410) HttpError көтеріледі.
+        """
+        resp, content = self.http().request(
+            resume_uri, 'PUT', headers={'Content-Range': f'bytes */{total_size}', 'Content-Length': '0'})
+        if resp.status in (200, 201):
+            return total_size, json.loads(content).get('id')
+        if resp.status == 308:
+            received = resp.get('range')
+            return (int(received.rsplit('-', 1)[1]) + 1 if received else 0), None
+        raise HttpError(resp, content, uri=resume_uri)
+
+    # --- Жаппай операциялар (batch HTTP сұраныстары) ---
+    def _execute_batch(self, requests):
+        """
+        {файл ID: сұраныс} сөздігін BATCH_LIMIT-тен бөліп, әр топты бір HTTP сұранысымен
+        орындайды. Сәтті орындалған (не Drive-та бұрыннан жоқ, 404) файл ID-ларын қайтарады.
+        """
+        done = set()
+
+        def callback(request_id, response, exception):
+            if exception is None or (isinstance(exception, HttpError) and exception.resp.status == 404):
+                done.add(request_id)
+            else:
+                logging.error(f"Drive batch сұранысының қатесі ({request_id}): {exception}")
+
+        items = list(requests.items())
+        for start in range(0, len(items), BATCH_LIMIT):
+            batch = self.service().new_batch_http_request(callback=callback)
+            for file_id, request in items[start:start + BATCH_LIMIT]:
+                batch.add(request, request_id=file_id)
+            batch.execute()
+        return done
+
+    def delete_many(self, file_ids):
+        """Файлдарды Drive-тан жояды; жойылған ID-лар жиынын қайтарады."""
+        files = self.service().files()
+        return self._execute_batch({file_id: files.delete(fileId=file_id) for file_id in file_ids})
+
+    def move_many(self, file_ids, old_category, new_category):
+        """Файлдарды бір категория папкасынан екіншісіне көшіреді; көшірілген ID-ларды қайтарады."""
+        old_parent, new_parent = self.folder_id(old_category), self.folder_id(new_category)
+        files = self.service().files()
+        return self._execute_batch({
+            file_id: files.update(fileId=file_id, addParents=new_parent, removeParents=old_parent, fields='id')
+            for file_id in file_ids})
+
+
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def get_drive_client(credentials_file=None, folder_map_file=None):
+    """Берілген credentials және папкалар картасы үшін ортақ DriveClient (бірінші шақыруда жасалады)."""
+    key = (os.path.abspath(credentials_file or SERVICE_ACCOUNT_FILE),
+           os.path.abspath(folder_map_file) if folder_map_file else None)
+    client = _clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = DriveClient(*key)
+    return client
+
+
+# Google Drive-қа жүктеу функциясы
+def upload_to_drive(file_path, file_name, client=None):
+    """
+    Файлды Google Drive-қа жүктейді және файлдың ID-сын қайтарады.
+    client берілсе (мысалы, main.py-дың ортақ клиенті), сол қолданылады.
+    """
     # Файлдардың бар-жоғын тексеру
     if not os.path.exists(file_path):
         logging.error(f"Жүктеу үшін файл табылмады: {file_path}")
         raise FileNotFoundError(f"Файл табылмады: {file_path}")
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
+    if client is None and not os.path.exists(SERVICE_ACCOUNT_FILE):
          logging.error(f"Service account файлы табылмады: {SERVICE_ACCOUNT_FILE}")
          raise FileNotFoundError(f"Service account файлы табылмады: {SERVICE_ACCOUNT_FILE}")
 
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            SERVICE_ACCOUNT_FILE, scopes=SCOPES
-        )
-        service = build('drive', 'v3', credentials=credentials)
-
-        file_metadata = {'name': file_name, 'parents': [FOLDER_ID]}
-        media = MediaFileUpload(file_path, resumable=True)
+        # Ортақ клиент: қайталап шақырғанда қайта аутентификация мен discovery жоқ
+        client = client or get_drive_client()
 
         # Файлды жүктеу
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        file_id = file.get('id')
+        file_id = client.upload_file(file_path, file_name, FOLDER_ID)
         logging.info(f"Файл '{file_name}' Google Drive-қа сәтті жүктелді, ID: {file_id}")
 
         # (Міндетті емес) Файлға рұқсаттарды орнату. Мысалы, барлығына оқу рұқсатын беру:
         # try:
         #     permission = {'type': 'anyone', 'role': 'reader'}
-        #     service.permissions().create(fileId=file_id, body=permission).execute()
+        #     client.service().permissions().create(fileId=file_id, body=permission).execute()
         #     logging.info(f"'{file_name}' файлына жалпыға ортақ оқу рұқсаты берілді.")
         # except Exception as perm_e:
         #     logging.error(f"Файл рұқсаттарын орнату кезінде қате: {perm_e}")
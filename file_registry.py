@@ -0,0 +1,138 @@
+# StudyShareBot: сақталған файлдарға қысқа сандық ID беретін тұрақты тізілім (SQLite)
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from catalog import CatalogEntry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileRecord:
+    id: int
+    category: str
+    name: str
+    size: int
+    mtime: float = 0.0
+    tg_file_id: Optional[str] = None  # Telegram-ға қайта жүктемей жіберу үшін
+
+
+class FileRegistry:
+    """
+    Әр файлға тұрақты сандық ID береді, сондықтан callback_data тұрақты ұзындықта болады
+    (download_<id>). Барлық жазбалар жадта да сақталады: ID -> жазба іздеу O(1).
+    FileCatalog тыңдаушысы ретінде жаңартылады.
+    """
+
+    def __init__(self, db_file: Path):
+        self.db_file = db_file
+        self._lock = threading.RLock()
+        self._by_id: Dict[int, FileRecord] = {}
+        self._by_key: Dict[Tuple[str, str], int] = {}
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " category TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " size INTEGER NOT NULL DEFAULT 0,"
+            " mtime REAL NOT NULL DEFAULT 0,"
+            " tg_file_id TEXT,"
+            " UNIQUE(category, name))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+        if "mtime" not in columns:  # Ескі схемадан көшіру
+            self._conn.execute("ALTER TABLE files ADD COLUMN mtime REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+        for row in self._conn.execute("SELECT id, category, name, size, mtime, tg_file_id FROM files"):
+            record = FileRecord(*row)
+            self._by_id[record.id] = record
+            self._by_key[(record.category, record.name)] = record.id
+        self._bulk = False
+
+    # --- FileCatalog тыңдаушысы ---
+    def on_catalog_add(self, category: str, entry: CatalogEntry):
+        with self._lock:
+            record_id = self._by_key.get((category, entry.name))
+            if record_id is not None:
+                record = self._by_id[record_id]
+            else:
+                # Жазбаны басқа webhook жұмысшысы қосып қойған болуы мүмкін: бар ID-ны қолданамыз
+                self._conn.execute("INSERT OR IGNORE INTO files (category, name, size, mtime) VALUES (?, ?, ?, ?)",
+                                   (category, entry.name, entry.size, entry.mtime))
+                record = FileRecord(*self._conn.execute(
+                    "SELECT id, category, name, size, mtime, tg_file_id FROM files WHERE category = ? AND name = ?",
+                    (category, entry.name)).fetchone())
+                self._by_id[record.id] = record
+                self._by_key[(category, entry.name)] = record.id
+            if record.size != entry.size or record.mtime != entry.mtime:
+                # Файл ауыстырылды: ескі Telegram file_id енді жарамсыз
+                record.size, record.mtime, record.tg_file_id = entry.size, entry.mtime, None
+                self._conn.execute("UPDATE files SET size = ?, mtime = ?, tg_file_id = NULL WHERE id = ?",
+                                   (entry.size, entry.mtime, record.id))
+            if not self._bulk:
+                self._conn.commit()
+
+    def on_catalog_remove(self, category: str, name: str):
+        with self._lock:
+            record_id = self._by_key.pop((category, name), None)
+            if record_id is None:
+                return
+            self._by_id.pop(record_id, None)
+            self._conn.execute("DELETE FROM files WHERE id = ?", (record_id,))
+            if not self._bulk:
+                self._conn.commit()
+
+    def on_catalog_loading(self):
+        # Суық іске қосылуда мыңдаған жазбаны бір транзакцияда енгізу
+        with self._lock:
+            self._bulk = True
+
+    def on_catalog_batch_begin(self):
+        with self._lock:
+            self._bulk = True
+
+    def on_catalog_batch_end(self):
+        with self._lock:
+            self._conn.commit()
+            self._bulk = False
+
+    def on_catalog_loaded(self, catalog):
+        # Каталогта жоқ (боттан тыс жойылған) файлдардың жазбаларын тазалау
+        with self._lock:
+            stale = [key for key in self._by_key if catalog.get(*key) is None]
+            for key in stale:
+                record_id = self._by_key.pop(key)
+                self._by_id.pop(record_id, None)
+                self._conn.execute("DELETE FROM files WHERE id = ?", (record_id,))
+            self._conn.commit()
+            self._bulk = False
+        if stale:
+            logger.info(f"Файлдар тізілімінен {len(stale)} ескі жазба жойылды")
+
+    # --- Telegram file_id кэші ---
+    def set_tg_file_id(self, record_id: int, tg_file_id: Optional[str]):
+        with self._lock:
+            record = self._by_id.get(record_id)
+            if record is None or record.tg_file_id == tg_file_id:
+                return
+            record.tg_file_id = tg_file_id
+            self._conn.execute("UPDATE files SET tg_file_id = ? WHERE id = ?", (tg_file_id, record_id))
+            self._conn.commit()
+
+    # --- Оқу ---
+    def get(self, record_id: int) -> Optional[FileRecord]:
+        return self._by_id.get(record_id)
+
+    def id_for(self, category: str, name: str) -> Optional[int]:
+        return self._by_key.get((category, name))
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
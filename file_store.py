@@ -0,0 +1,166 @@
+# StudyShareBot: файлдар қоймасына асинхронды қолжетімділік (шектелген ағындар пулы, event loop бұғатталмайды)
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from aiogram.types.input_file import InputFile, DEFAULT_CHUNK_SIZE
+
+from storage_backend import StorageBackend, split_key
+
+
+class FileStat(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+
+
+def object_key(category: str, name: str) -> str:
+    return f"{category}/{name}"
+
+
+class BackendInputFile(InputFile):
+    """Telegram-ға жіберілетін файл: мазмұн бэкендтен бөліктермен оқылады (жадқа толық жүктелмейді)."""
+
+    def __init__(self, store: "AsyncFileStore", key: str, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.store = store
+        self.key = key
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        body = await self.store.run(self.store.backend.get, self.key)
+        try:
+            while chunk := await self.store.run(body.read, self.chunk_size):
+                yield chunk
+        finally:
+            await self.store.run(body.close)
+
+
+class AsyncFileStore:
+    """
+    main.py файлдар қоймасына тек осы класс арқылы қол жеткізеді. Әр операция бөлек
+    шектелген ағындар пулында орындалады: желілік дискіде не объект қоймасында әр сұраныс
+    ондаған миллисекунд алуы мүмкін, ал event loop басқа чаттарға қызмет етуді жалғастырады.
+    Бірнеше қадамнан тұратын операциялар (атау қақтығысы + жазу + stat) пулға бір рет жіберіледі.
+    Жүктелген файлдың уақытша көшірмесі әрқашан жергілікті scratch_dir-де сақталады.
+    """
+
+    def __init__(self, backend: StorageBackend, scratch_dir: Path, max_workers: int = 8):
+        self.backend = backend
+        self.scratch_dir = scratch_dir
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="files")
+        # Атау таңдалып, жазу аяқталғанша брондалады: параллель жүктемелер бір атауды ала алмайды
+        self._commit_lock = threading.Lock()
+        self._reserved: Set[str] = set()
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def local_path(self, category: str, name: str) -> Optional[Path]:
+        # Тек жол құрастыру, дискіге қатынамайды; объект қоймасында None
+        return self.backend.local_path(object_key(category, name))
+
+    def input_file(self, category: str, name: str) -> InputFile:
+        return BackendInputFile(self, object_key(category, name), name)
+
+    # --- Категориялар ---
+    def _ensure_dirs(self, categories: Iterable[str]):
+        self.backend.prepare(categories)
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+
+    async def ensure_dirs(self, categories: Iterable[str]):
+        await self.run(self._ensure_dirs, list(categories))
+
+    async def mkdir(self, category: str):
+        await self.run(self.backend.prepare, [category])
+
+    # --- Файлдар ---
+    def new_incoming_path(self) -> Path:
+        # scratch_dir ensure_dirs() кезінде жасалған, сондықтан мұнда дискіге қатынамаймыз
+        return self.scratch_dir / f"{uuid.uuid4().hex}.part"
+
+    async def discard(self, path: Path):
+        await self.run(lambda: path.unlink(missing_ok=True))
+
+    def _reserve_name(self, category: str, file_name: str) -> str:
+        name, ext = os.path.splitext(file_name)
+        with self._commit_lock:
+            candidate, counter = file_name, 0
+            # Егер файл аты бұрыннан бар болса (не басқа жүктеме оны алып қойса), _1, _2 қосу
+            while (object_key(category, candidate) in self._reserved
+                   or self.backend.exists(object_key(category, candidate))):
+                counter += 1
+                candidate = f"{name}_{counter}{ext}"
+            self._reserved.add(object_key(category, candidate))
+        return candidate
+
+    def _release_name(self, category: str, name: str):
+        with self._commit_lock:
+            self._reserved.discard(object_key(category, name))
+
+    def _commit_upload(self, temp_path: Path, sha: str, category: str, file_name: str) -> Tuple[FileStat, bool]:
+        while True:
+            candidate = self._reserve_name(category, file_name)
+            key = object_key(category, candidate)
+            try:
+                # Жазу құлыптан тыс: объект қоймасына ұзақ жүктемелер бір-бірін күтпейді
+                is_duplicate = self.backend.put(key, temp_path, sha)
+                info = self.backend.stat(key)
+                break
+            except FileExistsError:
+                continue  # Атауды басқа процесс (webhook жұмысшысы) дәл қазір алды: келесі бос атау
+            finally:
+                self._release_name(category, candidate)
+        return FileStat(candidate, info.size, info.mtime), is_duplicate
+
+    async def commit_upload(self, temp_path: Path, sha: str, category: str, file_name: str) -> Tuple[FileStat, bool]:
+        """
+        Уақытша файлды категорияға бос атаумен қосады. (соңғы атау мен stat, мазмұн бұрыннан
+        бар ма) қайтарады.
+        """
+        return await self.run(self._commit_upload, temp_path, sha, category, file_name)
+
+    async def delete(self, category: str, name: str) -> bool:
+        """Файлды (жергілікті дискіде оның blob сілтемесін де) жояды; табылмаса False қайтарады."""
+        return await self.run(self.backend.delete, object_key(category, name))
+
+    # --- Жаппай операциялар (бір топ пулға бір рет жіберіледі) ---
+    def _delete_many(self, category: str, names: List[str]) -> List[str]:
+        deleted = self.backend.delete_many([object_key(category, name) for name in names])
+        return [split_key(key)[1] for key in deleted]
+
+    async def delete_many(self, category: str, names: List[str]) -> List[str]:
+        """Файлдарды жояды және шынымен жойылғандарының атауларын қайтарады."""
+        return await self.run(self._delete_many, category, list(names))
+
+    def _move_many(self, category: str, names: List[str], target: str) -> List[Tuple[str, FileStat]]:
+        moved = []
+        for name in names:
+            info = None
+            while info is None:
+                candidate = self._reserve_name(target, name)
+                try:
+                    self.backend.move(object_key(category, name), object_key(target, candidate))
+                    info = self.backend.stat(object_key(target, candidate))
+                except FileExistsError:
+                    continue  # Атауды басқа процесс алды: келесі бос атау
+                except FileNotFoundError:
+                    break
+                finally:
+                    self._release_name(target, candidate)
+            if info is not None:
+                moved.append((name, FileStat(candidate, info.size, info.mtime)))
+        return moved
+
+    async def move_many(self, category: str, names: List[str], target: str) -> List[Tuple[str, FileStat]]:
+        """
+        Файлдарды target категориясына көшіреді (атау бос болмаса _1, _2 қосылады).
+        (ескі атау, жаңа stat) жұптарын қайтарады; табылмаған файлдар өткізіледі.
+        """
+        return await self.run(self._move_many, category, list(names), target)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,144 @@
+# StudyShareBot: тұрақты FSM қоймасы (SQLite немесе Redis), TTL бойынша ескі сессияларды тазалау
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 300  # секунд, мерзімі өткен жолдарды тазалау жиілігі
+
+
+def _key_to_str(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM күйі мен деректері SQLite кестесінде сақталады, сондықтан бот қайта іске қосылғанда
+    сессиялар жоғалмайды және бір хосттағы бірнеше жұмысшы процесс ортақ күйді көреді (WAL).
+    Әр жазу TTL-ді жаңартады; мерзімі өткен сессия бос болып оқылады және мезгіл-мезгіл жойылады.
+    """
+
+    def __init__(self, db_file: Path, ttl: int = 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # timeout: басқа процесс жазып жатқанда күту (SQLITE_BUSY орнына)
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS fsm ("
+                           " key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL DEFAULT '{}',"
+                           " expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires ON fsm (expires_at)")
+        self._conn.commit()
+        # Барлық SQLite шақырулары бір ағында орындалады, event loop бұғатталмайды
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm")
+        self._last_purge = 0.0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _expires_at(self) -> float:
+        return time.time() + self.ttl
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            self._conn.execute("DELETE FROM fsm WHERE expires_at < ?", (now,))
+
+    def _read(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT state, data, expires_at FROM fsm WHERE key = ?", (key,)).fetchone()
+        if row is None or row[2] < time.time():
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _write_state(self, key: str, state: Optional[str]):
+        now = time.time()
+        with self._lock:
+            if state is None:
+                self._conn.execute("UPDATE fsm SET state = NULL WHERE key = ?", (key,))
+                # Күйі де, деректері де жоқ жолды сақтаудың қажеті жоқ
+                self._conn.execute("DELETE FROM fsm WHERE key = ? AND data = '{}'", (key,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO fsm (key, state, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET state = excluded.state,"
+                    " data = CASE WHEN fsm.expires_at < ? THEN '{}' ELSE fsm.data END,"
+                    " expires_at = excluded.expires_at",
+                    (key, state, self._expires_at(), now))
+            self._maybe_purge(now)
+            self._conn.commit()
+
+    def _write_data(self, key: str, data: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            if not data:
+                self._conn.execute("UPDATE fsm SET data = '{}' WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL", (key,))
+            else:
+                self._conn.execute(
+                    "INSERT INTO fsm (key, data, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET data = excluded.data,"
+                    " state = CASE WHEN fsm.expires_at < ? THEN NULL ELSE fsm.state END,"
+                    " expires_at = excluded.expires_at",
+                    (key, json.dumps(data, ensure_ascii=False), self._expires_at(), now))
+            self._maybe_purge(now)
+            self._conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._run(self._write_state, _key_to_str(key), state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._run(self._read, _key_to_str(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._run(self._write_data, _key_to_str(key), data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._run(self._read, _key_to_str(key))
+        return data
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM fsm WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    async def close(self) -> None:
+        await self._run(self.purge_expired)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+
+def create_fsm_storage(backend: str, db_file: Path, redis_url: str = "", ttl: int = 3600) -> BaseStorage:
+    """
+    config.ini [FSM] STORAGE мәні бойынша қойманы таңдау: sqlite (әдепкі), redis немесе memory.
+    Redis үшін aiogram-ның RedisStorage қолданылады (redis пакеті қажет), ол Redis протоколын
+    қолдайтын кез келген серверге (мысалы, жергілікті redis-server не KeyDB) қосыла алады.
+    """
+    backend = backend.lower()
+    if backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError:
+            logger.error("Redis FSM қоймасы үшін 'redis' пакеті орнатылмаған, SQLite қолданылады")
+        else:
+            logger.info(f"FSM қоймасы: Redis ({redis_url})")
+            return RedisStorage.from_url(redis_url, state_ttl=ttl, data_ttl=ttl)
+    if backend == "memory":
+        logger.warning("FSM қоймасы: MemoryStorage (сессиялар қайта іске қосылғанда жоғалады)")
+        return MemoryStorage()
+    logger.info(f"FSM қоймасы: SQLite ({db_file})")
+    return SQLiteStorage(db_file, ttl=ttl)
@@ -0,0 +1,106 @@
+# StudyShareBot: ағындық жүктеу құбыры (хэш, түрді тексеру, өлшем шегі - жүктеу барысында)
+import asyncio
+import logging
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from aiogram import Bot
+
+from dedup_store import HashingWriter
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_TIMEOUT = 60
+SNIFF_BYTES = 16
+
+# Кеңейтім -> рұқсат етілген файл басындағы "магиялық" байттар
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # ескі Office (.doc, .xls, .ppt)
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06')  # .zip және Office Open XML (.docx, .xlsx, .pptx)
+MAGIC_SIGNATURES: Dict[str, Tuple[bytes, ...]] = {
+    '.pdf': (b'%PDF',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.zip': ZIP_SIGNATURES,
+    '.docx': ZIP_SIGNATURES,
+    '.xlsx': ZIP_SIGNATURES,
+    '.pptx': ZIP_SIGNATURES,
+    '.rar': (b'Rar!\x1a\x07',),
+    '.doc': (OLE_SIGNATURE,),
+    '.xls': (OLE_SIGNATURE,),
+    '.ppt': (OLE_SIGNATURE,),
+}
+
+
+class IngestError(Exception):
+    """Жүктеу тоқтатылды; user_message пайдаланушыға көрсетіледі."""
+
+    def __init__(self, user_message: str):
+        super().__init__(user_message)
+        self.user_message = user_message
+
+
+def sniff_matches(file_ext: str, head: bytes) -> bool:
+    if file_ext == '.txt':
+        return b'\x00' not in head  # Мәтіндік файлда нөлдік байт болмауы керек
+    signatures = MAGIC_SIGNATURES.get(file_ext)
+    if signatures is None:
+        return True  # Белгісіз түрлерді тек кеңейтім бойынша тексереміз
+    return any(head.startswith(sig) for sig in signatures)
+
+
+async def stream_telegram_file(bot: Bot, file_id: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                               executor: Optional[Executor] = None) -> AsyncIterator[bytes]:
+    file = await bot.get_file(file_id)
+    if bot.session.api.is_local:
+        # Жергілікті Bot API сервері: файл дискіде
+        # Файлды ашу мен оқу циклді бөгемеуі үшін executor-да орындалады
+        local_path = bot.session.api.wrap_local_file.to_local(file.file_path)
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(executor, open, local_path, "rb")
+        try:
+            while chunk := await loop.run_in_executor(executor, f.read, chunk_size):
+                yield chunk
+        finally:
+            await loop.run_in_executor(executor, f.close)
+        return
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    async for chunk in bot.session.stream_content(url=url, timeout=STREAM_TIMEOUT, chunk_size=chunk_size):
+        yield chunk
+
+
+async def ingest_file(bot: Bot, file_id: str, temp_path: Path, file_ext: str, max_size: int,
+                      chunk_size: int = STREAM_CHUNK_SIZE, executor: Optional[Executor] = None) -> Tuple[str, int]:
+    """
+    Telegram файлын temp_path-қа ағынмен жүктейді, жолай SHA-256 есептейді, файл түрін
+    алғашқы байттар бойынша тексереді және өлшем шегін бақылайды. Шарт бұзылса, жүктеу
+    бірден тоқтатылып IngestError көтеріледі. (sha256, өлшем) қайтарады.
+    Дискіге жазу мен хэштеу executor ағындарында орындалады.
+    """
+    loop = asyncio.get_running_loop()
+    head = b''
+    sniffed = False
+    temp_file = await loop.run_in_executor(executor, open, temp_path, "wb")
+    try:
+        writer = HashingWriter(temp_file)
+        stream = stream_telegram_file(bot, file_id, chunk_size, executor)
+        try:
+            async for chunk in stream:
+                if writer.size + len(chunk) > max_size:
+                    raise IngestError(f"❌ Файл өлшемі тым үлкен (максимум {max_size // 1024 // 1024}MB)")
+                if not sniffed:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES:
+                        sniffed = True
+                        if not sniff_matches(file_ext, head):
+                            raise IngestError(f"❌ Файл мазмұны {file_ext} түріне сәйкес келмейді.")
+                await loop.run_in_executor(executor, writer.write, chunk)
+        finally:
+            await stream.aclose()
+    finally:
+        await loop.run_in_executor(executor, temp_file.close)
+    if not sniffed and not sniff_matches(file_ext, head):  # SNIFF_BYTES-тан қысқа файлдар
+        raise IngestError(f"❌ Файл мазмұны {file_ext} түріне сәйкес келмейді.")
+    return writer.hexdigest(), writer.size
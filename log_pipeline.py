@@ -0,0 +1,128 @@
+# StudyShareBot: бұғаттамайтын логтау (QueueHandler + фондық listener ағыны, ротация, JSON, іріктеу)
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+STANDARD_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Әр жазба бір JSON жол: лог жинау жүйелеріне (Loki, ELK) тікелей береді."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    INFO және одан төмен жазбалардың әр logger бойынша тек 1/every бөлігін өткізеді.
+    WARNING және одан жоғары деңгейлер әрқашан жазылады.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counters: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        sampled = getattr(record, "_sampled", None)
+        if sampled is None:  # Бір жазба бірнеше өңдеушіден өтсе, шешім бір рет қабылданады
+            count = self._counters.get(record.name, 0)
+            self._counters[record.name] = count + 1
+            sampled = self.every != 0 and count % self.every == 0
+            record._sampled = sampled
+        return sampled
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Стандартты QueueHandler.prepare() хабарламаны және traceback-ті шақырушы ағында форматтайды.
+    Кезек процесс ішінде болғандықтан, жазбаны өзгеріссіз жібереміз: форматтау да, жазу да
+    listener ағынында орындалады, event loop тек кезекке қосу құнын төлейді.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _build_handlers(log_file: str, json_format: bool, max_bytes: int, backup_count: int,
+                    rotate_when: str) -> List[logging.Handler]:
+    if rotate_when:  # Уақыт бойынша ротация, мысалы 'midnight' немесе 'H'
+        file_handler = logging.handlers.TimedRotatingFileHandler(log_file, when=rotate_when,
+                                                                 backupCount=backup_count, encoding='utf8')
+    elif max_bytes:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                                            backupCount=backup_count, encoding='utf8')
+    else:
+        file_handler = logging.FileHandler(log_file, encoding='utf8')
+    console_handler = logging.StreamHandler(sys.stderr)
+    formatter = JsonFormatter() if json_format else logging.Formatter(STANDARD_FORMAT)
+    for handler in (file_handler, console_handler):
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(formatter)
+    return [file_handler, console_handler]
+
+
+def setup_logging(log_file: str = 'bot.log', use_queue: bool = True, json_format: bool = False,
+                  max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, rotate_when: str = '',
+                  info_sample_rate: float = 1.0):
+    """
+    Түбірлік logger-дің өңдеушілерін ауыстырады. use_queue=True болса, файлға және консольға
+    жазу фондық QueueListener ағынына көшіріледі. Қайта шақыруға болады (мысалы, webhook
+    жұмысшысы өз лог файлына ауысқанда): алдыңғы listener тоқтатылады.
+    """
+    global _listener
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    handlers = _build_handlers(log_file, json_format, max_bytes, backup_count, rotate_when)
+    if use_queue:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        front = DeferredQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        front_handlers = [front]
+    else:
+        front_handlers = handlers
+    if info_sample_rate < 1.0:
+        # Іріктеу кезекке қоспай тұрып орындалады, сондықтан тасталған жазбалар ештеңеге тұрмайды
+        sampling = SamplingFilter(info_sample_rate)
+        for handler in front_handlers:
+            handler.addFilter(sampling)
+    for handler in front_handlers:
+        root.addHandler(handler)
+    root.setLevel(logging.INFO)
+
+
+def stop_logging():
+    """Кезектегі жазбаларды дискіге жазып, listener ағынын тоқтату."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
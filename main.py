@@ -4,13 +4,15 @@ import logging
 import logging.config
 import os
 import re
-import json
+import secrets
+import signal
 import sys
+import time
 import configparser
-from collections import defaultdict
+import functools
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.enums import ParseMode
@@ -19,22 +21,42 @@ from aiogram.types import (
     CallbackQuery,
     ReplyKeyboardMarkup,
     KeyboardButton,
-    FSInputFile,
-    InlineKeyboardButton
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
+    FSInputFile
 )
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart, Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.utils.markdown import hlink, hbold, hcode
 from aiogram.client.default import DefaultBotProperties
 
+from catalog import FileCatalog, CatalogEntry
+from search_engine import SearchIndex, SearchResultCache
+from markup_cache import MarkupCache
+from file_registry import FileRegistry
+from drive_queue import DriveUploadQueue, DriveJob, PermanentUploadError
+from dedup_store import ContentStore
+from file_store import AsyncFileStore
+from storage_backend import create_storage_backend
+from ingest import ingest_file, IngestError
+from upload_scheduler import UploadScheduler, UploadQueueFull
+from stats_store import StatsStore
+from fsm_storage import create_fsm_storage
+from webhook_server import WebhookServer, run_workers, REUSE_PORT_SUPPORTED
+from log_pipeline import setup_logging
+from throttling import ThrottlingMiddleware, OutboundLimiter
+from archive_cache import ArchiveCache, ArchiveItem
+from bulk_ops import BulkJob, BulkArgsError, parse_bulk_args, ACTION_DELETE, ACTION_MOVE
+from send_queue import OutboundQueue, QueuedSendMiddleware, create_bot_session
+from metrics import (MetricsRegistry, MetricsMiddleware, EventLoopMonitor, metrics_handler, start_metrics_server,
+                     DRIVE_BUCKETS)
+
 # Google Drive интеграциясы
 try:
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload
-    from google.oauth2 import service_account
+    from drive_uploader import get_drive_client, is_permanent_error as is_permanent_drive_error
 
     GOOGLE_DRIVE_ENABLED = True
 except ImportError:
@@ -75,10 +97,20 @@ logging.config.dictConfig(LOGGING_CONFIG)
 logger = logging.getLogger(__name__)
 
 # Базалық директориялар
-BASE_DIR = Path(__file__).parent
+# STUDYSHARE_BASE_DIR: деректер директориясын ауыстыру (мысалы, benchmark.py үшін)
+BASE_DIR = Path(os.getenv("STUDYSHARE_BASE_DIR") or Path(__file__).parent)
 FILES_DIR = BASE_DIR / "files"
 CONFIG_FILE = BASE_DIR / "config.ini"
 STATS_FILE = BASE_DIR / "user_stats.json"
+STATS_LOG_FILE = BASE_DIR / "user_stats.log"
+CATALOG_INDEX_FILE = BASE_DIR / "catalog_index.json"
+FILE_REGISTRY_DB = BASE_DIR / "file_registry.db"
+DRIVE_QUEUE_DB = BASE_DIR / "drive_queue.db"
+CONTENT_STORE_DB = BASE_DIR / "content_store.db"
+DRIVE_CREDENTIALS_FILE = BASE_DIR / 'service_account.json'
+DRIVE_FOLDERS_FILE = BASE_DIR / "drive_folders.json"
+FSM_STORAGE_DB = BASE_DIR / "fsm_storage.db"
+ARCHIVE_DIR = BASE_DIR / "archives"
 
 
 # Конфигурацияны жүктеу
@@ -93,16 +125,79 @@ def load_config():
         }
         config_parser['Files'] = {
             'MAX_FILE_SIZE': '52428800',  # 50MB
-            'ALLOWED_EXTENSIONS': '.pdf,.docx,.jpg,.jpeg,.png,.txt,.zip,.rar,.pptx,.xls,.xlsx'
+            'ALLOWED_EXTENSIONS': '.pdf,.docx,.jpg,.jpeg,.png,.txt,.zip,.rar,.pptx,.xls,.xlsx',
+            'UPLOAD_CONCURRENCY': '4',  # Бір уақыттағы жүктемелердің жалпы саны
+            'UPLOAD_PER_USER': '1',  # Бір пайдаланушының бір уақыттағы жүктемелері
+            'UPLOAD_QUEUE_SIZE': '100',
+            'IO_WORKERS': '8'  # Файлдық жүйе операцияларына арналған ағындар саны
+        }
+        config_parser['Archive'] = {
+            'PART_SIZE': '51380224',  # 49MB: әр zip бөлігі Telegram-ның 50MB шегінен кіші
+            'MAX_TOTAL_SIZE': '1073741824',  # Бір сұраныстағы файлдардың жалпы өлшемі (1GB)
+            'CACHE_SIZE': '2147483648',  # Дайын архивтер кэшінің дискідегі шегі (2GB)
+            'WORKERS': '1'  # Архив құрастыратын ағындар
         }
         config_parser['General'] = {
             'UNIVERSITY_SITE': 'https://htu.edu.kz',
             'CATEGORIES': 'Математика,Физика,Бағдарламалау,Диплом жұмыстары,Информатика,IT,Ағылшын тілі,Тарих'
         }
+        config_parser['Drive'] = {
+            'WORKERS': '2',  # Drive-ға параллель жүктейтін ағындар саны
+            'MAX_ATTEMPTS': '5',
+            'CHUNK_SIZE': '8388608'  # 8MB, 256KB-қа еселі болуы керек
+        }
+        config_parser['Storage'] = {
+            'BACKEND': 'local',  # local (FILES_DIR) немесе s3 (S3-үйлесімді объект қоймасы, мысалы MinIO)
+            'S3_ENDPOINT': '',  # Мысалы: http://127.0.0.1:9000
+            'S3_BUCKET': '',
+            'S3_ACCESS_KEY': '',
+            'S3_SECRET_KEY': '',
+            'S3_REGION': 'us-east-1',
+            'S3_PREFIX': ''  # Бакет ішіндегі кілттердің ортақ префиксі
+        }
+        config_parser['FSM'] = {
+            'STORAGE': 'sqlite',  # sqlite, redis немесе memory
+            'REDIS_URL': 'redis://localhost:6379/0',
+            'TTL': '3600'  # Аяқталмаған сессиялардың өмір сүру уақыты (секунд)
+        }
+        config_parser['Logging'] = {
+            'QUEUE': 'true',  # Файл мен консольға жазу фондық ағында (event loop бұғатталмайды)
+            'FORMAT': 'text',  # text немесе json
+            'FILE': 'bot.log',
+            'MAX_BYTES': '10485760',  # Өлшем бойынша ротация (10MB); 0 - ротациясыз
+            'BACKUP_COUNT': '5',
+            'ROTATE_WHEN': '',  # Уақыт бойынша ротация, мысалы: midnight
+            'INFO_SAMPLE_RATE': '1.0'  # INFO логтарының жазылатын бөлігі (0.1 - әр оныншысы)
+        }
+        config_parser['RateLimit'] = {
+            'ENABLED': 'true',
+            'USER_RATE': '1.0',  # Бір пайдаланушының секундына жаңартулары (орташа)
+            'USER_BURST': '5',  # Қысқа уақыттағы рұқсат етілген жарылыс
+            'CHAT_RATE': '2.0',  # Топтық чаттың секундына жаңартулары
+            'CHAT_BURST': '10',
+            'CALLBACK_DEBOUNCE': '1.0',  # Бірдей callback қайталанса, осы секунд ішінде еленбейді
+            'SEND_GLOBAL_RATE': '30',  # Telegram-ға секундына жіберілетін хабарламалар
+            'SEND_CHAT_RATE': '1.0'  # Бір чатқа секундына хабарламалар
+        }
+        config_parser['Telegram'] = {
+            'CONNECTION_LIMIT': '100',  # Bot API-ға ашық HTTP қосылымдарының шегі
+            'KEEPALIVE_TIMEOUT': '60',  # Бос қосылым қанша секунд сақталады (қайта TLS handshake болмайды)
+            'REQUEST_TIMEOUT': '60',
+            'SEND_WORKERS': '16',  # Жіберу кезегінің параллель жұмысшылары
+            'SEND_MAX_ATTEMPTS': '5'  # retry-after және желі қателерінде қайталау саны
+        }
+        config_parser['Metrics'] = {
+            'ENABLED': 'true',  # Webhook режимінде /metrics маршруты
+            'HOST': '127.0.0.1',
+            'PORT': '0'  # Бөлек /metrics порты (polling режимі үшін); 0 - өшірулі
+        }
         config_parser['Webhook'] = {  # Егер webhook қолдансаңыз
             'HOST': '',  # Мысалы: https://yourdomain.com
             'PORT': '8443',
-            'LISTEN': '0.0.0.0'
+            'LISTEN': '0.0.0.0',
+            'WORKERS': '1',  # Бір портты SO_REUSEPORT арқылы бөлісетін процестер саны (Linux)
+            'QUEUE_SIZE': '1000',  # Әр жұмысшыдағы өңделмеген жаңартулар шегі
+            'INTERNAL_PORT': '18443'  # Жұмысшылар арасындағы loopback порттарының басы
         }
 
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
@@ -118,25 +213,137 @@ def load_config():
             'Bot', 'ADMIN_IDS', fallback="") else [],
         'max_file_size': config_parser.getint('Files', 'MAX_FILE_SIZE', fallback=52428800),
         'allowed_extensions': config_parser.get('Files', 'ALLOWED_EXTENSIONS', fallback='.pdf,.docx').split(','),
+        'upload_concurrency': config_parser.getint('Files', 'UPLOAD_CONCURRENCY', fallback=4),
+        'upload_per_user': config_parser.getint('Files', 'UPLOAD_PER_USER', fallback=1),
+        'upload_queue_size': config_parser.getint('Files', 'UPLOAD_QUEUE_SIZE', fallback=100),
+        'io_workers': config_parser.getint('Files', 'IO_WORKERS', fallback=8),
+        'archive_part_size': config_parser.getint('Archive', 'PART_SIZE', fallback=51380224),
+        'archive_max_total_size': config_parser.getint('Archive', 'MAX_TOTAL_SIZE', fallback=1073741824),
+        'archive_cache_size': config_parser.getint('Archive', 'CACHE_SIZE', fallback=2147483648),
+        'archive_workers': config_parser.getint('Archive', 'WORKERS', fallback=1),
         'university_site': config_parser.get('General', 'UNIVERSITY_SITE', fallback=""),
         'categories': [cat.strip() for cat in config_parser.get('General', 'CATEGORIES', fallback="Жалпы").split(',') if
                        cat.strip()],
+        'drive_workers': config_parser.getint('Drive', 'WORKERS', fallback=2),
+        'drive_max_attempts': config_parser.getint('Drive', 'MAX_ATTEMPTS', fallback=5),
+        'drive_chunk_size': config_parser.getint('Drive', 'CHUNK_SIZE', fallback=8388608),
+        'storage_backend': config_parser.get('Storage', 'BACKEND', fallback="local"),
+        's3_endpoint': config_parser.get('Storage', 'S3_ENDPOINT', fallback=""),
+        's3_bucket': config_parser.get('Storage', 'S3_BUCKET', fallback=""),
+        's3_access_key': config_parser.get('Storage', 'S3_ACCESS_KEY', fallback=""),
+        's3_secret_key': config_parser.get('Storage', 'S3_SECRET_KEY', fallback=""),
+        's3_region': config_parser.get('Storage', 'S3_REGION', fallback="us-east-1"),
+        's3_prefix': config_parser.get('Storage', 'S3_PREFIX', fallback=""),
+        'fsm_storage': config_parser.get('FSM', 'STORAGE', fallback="sqlite"),
+        'fsm_redis_url': config_parser.get('FSM', 'REDIS_URL', fallback="redis://localhost:6379/0"),
+        'fsm_ttl': config_parser.getint('FSM', 'TTL', fallback=3600),
+        'log_queue': config_parser.getboolean('Logging', 'QUEUE', fallback=True),
+        'log_format': config_parser.get('Logging', 'FORMAT', fallback="text"),
+        'log_file': config_parser.get('Logging', 'FILE', fallback="bot.log"),
+        'log_max_bytes': config_parser.getint('Logging', 'MAX_BYTES', fallback=10485760),
+        'log_backup_count': config_parser.getint('Logging', 'BACKUP_COUNT', fallback=5),
+        'log_rotate_when': config_parser.get('Logging', 'ROTATE_WHEN', fallback=""),
+        'log_info_sample_rate': config_parser.getfloat('Logging', 'INFO_SAMPLE_RATE', fallback=1.0),
+        'ratelimit_enabled': config_parser.getboolean('RateLimit', 'ENABLED', fallback=True),
+        'ratelimit_user_rate': config_parser.getfloat('RateLimit', 'USER_RATE', fallback=1.0),
+        'ratelimit_user_burst': config_parser.getfloat('RateLimit', 'USER_BURST', fallback=5),
+        'ratelimit_chat_rate': config_parser.getfloat('RateLimit', 'CHAT_RATE', fallback=2.0),
+        'ratelimit_chat_burst': config_parser.getfloat('RateLimit', 'CHAT_BURST', fallback=10),
+        'ratelimit_debounce': config_parser.getfloat('RateLimit', 'CALLBACK_DEBOUNCE', fallback=1.0),
+        'send_global_rate': config_parser.getfloat('RateLimit', 'SEND_GLOBAL_RATE', fallback=30),
+        'send_chat_rate': config_parser.getfloat('RateLimit', 'SEND_CHAT_RATE', fallback=1.0),
+        'tg_connection_limit': config_parser.getint('Telegram', 'CONNECTION_LIMIT', fallback=100),
+        'tg_keepalive_timeout': config_parser.getfloat('Telegram', 'KEEPALIVE_TIMEOUT', fallback=60),
+        'tg_request_timeout': config_parser.getfloat('Telegram', 'REQUEST_TIMEOUT', fallback=60),
+        'send_workers': config_parser.getint('Telegram', 'SEND_WORKERS', fallback=16),
+        'send_max_attempts': config_parser.getint('Telegram', 'SEND_MAX_ATTEMPTS', fallback=5),
+        'metrics_enabled': config_parser.getboolean('Metrics', 'ENABLED', fallback=True),
+        'metrics_host': config_parser.get('Metrics', 'HOST', fallback="127.0.0.1"),
+        'metrics_port': config_parser.getint('Metrics', 'PORT', fallback=0),
         'webhook_host': config_parser.get('Webhook', 'HOST', fallback=""),
         'webhook_port': config_parser.getint('Webhook', 'PORT', fallback=8443),
-        'webhook_listen': config_parser.get('Webhook', 'LISTEN', fallback="0.0.0.0")
+        'webhook_listen': config_parser.get('Webhook', 'LISTEN', fallback="0.0.0.0"),
+        'webhook_workers': config_parser.getint('Webhook', 'WORKERS', fallback=1),
+        'webhook_queue_size': config_parser.getint('Webhook', 'QUEUE_SIZE', fallback=1000),
+        'webhook_internal_port': config_parser.getint('Webhook', 'INTERNAL_PORT', fallback=18443)
     }
 
 
 # Глобалды айнымалылар
 config = load_config()
+
+
+def configure_logging(log_file: str):
+    # LOGGING_CONFIG тек конфигурация оқылғанға дейін қолданылады, кейін кезекті логтауға ауысамыз
+    setup_logging(log_file, use_queue=config['log_queue'], json_format=config['log_format'] == 'json',
+                  max_bytes=config['log_max_bytes'], backup_count=config['log_backup_count'],
+                  rotate_when=config['log_rotate_when'], info_sample_rate=config['log_info_sample_rate'])
+
+
+configure_logging(config['log_file'])
 TOKEN = config['token']
 UNIVERSITY_SITE = config['university_site']
 CATEGORIES = config['categories']
 ADMIN_IDS = config['admin_ids']
 MAX_FILE_SIZE = config['max_file_size']
 ALLOWED_EXTENSIONS = config['allowed_extensions']
+# Drive resumable жүктеу бөлігінің өлшемі 256KB-қа еселі болуы керек
+DRIVE_CHUNK_SIZE = max(1, config['drive_chunk_size'] // (256 * 1024)) * 256 * 1024
 # AUTHORIZED_USERS тізімін конфигурациядан немесе басқа жолмен басқаруға болады
 AUTHORIZED_USERS = ADMIN_IDS[:]  # Мысалы, бастапқыда тек админдер рұқсат етілген
+PAGE_SIZE = 5
+CATALOG_SAVE_INTERVAL = 60  # секунд
+# Бірнеше webhook жұмысшысы тек Linux-та (SO_REUSEPORT) және webhook режимінде
+WEBHOOK_WORKERS = max(1, config['webhook_workers']) if config['webhook_host'] and REUSE_PORT_SUPPORTED else 1
+SHARED_STATE_SYNC_INTERVAL = 5  # секунд, жұмысшылар арасындағы каталог/статистика синхрондауы
+worker_index = 0  # Ағымдағы webhook жұмысшысының нөмірі; 0 - негізгі (фондық тапсырмалар осында)
+
+# Мазмұн хэші бойынша дедупликация (бірдей файлдар дискіде бір рет сақталады, тек local бэкендте)
+content_store = ContentStore(FILES_DIR, CONTENT_STORE_DB)
+# Файлдар қоймасы: жергілікті диск немесе S3-үйлесімді объект қоймасы
+storage_backend = create_storage_backend(config['storage_backend'], FILES_DIR, content_store,
+                                         config['s3_endpoint'], config['s3_bucket'], config['s3_access_key'],
+                                         config['s3_secret_key'], config['s3_region'], config['s3_prefix'])
+# Қоймаға барлық қатынас (mkdir, stat, unlink, commit) осы пул арқылы, event loop-тан тыс.
+# Уақытша жүктемелер әрқашан жергілікті FILES_DIR/.incoming ішінде
+file_store = AsyncFileStore(storage_backend, content_store.incoming_dir, max_workers=config['io_workers'])
+# Файлдар каталогы (on_startup кезінде жүктеледі)
+catalog = FileCatalog(storage_backend, CATALOG_INDEX_FILE)
+# Іздеу индексі каталог өзгерістерін тыңдайды
+search_index = SearchIndex()
+catalog.add_listener(search_index)
+# Файлдардың қысқа ID тізілімі (download_<id> callback_data үшін)
+file_registry = FileRegistry(FILE_REGISTRY_DB)
+catalog.add_listener(file_registry)
+# Жүктемелерді шектеу: жалпы және әр пайдаланушыға, пайдаланушылар арасында әділ кезек
+upload_scheduler = UploadScheduler(max_active=config['upload_concurrency'], per_user=config['upload_per_user'],
+                                   max_queue=config['upload_queue_size'])
+# Іздеу нәтижелерінің сессиялары (беттеу кезінде қайта есептелмейді)
+search_sessions = SearchResultCache(max_size=500, ttl=1800)
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_RESULTS = 200  # Ең үздік нәтижелер ғана сақталады және беттеледі
+# Категориялар мәзірі мен файлдар беттерінің дайын батырмалары (каталог нұсқасы бойынша жаңартылады)
+markup_cache = MarkupCache(max_pages=2048)
+markup_cache.set_categories(CATEGORIES)
+
+# Метрикалар (/metrics, Prometheus мәтіндік форматы)
+metrics = MetricsRegistry()
+metrics_middleware = MetricsMiddleware(metrics)
+loop_monitor = EventLoopMonitor(metrics)
+DRIVE_UPLOAD_SECONDS = metrics.histogram("drive_upload_seconds", "Drive-ға бір файлды жүктеу уақыты", ("result",),
+                                         buckets=DRIVE_BUCKETS)
+DOWNLOADS_TOTAL = metrics.counter("downloads_total", "Пайдаланушыларға жіберілген файлдар", ("source",))
+DOWNLOAD_BYTES_TOTAL = metrics.counter("download_bytes_total", "Дискіден Telegram-ға жіберілген байттар")
+UPLOAD_BYTES_TOTAL = metrics.counter("upload_bytes_total", "Қабылданған жүктемелердің байттары")
+metrics.gauge("upload_queue_depth", "Жүктеу кезегінде күтіп тұрғандар", func=lambda: upload_scheduler.queue_depth)
+metrics.gauge("upload_active", "Қазір орындалып жатқан жүктемелер", func=lambda: upload_scheduler.active)
+metrics.gauge("drive_queue_pending", "Drive кезегіндегі тапсырмалар", func=lambda: drive_queue.pending_count())
+metrics.gauge("markup_cache_hits", "Кэштен берілген файлдар беттері", func=lambda: markup_cache.hits)
+metrics.gauge("markup_cache_misses", "Қайта құрастырылған файлдар беттері", func=lambda: markup_cache.misses)
+# Категория не іздеу нәтижелерінің zip архивтері (каталог нұсқасы бойынша кэштеледі)
+archive_cache = ArchiveCache(storage_backend, ARCHIVE_DIR, part_size=config['archive_part_size'],
+                             max_bytes=config['archive_cache_size'], max_workers=config['archive_workers'],
+                             registry=metrics)
 
 
 # FSM Күйлері
@@ -154,8 +361,32 @@ class AddCategoryState(StatesGroup):
 
 
 # Bot және Dispatcher
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+          session=create_bot_session(config['tg_connection_limit'], keepalive_timeout=config['tg_keepalive_timeout'],
+                                     timeout=config['tg_request_timeout']))
+if config['ratelimit_enabled']:
+    # Шығыс: жіберу сұраныстары Telegram лимитіне сай күтеді (429 орнына). Кезектен бұрын тіркеледі (сыртқы
+    # қабат): сұраныс өз слотын шақырушының ішінде күтіп, кезекке дайын күйде түседі - жұмысшы бос ұйықтамайды
+    outbound_limiter = OutboundLimiter(config['send_global_rate'] / max(1, WEBHOOK_WORKERS), config['send_chat_rate'],
+                                       registry=metrics)
+    bot.session.middleware(outbound_limiter)
+    metrics.gauge("outbound_rate_waiting", "Шығыс лимитін күтіп тұрған сұраныстар",
+                  func=lambda: outbound_limiter.waiting)
+# Барлық жіберулер ортақ кезек арқылы: чат бойынша рет, мәтін құжаттан бұрын, retry-after автоматты түрде
+outbound_queue = OutboundQueue(config['send_workers'], config['send_max_attempts'], registry=metrics)
+bot.session.middleware(QueuedSendMiddleware(outbound_queue))
+# FSM күйлері тұрақты қоймада: қайта іске қосылғанда сақталады, бірнеше жұмысшыға ортақ
+dp = Dispatcher(storage=create_fsm_storage(config['fsm_storage'], FSM_STORAGE_DB,
+                                           redis_url=config['fsm_redis_url'], ttl=config['fsm_ttl']))
+dp.message.middleware(metrics_middleware)
+dp.callback_query.middleware(metrics_middleware)
+if config['ratelimit_enabled']:
+    # Кіріс: пайдаланушы/чат бойынша token bucket және қайталанған callback-терді біріктіру (фильтрлерден бұрын)
+    throttling_middleware = ThrottlingMiddleware(config['ratelimit_user_rate'], config['ratelimit_user_burst'],
+                                                 config['ratelimit_chat_rate'], config['ratelimit_chat_burst'],
+                                                 debounce=config['ratelimit_debounce'], registry=metrics)
+    dp.message.outer_middleware(throttling_middleware)
+    dp.callback_query.outer_middleware(throttling_middleware)
 
 
 # Пайдаланушы авторизациясы
@@ -163,77 +394,95 @@ def is_authorized(user_id: int) -> bool:
     return user_id in AUTHORIZED_USERS or user_id in ADMIN_IDS
 
 
-# Google Drive функциялары (өзгеріссіз)
+# Google Drive функциялары
 def get_drive_service():
+    # Ортақ, ұзақ өмір сүретін клиент (drive_uploader.py-мен бірге қолданылады)
     if not GOOGLE_DRIVE_ENABLED:
         return None
-    credentials_file = BASE_DIR / 'service_account.json'
+    credentials_file = DRIVE_CREDENTIALS_FILE
     if not credentials_file.exists():
         logger.warning(f"Google Drive credentials файлы табылмады: {credentials_file}")
         return None
     try:
-        credentials = service_account.Credentials.from_service_account_file(
-            credentials_file, scopes=['https://www.googleapis.com/auth/drive'])
-        return build('drive', 'v3', credentials=credentials)
+        return get_drive_client(credentials_file, DRIVE_FOLDERS_FILE)
     except Exception as e:
         logger.error(f"Google Drive қызметін қосу кезінде қате: {e}")
         return None
 
 
-def upload_to_drive(file_path: str, category: str) -> Optional[str]:
-    service = get_drive_service()
-    if not service: return None
+def upload_to_drive(job: DriveJob) -> Optional[str]:
+    # Қателер drive_queue-ға жетеді: ол нақты себепті сақтайды және тұрақты қатені қайталамайды
+    client = get_drive_service()
+    if not client:
+        raise PermanentUploadError("Google Drive клиенті қолжетімсіз (credentials не баптау)")
+    started = time.perf_counter()
     try:
-        results = service.files().list(q=f"name='{category}' and mimeType='application/vnd.google-apps.folder'",
-                                       spaces='drive').execute()
-        if not results.get('files'):
-            folder_metadata = {'name': category, 'mimeType': 'application/vnd.google-apps.folder'}
-            folder = service.files().create(body=folder_metadata, fields='id').execute()
-            folder_id = folder.get('id')
-        else:
-            folder_id = results.get('files')[0].get('id')
-        file_metadata = {'name': os.path.basename(file_path), 'parents': [folder_id]}
-        media = MediaFileUpload(file_path)
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        return file.get('id')
+        # Кіші файлдар бір сұраныспен, үлкендері бөліктермен жүктеледі: resume URI кезекте
+        # сақталады, бот қайта іске қосылса жүктеу жалғасады
+        drive_id = client.upload_file(
+            job.file_path, os.path.basename(job.file_path), client.folder_id(job.category),
+            chunk_size=DRIVE_CHUNK_SIZE, resume_uri=job.resume_uri,
+            on_resume_uri=lambda uri: drive_queue.save_resume_uri(job, uri),
+            on_progress=lambda sent, total: drive_queue.report_progress(job, sent, total))
+        DRIVE_UPLOAD_SECONDS.observe(time.perf_counter() - started, "ok" if drive_id else "error")
+        return drive_id
     except Exception as e:
-        logger.error(f"Google Drive-ға жүктеу қатесі: {e}")
-        return None
+        DRIVE_UPLOAD_SECONDS.observe(time.perf_counter() - started, "error")
+        if is_permanent_drive_error(e):
+            raise PermanentUploadError(str(e)) from e
+        raise
 
 
-# Статистика функциялары (өзгеріссіз)
-def load_stats() -> Dict[str, Dict[str, Any]]:
-    try:
-        if not STATS_FILE.exists(): return defaultdict(
-            lambda: {"username": "", "files_uploaded": 0, "last_activity": ""})
-        with open(STATS_FILE, "r", encoding="utf-8") as f:
-            return defaultdict(lambda: {"username": "", "files_uploaded": 0, "last_activity": ""}, json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.error(f"Статистиканы жүктеу қатесі: {e}")
-        return defaultdict(lambda: {"username": "", "files_uploaded": 0, "last_activity": ""})
+# Drive-ға фондық жүктеу кезегі (on_startup кезінде іске қосылады)
+drive_queue = DriveUploadQueue(DRIVE_QUEUE_DB, upload_to_drive, workers=config['drive_workers'],
+                               max_attempts=config['drive_max_attempts'])
 
 
-def save_stats(stats: Dict[str, Dict[str, Any]]):
-    try:
-        with open(STATS_FILE, "w", encoding="utf-8") as f:
-            json.dump(stats, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        logger.error(f"Статистиканы сақтау қатесі: {e}")
+async def notify_drive_done(job: DriveJob, drive_id: str):
+    if not job.chat_id:
+        return
+    text = f"✅ <code>{os.path.basename(job.file_path)}</code> Google Drive-ға сақталды (ID: {drive_id})"
+    if job.status_message_id:
+        await bot.edit_message_text(text, chat_id=job.chat_id, message_id=job.status_message_id)
+    else:
+        await bot.send_message(job.chat_id, text)
 
 
-def update_user_stats(user: types.User):
-    stats = load_stats()
-    user_id_str = str(user.id)
-    current_uploads = stats.get(user_id_str, {}).get("files_uploaded", 0)
-    stats[user_id_str] = {
-        "username": user.username or f"User_{user.id}",
-        "files_uploaded": current_uploads + 1,
-        "last_activity": datetime.now().isoformat()
-    }
-    save_stats(stats)
+async def notify_drive_progress(job: DriveJob, sent: int, total: int):
+    if not job.chat_id or not job.status_message_id or sent >= total:
+        return
+    percent = sent * 100 // total if total else 0
+    await bot.edit_message_text(
+        f"☁️ <code>{os.path.basename(job.file_path)}</code> Google Drive-ға жүктелуде: {percent}%",
+        chat_id=job.chat_id, message_id=job.status_message_id)
+
 
+async def notify_drive_failed(job: DriveJob, error: str):
+    if job.chat_id:
+        await bot.send_message(job.chat_id, f"⚠️ <code>{os.path.basename(job.file_path)}</code> "
+                                            f"файлын Google Drive-ға сақтау мүмкін болмады.")
 
-# Батырмалар Менюсі
+
+drive_queue.on_done = notify_drive_done
+drive_queue.on_failed = notify_drive_failed
+drive_queue.on_progress = notify_drive_progress
+
+
+# Статистика функциялары
+# Жадтағы санауыштар, append-only журнал және мезгіл-мезгіл атомды снапшот (user_stats.json)
+stats_store = StatsStore(STATS_FILE, STATS_LOG_FILE, shared=WEBHOOK_WORKERS > 1)
+STATS_COMPACT_INTERVAL = 300  # секунд
+
+
+async def update_user_stats(user: types.User):
+    # Журналға жазу (flock, басқа процестердің оқиғаларын оқу) және мезгіл-мезгіл компакция
+    # (снапшот + fsync) дискіге жүгінеді, сондықтан event loop-тан тыс орындалады
+    await asyncio.get_running_loop().run_in_executor(
+        None, stats_store.record_upload, user.id, user.username or f"User_{user.id}", datetime.now().isoformat())
+
+
+# Батырмалар Менюсі (өзгермейді, сондықтан бір рет құрастырылады)
+@functools.lru_cache(maxsize=None)
 def main_menu_keyboard() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.row(KeyboardButton(text="📤 Файл жүктеу"), KeyboardButton(text="📋 Файлдар тізімі"))
@@ -242,22 +491,25 @@ def main_menu_keyboard() -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
+@functools.lru_cache(maxsize=None)
 def cancel_keyboard() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.add(KeyboardButton(text="❌ Болдырмау"))
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_pagination_keyboard(category_idx: int, current_page: int, total_pages: int, files_on_page: List[Path],
+def get_pagination_keyboard(category_idx: int, current_page: int, total_pages: int, files_on_page: List[CatalogEntry],
                             callback_action_prefix: str = "page_list") -> InlineKeyboardBuilder:
     builder = InlineKeyboardBuilder()
+    category_name = CATEGORIES[category_idx]
     for i, file in enumerate(files_on_page):
-        # МАҢЫЗДЫ: file.name тым ұзын болса, callback_data шектен асуы мүмкін.
-        # Қажет болса, файл атын қысқарту немесе файлдың индексін қолдану керек.
+        file_id = file_registry.id_for(category_name, file.name)
+        if file_id is None:
+            continue
         file_display_name = file.name[:30] + '...' if len(file.name) > 30 else file.name
         builder.button(
             text=f"⬇️ {file_display_name}",
-            callback_data=f"download_{category_idx}_{file.name}"  # file.name тікелей қолданылады
+            callback_data=f"download_{file_id}"  # Тұрақты ұзындықтағы ID, файл аты емес
         )
     builder.adjust(1)  # Әр файлды бір қатарға
 
@@ -274,10 +526,33 @@ def get_pagination_keyboard(category_idx: int, current_page: int, total_pages: i
     if pagination_row:  # Егер пагинация батырмалары болса ғана қосу
         builder.row(*pagination_row)
 
+    builder.row(InlineKeyboardButton(text="📦 Барлығын жүктеу (zip)", callback_data=f"zip_cat_{category_idx}"))
     builder.row(InlineKeyboardButton(text="🔙 Категорияларға оралу", callback_data="show_categories_list"))
     return builder
 
 
+def render_category_page(category_idx: int, page: int) -> Tuple[int, Optional[str], Optional[InlineKeyboardMarkup]]:
+    """
+    (жалпы беттер саны, бет мәтіні, батырмалар) қайтарады; бет жоқ болса мәтін мен батырмалар None.
+    Нәтиже markup_cache-те каталог нұсқасы бойынша сақталады.
+    """
+    category_name = CATEGORIES[category_idx]
+
+    def build():
+        current_page_files, total_pages = catalog.page(category_name, page, PAGE_SIZE)
+        if not current_page_files:
+            return total_pages, None, None
+        start_idx = (page - 1) * PAGE_SIZE
+        files_text = "\n".join(
+            [f"{i + 1 + start_idx}. <code>{file.name}</code>" for i, file in enumerate(current_page_files)])
+        text = f"📂 <b>{category_name}</b> ({page}/{total_pages}):\n{files_text}"
+        return total_pages, text, get_pagination_keyboard(category_idx, page, total_pages,
+                                                          current_page_files).as_markup()
+
+    # Нұсқа бет құрастырылмай тұрып оқылады
+    return markup_cache.page((category_idx, page), catalog.version(category_name), build)
+
+
 # Старт хендлері
 @dp.message(CommandStart())
 async def start(message: Message, state: FSMContext):
@@ -321,11 +596,8 @@ async def handle_back_to_main_menu(callback: CallbackQuery, state: FSMContext):
 @dp.message(Command("upload"))
 async def upload_start_cmd(message: Message, state: FSMContext):  # upload_start -> upload_start_cmd
     if not is_authorized(message.from_user.id): return
-    builder = InlineKeyboardBuilder()
-    for i, cat_name in enumerate(CATEGORIES):
-        builder.button(text=cat_name, callback_data=f"category_idx_{i}")
-    builder.adjust(2)
-    await message.answer("📂 Файлды қай категорияға жүктегіңіз келеді?", reply_markup=builder.as_markup())
+    await message.answer("📂 Файлды қай категорияға жүктегіңіз келеді?",
+                         reply_markup=markup_cache.category_menu("category_idx_"))
     await state.set_state(UploadState.choosing_category)
 
 
@@ -352,6 +624,10 @@ async def category_chosen(callback: CallbackQuery, state: FSMContext):
     await state.set_state(UploadState.waiting_for_file)
 
 
+def remember_tg_file_id(category: str, name: str, tg_file_id: str):
+    file_registry.set_tg_file_id(file_registry.id_for(category, name), tg_file_id)
+
+
 @dp.message(UploadState.waiting_for_file, F.document | F.photo)
 async def handle_file(message: Message, state: FSMContext):
     user_data = await state.get_data()
@@ -367,6 +643,8 @@ async def handle_file(message: Message, state: FSMContext):
     file_info = message.document or message.photo[-1]
     file_name_original = message.document.file_name if message.document else f"photo_{file_info.file_unique_id}.jpg"
     file_name = re.sub(r'[^\w\.\-\[\]\(\)]+', '_', file_name_original)  # Рұқсат етілген символдарды кеңейту
+    # Нүктеден басталатын атаулар қоймада қызметтік (уақытша файлдар, S3 нұсқа белгісі), тізімде көрінбейді
+    file_name = re.sub(r'^\.+', '_', file_name)
 
     if file_info.file_size > MAX_FILE_SIZE:
         await message.reply(f"❌ Файл өлшемі тым үлкен (максимум {MAX_FILE_SIZE // 1024 // 1024}MB)",
@@ -383,35 +661,57 @@ async def handle_file(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    save_dir = FILES_DIR / category_name
-    save_dir.mkdir(exist_ok=True, parents=True)
-    file_path = save_dir / file_name
-
-    counter = 0
-    temp_file_name = file_name
-    while file_path.exists():  # Егер файл аты бұрыннан бар болса, _1, _2 қосу
-        counter += 1
-        name, ext = os.path.splitext(file_name)
-        temp_file_name = f"{name}_{counter}{ext}"
-        file_path = save_dir / temp_file_name
-    file_name = temp_file_name  # Жаңартылған файл атын қолдану
+    async def notify_queued(position: int):
+        await message.reply(f"⏳ Жүктеу кезегіне қойылды. Сіздің орныңыз: {position}")
 
+    temp_path = file_store.new_incoming_path()
     try:
-        await bot.download(file_info, destination=str(file_path))
-        drive_file_id = None
-        if GOOGLE_DRIVE_ENABLED:
-            drive_file_id = upload_to_drive(str(file_path), category_name)
-
-        success_msg = f"✅ Файл <code>{file_name}</code> <b>{category_name}</b> категориясына жүктелді!"
-        if drive_file_id:
-            success_msg += f"\n✅ Google Drive-ға сақталды (ID: {drive_file_id})"
-
-        update_user_stats(message.from_user)
+        # Бір уақыттағы жүктемелер саны шектеулі: бос орын болмаса, әділ кезекте күтеміз
+        async with upload_scheduler.slot(message.from_user.id, notify_queued):
+            # Ағынмен жүктеу: хэш, түр және өлшем жүктеу барысында тексеріледі, файл тек
+            # толық жүктелгеннен кейін ғана категорияға атомды түрде қосылады
+            file_sha, file_size = await ingest_file(bot, file_info.file_id, temp_path, file_ext, MAX_FILE_SIZE,
+                                                    executor=file_store.executor)
+            UPLOAD_BYTES_TOTAL.inc(amount=file_size)
+
+            # Атау қақтығысын тексеру, commit және stat пулға бір рет жіберіледі
+            file_stat, is_duplicate = await file_store.commit_upload(temp_path, file_sha, category_name, file_name)
+            file_name = file_stat.name  # Жаңартылған файл атын қолдану
+            file_path = file_store.local_path(category_name, file_name)
+            # Каталог пен тізілім SQLite-қа жазады: оқиғалар циклін бөгемеу үшін executor-да
+            await file_store.run(catalog.add, category_name, file_name, file_stat.size, file_stat.mtime,
+                                 message.from_user.id)
+            if message.document:  # Кейін дискіден қайта жүктемей, file_id арқылы жіберу үшін
+                await file_store.run(remember_tg_file_id, category_name, file_name, message.document.file_id)
+            success_msg = f"✅ Файл <code>{file_name}</code> <b>{category_name}</b> категориясына жүктелді!"
+            if is_duplicate:
+                # Мазмұны бірдей файл бұрыннан бар: дискіге де, Drive-ға да қайта жазылмайды
+                success_msg += "\nℹ️ Бұл файлдың мазмұны бұрыннан сақталған, жаңа көшірме жасалмады."
+            elif file_path is not None and GOOGLE_DRIVE_ENABLED and DRIVE_CREDENTIALS_FILE.exists():
+                # Drive-ға жүктеу фондық кезекте орындалады, нәтижесі кейін хабарланады.
+                # Объект қоймасында (s3) файл бұрыннан қайталанып сақталады, Drive көшірмесі жасалмайды
+                status_message_id = None
+                if file_stat.size > DRIVE_CHUNK_SIZE:  # Үлкен файлдар үшін прогресс хабарламасы
+                    status_message = await message.answer(
+                        f"☁️ <code>{file_name}</code> Google Drive-ға жүктеу кезекте...")
+                    status_message_id = status_message.message_id
+                await drive_queue.enqueue(str(file_path), category_name, message.chat.id, status_message_id)
+                success_msg += "\n⏳ Google Drive-ға көшірме фондық режимде жасалады."
+
+        await update_user_stats(message.from_user)
         await message.reply(success_msg, reply_markup=main_menu_keyboard())
+    except UploadQueueFull:
+        logger.warning(f"Жүктеу кезегі толы ({upload_scheduler.queue_depth}), файл қабылданбады: {file_name}")
+        await message.reply("⚠️ Қазір жүктемелер тым көп. Бірнеше минуттан кейін қайталап көріңіз.",
+                            reply_markup=main_menu_keyboard())
+    except IngestError as e:
+        logger.warning(f"Жүктеу тоқтатылды ({file_name}): {e.user_message}")
+        await message.reply(e.user_message, reply_markup=main_menu_keyboard())
     except Exception as e:
         logger.error(f"Файлды сақтау қатесі ({file_name}): {e}")
         await message.reply(f"❌ Файлды сақтау кезінде қате пайда болды: {str(e)}", reply_markup=main_menu_keyboard())
     finally:
+        await file_store.discard(temp_path)
         await state.clear()
 
 
@@ -420,27 +720,21 @@ async def handle_file(message: Message, state: FSMContext):
 @dp.message(Command("list"))
 async def show_categories_for_listing(message: Message):  # show_categories -> show_categories_for_listing
     if not is_authorized(message.from_user.id): return
-    builder = InlineKeyboardBuilder()
     if not CATEGORIES:
         await message.answer("ℹ️ Категориялар әлі қосылмаған.")
         return
-    for i, cat_name in enumerate(CATEGORIES):
-        builder.button(text=cat_name, callback_data=f"list_idx_{i}")
-    builder.adjust(2)
-    await message.answer("📁 Қай категориядағы файлдарды көргіңіз келеді?", reply_markup=builder.as_markup())
+    await message.answer("📁 Қай категориядағы файлдарды көргіңіз келеді?",
+                         reply_markup=markup_cache.category_menu("list_idx_"))
 
 
 @dp.callback_query(F.data == "show_categories_list")  # "Категорияларға оралу" батырмасы үшін
 async def handle_back_to_categories_list(callback: CallbackQuery):
-    builder = InlineKeyboardBuilder()
     if not CATEGORIES:
         await callback.message.edit_text("ℹ️ Категориялар әлі қосылмаған.")
         await callback.answer()
         return
-    for i, cat_name in enumerate(CATEGORIES):
-        builder.button(text=cat_name, callback_data=f"list_idx_{i}")
-    builder.adjust(2)
-    await callback.message.edit_text("📁 Қай категориядағы файлдарды көргіңіз келеді?", reply_markup=builder.as_markup())
+    await callback.message.edit_text("📁 Қай категориядағы файлдарды көргіңіз келеді?",
+                                     reply_markup=markup_cache.category_menu("list_idx_"))
     await callback.answer()
 
 
@@ -456,27 +750,13 @@ async def list_files_in_category(callback: CallbackQuery):  # list_files -> list
         await callback.answer("⚠️ Категорияны таңдауда қате!", show_alert=True)
         return
 
-    category_dir = FILES_DIR / category_name
-    if not category_dir.exists() or not any(category_dir.iterdir()):
+    total_pages, text, markup = render_category_page(category_idx, 1)
+    if text is None:
         await callback.message.edit_text(f"📂 <b>{category_name}</b> категориясы бос немесе файлдар жоқ.")
         await callback.answer()
         return
 
-    files_in_dir = sorted([f for f in category_dir.iterdir() if f.is_file()])
-    if not files_in_dir:
-        await callback.message.edit_text(f"📂 <b>{category_name}</b> категориясында файлдар жоқ.")
-        await callback.answer()
-        return
-
-    PAGE_SIZE = 5
-    total_pages = (len(files_in_dir) + PAGE_SIZE - 1) // PAGE_SIZE
-    current_page_files = files_in_dir[:PAGE_SIZE]
-
-    files_text = "\n".join([f"{i + 1}. <code>{file.name}</code>" for i, file in enumerate(current_page_files)])
-    await callback.message.edit_text(
-        f"📂 <b>{category_name}</b> ({1}/{total_pages}):\n{files_text}",
-        reply_markup=get_pagination_keyboard(category_idx, 1, total_pages, current_page_files).as_markup()
-    )
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
@@ -494,68 +774,168 @@ async def show_page_files(callback: CallbackQuery):  # show_page -> show_page_fi
         await callback.answer("⚠️ Бет нөмірінде немесе категорияда қате!", show_alert=True)
         return
 
-    category_dir = FILES_DIR / category_name
-    if not category_dir.exists():  # Бұл тексеру қажет болмауы мүмкін, егер алдыңғы шақыруда болса
+    total_pages, text, markup = render_category_page(category_idx, page)
+    if total_pages == 0:
         await callback.answer(f"❌ {category_name} категориясы табылмады.", show_alert=True)
         return
 
-    files_in_dir = sorted([f for f in category_dir.iterdir() if f.is_file()])
-    PAGE_SIZE = 5
-    total_pages = (len(files_in_dir) + PAGE_SIZE - 1) // PAGE_SIZE
-
-    if not (1 <= page <= total_pages):
+    if text is None:
         await callback.answer("⚠️ Жарамсыз бет нөмірі.", show_alert=True)
         return
 
-    start_idx = (page - 1) * PAGE_SIZE
-    end_idx = min(start_idx + PAGE_SIZE, len(files_in_dir))
-    current_page_files = files_in_dir[start_idx:end_idx]
-
-    files_text = "\n".join(
-        [f"{i + 1 + start_idx}. <code>{file.name}</code>" for i, file in enumerate(current_page_files)])
-    await callback.message.edit_text(
-        f"📂 <b>{category_name}</b> ({page}/{total_pages}):\n{files_text}",
-        reply_markup=get_pagination_keyboard(category_idx, page, total_pages, current_page_files).as_markup()
-    )
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("download_"))
 async def download_file_cmd(callback: CallbackQuery):  # download_file -> download_file_cmd
     try:
-        # download_CATEGORYIDX_FILENAME
+        # download_FILEID (ескі хабарламалардағы download_CATEGORYIDX_FILENAME форматы да қолдау табады)
         parts = callback.data.split("_", 2)
-        category_idx = int(parts[1])
-        file_name = parts[2]  # Файл атында '_' болуы мүмкін, сондықтан қалғанының бәрі файл аты
-
-        if not (0 <= category_idx < len(CATEGORIES)):
-            await callback.answer("⚠️ Жарамсыз категория!", show_alert=True)
-            return
-        category_name = CATEGORIES[category_idx]
+        if len(parts) == 3:
+            category_idx = int(parts[1])
+            if not (0 <= category_idx < len(CATEGORIES)):
+                await callback.answer("⚠️ Жарамсыз категория!", show_alert=True)
+                return
+            file_id = file_registry.id_for(CATEGORIES[category_idx], parts[2])
+        else:
+            file_id = int(parts[1])
     except (IndexError, ValueError) as e:
         logger.error(f"Download callback_data parsing error: {callback.data}, error: {e}")
         await callback.answer("❌ Файл идентификаторы дұрыс емес форматта.", show_alert=True)
         return
 
-    file_path = FILES_DIR / category_name / file_name
-    if not file_path.exists() or not file_path.is_file():
-        logger.warning(f"Download attempt for non-existent file: {file_path}")
+    record = file_registry.get(file_id) if file_id is not None else None
+    if record is None:
+        logger.warning(f"Download attempt for unknown file id: {callback.data}")
         await callback.answer("❌ Файл табылмады.", show_alert=True)
         return
-
+    category_name, file_name = record.category, record.name
+    caption = f"📁 Категория: {category_name}\n📄 Файл: {file_name}"
     try:
-        await callback.message.answer_document(
-            FSInputFile(file_path),
-            caption=f"📁 Категория: {category_name}\n📄 Файл: {file_name}"
-        )
+        sent_message = None
+        if record.tg_file_id:
+            try:
+                sent_message = await callback.message.answer_document(record.tg_file_id, caption=caption)
+                DOWNLOADS_TOTAL.inc("cache")
+            except TelegramBadRequest as e:
+                # Telegram ескі file_id-ні қабылдамады, дискіден қайта жібереміз
+                logger.warning(f"Telegram file_id жарамсыз ({category_name}/{file_name}): {e}")
+                await file_store.run(file_registry.set_tg_file_id, record.id, None)
+        if sent_message is None:
+            # Мазмұн қоймадан (диск не S3) бөліктермен оқылып, тікелей Telegram-ға жіберіледі
+            sent_message = await callback.message.answer_document(file_store.input_file(category_name, file_name),
+                                                                  caption=caption)
+            DOWNLOADS_TOTAL.inc("disk")
+            DOWNLOAD_BYTES_TOTAL.inc(amount=record.size)
+            if sent_message.document:
+                await file_store.run(file_registry.set_tg_file_id, record.id, sent_message.document.file_id)
     except Exception as e:
-        logger.error(f"Файлды жіберу қатесі ({file_path}): {e}")
+        logger.error(f"Файлды жіберу қатесі ({category_name}/{file_name}): {e}")
         await callback.message.answer(
             "❌ Файлды жіберу кезінде қате пайда болды. Файл тым үлкен немесе басқа мәселе болуы мүмкін.")
     finally:
         await callback.answer()
 
 
+# Категорияны не іздеу нәтижелерін бір zip архиві ретінде жүктеу
+archive_jobs: Dict[int, asyncio.Task] = {}  # Пайдаланушы -> орындалып жатқан архив тапсырмасы
+
+
+def archive_filename(title: str, part: int, parts: int) -> str:
+    base = re.sub(r'[\\/:*?"<>|\s]+', "_", title).strip("_")[:40] or "files"
+    return f"{base}.zip" if parts == 1 else f"{base}_{part}.zip"
+
+
+async def send_archive(message: Message, key: Any, version: Any, items: List[ArchiveItem], flat: bool, title: str):
+    status_message = await message.answer(f"📦 {hbold(title)}: архив дайындалуда ({len(items)} файл)...")
+    try:
+        archive, cached = await archive_cache.get(key, version, items, flat)
+        if not archive.parts:
+            await status_message.edit_text(f"❌ {hbold(title)}: архивке қосылатын файл табылмады.")
+            return
+        total = len(archive.parts)
+        for i, part in enumerate(archive.parts, 1):
+            caption = f"📦 {hbold(title)}" + (f" ({i}/{total})" if total > 1 else "")
+            sent_message = None
+            if part.tg_file_id:  # Бұрын жіберілген бөлік: Telegram-ға қайта жүктелмейді
+                try:
+                    sent_message = await message.answer_document(part.tg_file_id, caption=caption)
+                except TelegramBadRequest as e:
+                    logger.warning(f"Архив бөлігінің file_id жарамсыз ({title}): {e}")
+                    part.tg_file_id = None
+            if sent_message is None:
+                sent_message = await message.answer_document(
+                    FSInputFile(part.path, filename=archive_filename(title, i, total)), caption=caption)
+                DOWNLOAD_BYTES_TOTAL.inc(amount=part.size)
+                if sent_message.document:
+                    part.tg_file_id = sent_message.document.file_id
+        DOWNLOADS_TOTAL.inc("archive", amount=archive.files)
+        text = f"✅ {hbold(title)}: {archive.files} файл, {total} бөлік"
+        if archive.skipped:
+            text += (f"\n⚠️ Архивке кірмеді ({len(archive.skipped)}), оларды жеке жүктеңіз: "
+                     + ", ".join(hcode(name) for name in archive.skipped[:10]))
+        await status_message.edit_text(text)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Архивті жіберу қатесі ({title}): {e}")
+        try:
+            await status_message.edit_text(f"❌ {hbold(title)}: архивті жіберу кезінде қате пайда болды.")
+        except Exception as edit_error:  # Мысалы, хабарлама жойылған не желі әлі қолжетімсіз
+            logger.debug(f"Архив статусын жаңарту мүмкін болмады ({title}): {edit_error}")
+
+
+@dp.callback_query(F.data.startswith("zip_"))
+async def download_archive_cmd(callback: CallbackQuery):
+    try:
+        _, scope, value = callback.data.split("_", 2)  # zip_cat_CATEGORYIDX не zip_search_TOKEN
+        if scope == "cat":
+            category_idx = int(value)
+            if not (0 <= category_idx < len(CATEGORIES)):
+                await callback.answer("⚠️ Жарамсыз категория!", show_alert=True)
+                return
+            category_name = CATEGORIES[category_idx]
+            key, version, flat, title = ("category", category_name), catalog.version(category_name), True, category_name
+            entries = [(category_name, entry) for entry in catalog.entries(category_name)]
+        elif scope == "search":
+            session = search_sessions.get(value)
+            if session is None:
+                await callback.answer("⌛ Іздеу нәтижелерінің мерзімі өтті. Қайта іздеңіз.", show_alert=True)
+                return
+            query, results = session
+            entries = [(cat_name, catalog.get(cat_name, file_name)) for _, cat_name, file_name in results]
+            entries = [(cat_name, entry) for cat_name, entry in entries if entry is not None]
+            # Кілт - нәтижедегі файлдар жиыны, нұсқа - олардың категорияларының нұсқалары
+            key = ("search", tuple(sorted((cat_name, entry.name) for cat_name, entry in entries)))
+            version = tuple(sorted((cat_name, catalog.version(cat_name)) for cat_name in {c for c, _ in entries}))
+            flat, title = False, f"Іздеу {query}"
+        else:
+            raise ValueError(scope)
+    except ValueError:
+        await callback.answer("⚠️ Архив сұранысында қате!", show_alert=True)
+        return
+
+    if not entries:
+        await callback.answer("ℹ️ Жүктейтін файл жоқ.", show_alert=True)
+        return
+    total_size = sum(entry.size for _, entry in entries)
+    if total_size > config['archive_max_total_size']:
+        await callback.answer(f"⚠️ Файлдар тым көп ({total_size // 1024 // 1024}MB). "
+                              f"Шегі: {config['archive_max_total_size'] // 1024 // 1024}MB.", show_alert=True)
+        return
+    user_id = callback.from_user.id
+    if user_id in archive_jobs:
+        await callback.answer("⏳ Алдыңғы архивіңіз әлі дайындалуда.", show_alert=True)
+        return
+    await callback.answer("📦 Архив дайындалуда...")
+    items = [ArchiveItem(cat_name, entry.name, entry.size, entry.mtime) for cat_name, entry in entries]
+    # Фондық тапсырма: архив құрастырылып жатқанда чаттың басқа сұраныстары күтпейді
+    task = asyncio.create_task(send_archive(callback.message, key, version, items, flat, title))
+    archive_jobs[user_id] = task
+    task.add_done_callback(lambda _: archive_jobs.pop(user_id, None))
+
+
 # Файлдарды іздеу
 @dp.message(F.text == "🔍 Файлдарды іздеу")
 @dp.message(Command("search"))
@@ -574,39 +954,69 @@ async def perform_search_cmd(message: Message, state: FSMContext):  # perform_se
         await message.answer("⚠️ Іздеу үшін кем дегенде 3 таңба енгізіңіз.", reply_markup=main_menu_keyboard())
         return
 
-    results = []  # [(category_idx, category_name, file_name), ...]
-    for idx, cat_name in enumerate(CATEGORIES):
-        category_dir = FILES_DIR / cat_name
-        if category_dir.exists() and category_dir.is_dir():
-            for file_path_obj in category_dir.iterdir():
-                if file_path_obj.is_file():
-                    # Іздеу логикасын жақсартуға болады (мысалы, сөздер бойынша)
-                    if query in file_path_obj.name.lower() or query in cat_name.lower():
-                        results.append((idx, cat_name, file_path_obj.name))
+    category_indexes = {cat_name: idx for idx, cat_name in enumerate(CATEGORIES)}
+    results = [(category_indexes[cat_name], cat_name, file_name)  # [(category_idx, category_name, file_name), ...]
+               for cat_name, file_name in search_index.search(query, SEARCH_MAX_RESULTS) if cat_name in category_indexes]
 
     if not results:
         await message.answer(f"🔍 '{query}' бойынша нәтиже табылмады.", reply_markup=main_menu_keyboard())
         return
 
-    # TODO: Іздеу нәтижелерін беттерге бөлу (pagination)
-    results_to_show = results[:10]  # Алғашқы 10 нәтиже
+    search_token = search_sessions.put(query, results)
+    text, builder = render_search_page(search_token, query, results, 1)
+    await message.answer(text, reply_markup=builder.as_markup())
+
+
+def render_search_page(search_token: str, query: str, results: list, page: int):
+    total_pages = (len(results) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    start_idx = (page - 1) * SEARCH_PAGE_SIZE
+    results_to_show = results[start_idx:start_idx + SEARCH_PAGE_SIZE]
 
     builder = InlineKeyboardBuilder()
-    text_parts = [f"🔍 '{query}' бойынша табылған нәтижелер ({len(results)}). Көрсетілгені: {len(results_to_show)}:"]
-
-    for i, (cat_idx, cat_name_res, file_name_res) in enumerate(results_to_show):
-        text_parts.append(f"{i + 1}. <b>{cat_name_res}</b>: <code>{file_name_res}</code>")
-        # callback_data ұзындығын тексеру маңызды!
-        callback_data_str = f"download_{cat_idx}_{file_name_res}"
-        if len(callback_data_str.encode('utf-8')) < 64:
-            builder.button(text=f"⬇️ {i + 1}. {file_name_res[:20]}", callback_data=callback_data_str)
-        else:
-            logger.warning(f"Search result callback_data too long, skipping button: {callback_data_str}")
-            # Тым ұзын болса батырманы қоспауға болады немесе басқа әрекет
+    text_parts = [f"🔍 '{query}' бойынша табылған нәтижелер ({len(results)}). Бет: {page}/{total_pages}:"]
+
+    for i, (cat_idx, cat_name_res, file_name_res) in enumerate(results_to_show, start_idx + 1):
+        text_parts.append(f"{i}. <b>{cat_name_res}</b>: <code>{file_name_res}</code>")
+        file_id = file_registry.id_for(cat_name_res, file_name_res)
+        if file_id is not None:  # Іздеуден кейін жойылған файлдарға батырма қоспаймыз
+            builder.button(text=f"⬇️ {i}. {file_name_res[:20]}", callback_data=f"download_{file_id}")
     builder.adjust(1)
+
+    pagination_row = []
+    if page > 1:
+        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_search_{search_token}_{page - 1}"))
+    pagination_row.append(InlineKeyboardButton(text=f"{page}/{total_pages}", callback_data="noop"))
+    if page < total_pages:
+        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_search_{search_token}_{page + 1}"))
+    builder.row(*pagination_row)
+    builder.row(InlineKeyboardButton(text="📦 Барлығын жүктеу (zip)", callback_data=f"zip_search_{search_token}"))
     builder.row(InlineKeyboardButton(text="🔙 Негізгі мәзір", callback_data="back_to_main_menu"))
+    return "\n".join(text_parts), builder
+
+
+@dp.callback_query(F.data.startswith("page_search_"))
+async def show_search_page(callback: CallbackQuery):
+    try:
+        parts = callback.data.split("_")  # page_search_TOKEN_PAGE
+        search_token = parts[2]
+        page = int(parts[3])
+    except (IndexError, ValueError):
+        await callback.answer("⚠️ Бет нөмірінде қате!", show_alert=True)
+        return
 
-    await message.answer("\n".join(text_parts), reply_markup=builder.as_markup())
+    session = search_sessions.get(search_token)
+    if session is None:
+        await callback.answer("⌛ Іздеу нәтижелерінің мерзімі өтті. Қайта іздеңіз.", show_alert=True)
+        return
+    query, results = session
+    total_pages = (len(results) + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    if not (1 <= page <= total_pages):
+        await callback.answer("⚠️ Жарамсыз бет нөмірі.", show_alert=True)
+        return
+
+    text, builder = render_search_page(search_token, query, results, page)
+    await callback.message.edit_text(text, reply_markup=builder.as_markup())
+    await callback.answer()
 
 
 # Статистика
@@ -614,10 +1024,8 @@ async def perform_search_cmd(message: Message, state: FSMContext):  # perform_se
 @dp.message(Command("stats"))
 async def show_stats_cmd(message: Message):  # show_stats -> show_stats_cmd
     if not is_authorized(message.from_user.id): return
-    stats = load_stats()
-    user_id_str = str(message.from_user.id)
-    if user_id_str in stats and stats[user_id_str].get("files_uploaded", 0) > 0:
-        user_s = stats[user_id_str]
+    user_s = stats_store.get(message.from_user.id)
+    if user_s and user_s.get("files_uploaded", 0) > 0:
         await message.answer(
             f"📊 <b>Жеке статистика:</b>\n"
             f"👤 Пайдаланушы: {user_s.get('username', 'N/A')}\n"
@@ -631,27 +1039,34 @@ async def show_stats_cmd(message: Message):  # show_stats -> show_stats_cmd
 @dp.message(Command("allstats"))  # Әкімшілер үшін
 async def show_all_stats_cmd(message: Message):  # show_all_stats -> show_all_stats_cmd
     if message.from_user.id not in ADMIN_IDS: return
-    stats = load_stats()
-    if not stats:
-        await message.answer("📊 Статистика әлі жиналмаған.")
-        return
+    # /allstats - барлық уақыт, /allstats 7 немесе /allstats 30 - соңғы күндер
+    args = message.text.split(maxsplit=1)
+    days = None
+    if len(args) == 2:
+        if args[1].strip() not in ("7", "30"):
+            await message.reply("⚠️ Формат: /allstats, /allstats 7 немесе /allstats 30")
+            return
+        days = int(args[1].strip())
 
-    # Файл жүктеген пайдаланушыларды ғана сұрыптау
-    valid_stats = {uid: udata for uid, udata in stats.items() if udata.get("files_uploaded", 0) > 0}
-    if not valid_stats:
+    if days is None:
+        total_users_with_uploads, total_uploads = stats_store.totals()
+        top_stats = [(user_id, user_s, user_s.get('files_uploaded', 0)) for user_id, user_s in stats_store.top()]
+        title = "📊 <b>Жалпы статистика (Топ-10 белсенді):</b>\n\n"
+    else:
+        top_stats, total_users_with_uploads, total_uploads = stats_store.top_window(days)
+        title = f"📊 <b>Соңғы {days} күндегі статистика (Топ-10 белсенді):</b>\n\n"
+
+    if not top_stats:
         await message.answer("📊 Файл жүктеген пайдаланушылар әлі жоқ.")
         return
 
-    sorted_stats = sorted(valid_stats.items(), key=lambda x: x[1].get('files_uploaded', 0), reverse=True)[:10]
-    reply_text = "📊 <b>Жалпы статистика (Топ-10 белсенді):</b>\n\n"
-    for i, (user_id, user_s) in enumerate(sorted_stats, 1):
+    reply_text = title
+    for i, (user_id, user_s, uploads) in enumerate(top_stats, 1):
         reply_text += (
             f"{i}. 👤 {user_s.get('username', f'User_{user_id}')}\n"
-            f"   📤 Жүктелген файлдар: {user_s.get('files_uploaded', 0)}\n"
+            f"   📤 Жүктелген файлдар: {uploads}\n"
             f"   📅 Соңғы белсенділік: {user_s.get('last_activity', 'N/A')}\n\n"
         )
-    total_users_with_uploads = len(valid_stats)
-    total_uploads = sum(user.get('files_uploaded', 0) for user in valid_stats.values())
     reply_text += (
         f"👥 <b>Файл жүктеген пайдаланушылар:</b> {total_users_with_uploads}\n"
         f"📦 <b>Жалпы жүктемелер:</b> {total_uploads}"
@@ -707,20 +1122,216 @@ async def delete_file_cmd(message: Message):  # delete_file -> delete_file_cmd
         await message.reply("⚠️ Команданы талдау кезінде қате.")
         return
 
-    file_path = FILES_DIR / category_name / file_name
-    if not file_path.exists() or not file_path.is_file():
-        await message.reply(f"❌ Файл табылмады: {category_name}/{file_name}")
-        return
     try:
-        file_path.unlink()
-        # TODO: Google Drive-тан жою функциясын қосу керек, егер GOOGLE_DRIVE_ENABLED болса
-        # delete_from_drive(str(file_path), category_name, file_name)
+        if not await file_store.delete(category_name, file_name):
+            await message.reply(f"❌ Файл табылмады: {category_name}/{file_name}")
+            return
+        await file_store.run(catalog.remove, category_name, file_name)  # Белгі алу мен SQLite жазуы
+        # Drive-тағы көшірмесі фонда жойылады: жауап Drive API-ін күтпейді
+        task = asyncio.create_task(delete_from_drive(category_name, file_name))
+        drive_sync_tasks.add(task)
+        task.add_done_callback(drive_sync_tasks.discard)
         await message.reply(f"✅ Файл <code>{file_name}</code> ({category_name}) жойылды.")
     except Exception as e:
-        logger.error(f"Файлды жою қатесі ({file_path}): {e}")
+        logger.error(f"Файлды жою қатесі ({category_name}/{file_name}): {e}")
         await message.reply(f"❌ Файлды жою кезінде қате: {str(e)}")
 
 
+drive_sync_tasks = set()  # Жеке жоюлардың Drive синхрондауы (тоқтағанда аяқталуы күтіледі)
+
+
+async def delete_from_drive(category_name: str, file_name: str):
+    try:
+        await file_store.run(sync_drive_bulk, ACTION_DELETE, category_name, None, [(file_name, None)])
+    except Exception as e:
+        logger.error(f"Drive-тан жою қатесі ({category_name}/{file_name}): {e}")
+
+
+# Жаппай операциялар (әкімшілер үшін)
+bulk_lock = asyncio.Lock()  # Бір уақытта бір ғана жаппай тапсырма
+bulk_tasks = set()  # Фондық тапсырмаларға сілтеме (GC жинап кетпеуі үшін)
+BULK_PREVIEW_LIMIT = 20
+
+
+def resolve_category(value: str) -> Optional[str]:
+    # Категория атымен не индексімен берілуі мүмкін (/delete сияқты)
+    if value.isdigit():
+        idx = int(value)
+        return CATEGORIES[idx] if 0 <= idx < len(CATEGORIES) else None
+    return value if value in CATEGORIES else None
+
+
+def sync_drive_bulk(action: str, category: str, target: Optional[str], changed: List[Tuple[str, Optional[str]]]) -> int:
+    # Жойылған/көшірілген файлдардың Drive көшірмелерін batch сұраныстарымен өңдеу (пулда орындалады)
+    client = get_drive_service()
+    if not client:
+        return 0
+    paths = {}
+    for old_name, _ in changed:
+        path = file_store.local_path(category, old_name)
+        if path is not None:  # Объект қоймасындағы файлдар Drive-ға көшірілмейді
+            paths[old_name] = str(path)
+    drive_ids = drive_queue.drive_ids(paths.values())
+    if not drive_ids:
+        return 0
+    if action == ACTION_DELETE:
+        done = client.delete_many(drive_ids.values())
+        drive_queue.mark_deleted([path for path, drive_id in drive_ids.items() if drive_id in done])
+        return len(done)
+    done = client.move_many(drive_ids.values(), category, target)
+    drive_queue.relocate([(paths[old_name], str(file_store.local_path(target, new_name)), target)
+                          for old_name, new_name in changed
+                          if old_name in paths and drive_ids.get(paths[old_name]) in done])
+    return len(done)
+
+
+async def run_bulk_job(status_message: Message, job: BulkJob, title: str):
+    async def report(processed: int, total: int):
+        await status_message.edit_text(f"⏳ {title}: {processed}/{total}")
+
+    job.progress = report
+    try:
+        async with bulk_lock:
+            started = time.perf_counter()
+            result = await job.run()
+        text = (f"✅ {title} аяқталды: {result.done}/{result.matched} файл "
+                f"({time.perf_counter() - started:.1f} с)")
+        if result.drive_synced:
+            text += f"\n☁️ Google Drive-та өңделді: {result.drive_synced}"
+        if result.failed:
+            text += f"\n⚠️ Өңделмеді: {result.failed}"
+        if result.errors:
+            text += "\n" + "\n".join(f"❌ {error}" for error in result.errors[:5])
+        await status_message.edit_text(text)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Жаппай тапсырма қатесі ({title}): {e}")
+        await status_message.edit_text(f"❌ {title}: қате орын алды: {e}")
+
+
+async def start_bulk_job(message: Message, action: str, selection: Dict[str, List[CatalogEntry]],
+                         target: Optional[str], dry: bool, title: str):
+    selection = {category: entries for category, entries in selection.items() if entries}
+    total = sum(len(entries) for entries in selection.values())
+    if not total:
+        await message.reply("ℹ️ Шартқа сәйкес файл табылмады.")
+        return
+    if dry:  # Алдын ала қарау: ештеңе өзгертілмейді
+        names = [f"{category}/{entry.name}" for category, entries in selection.items() for entry in entries]
+        total_size = sum(entry.size for entries in selection.values() for entry in entries)
+        preview = "\n".join(hcode(name) for name in names[:BULK_PREVIEW_LIMIT])
+        more = f"\n... тағы {total - BULK_PREVIEW_LIMIT}" if total > BULK_PREVIEW_LIMIT else ""
+        await message.reply(f"🔎 {title}: {total} файл ({total_size / 1024 / 1024:.1f}MB)\n{preview}{more}")
+        return
+    if bulk_lock.locked():
+        await message.reply("⏳ Басқа жаппай тапсырма орындалуда, ол аяқталғаннан кейін қайталаңыз.")
+        return
+    status_message = await message.reply(f"⏳ {title}: 0/{total}")
+    job = BulkJob(file_store, catalog, action, selection, target, drive_sync=sync_drive_bulk)
+    # Фондық тапсырма: handler бірден аяқталады, чаттың келесі жаңартулары күтпейді
+    task = asyncio.create_task(run_bulk_job(status_message, job, title))
+    bulk_tasks.add(task)
+    task.add_done_callback(bulk_tasks.discard)
+
+
+def parse_admin_bulk_args(message: Message) -> Optional[Tuple[List[str], Any, bool]]:
+    parts = message.text.split(maxsplit=1)
+    return parse_bulk_args(parts[1]) if len(parts) == 2 else None
+
+
+# /bulkdelete "Категория" "*.docx" "лекция 1.pdf" [older=30d] [larger=10MB] [smaller=1KB] [dry]
+@dp.message(Command("bulkdelete"))
+async def bulk_delete_cmd(message: Message):
+    if message.from_user.id not in ADMIN_IDS: return
+    try:
+        parsed = parse_admin_bulk_args(message)
+    except BulkArgsError as e:
+        await message.reply(f"⚠️ {e}")
+        return
+    if not parsed or len(parsed[0]) < 2:
+        await message.reply(
+            "⚠️ Формат: /bulkdelete \"Категория\" \"файл.pdf\" \"*.docx\" ... [older=30d] [larger=10MB] [dry]")
+        return
+    args, file_filter, dry = parsed
+    category_name = resolve_category(args[0])
+    if category_name is None:
+        await message.reply(f"❌ Категория табылмады: {args[0]}")
+        return
+    file_filter.patterns = args[1:]
+    selection = {category_name: file_filter.select(catalog.entries(category_name))}
+    await start_bulk_job(message, ACTION_DELETE, selection, None, dry, f"Жою ({category_name})")
+
+
+# /move "Категория" "Жаңа категория" "*.pdf" ... [older=...] [dry]
+@dp.message(Command("move"))
+async def bulk_move_cmd(message: Message):
+    if message.from_user.id not in ADMIN_IDS: return
+    try:
+        parsed = parse_admin_bulk_args(message)
+    except BulkArgsError as e:
+        await message.reply(f"⚠️ {e}")
+        return
+    if not parsed or len(parsed[0]) < 3:
+        await message.reply("⚠️ Формат: /move \"Категория\" \"Жаңа категория\" \"*.pdf\" ... [older=30d] [dry]")
+        return
+    args, file_filter, dry = parsed
+    source, target = resolve_category(args[0]), resolve_category(args[1])
+    if source is None or target is None:
+        await message.reply(f"❌ Категория табылмады: {args[0] if source is None else args[1]}")
+        return
+    if source == target:
+        await message.reply("⚠️ Категориялар бірдей.")
+        return
+    file_filter.patterns = args[2:]
+    selection = {source: file_filter.select(catalog.entries(source))}
+    await start_bulk_job(message, ACTION_MOVE, selection, target, dry, f"Көшіру ({source} → {target})")
+
+
+# /purge "Категория"|* [glob ...] older=180d [larger=...] [smaller=...] [dry]
+@dp.message(Command("purge"))
+async def purge_cmd(message: Message):
+    if message.from_user.id not in ADMIN_IDS: return
+    try:
+        parsed = parse_admin_bulk_args(message)
+    except BulkArgsError as e:
+        await message.reply(f"⚠️ {e}")
+        return
+    if not parsed or not parsed[0]:
+        await message.reply("⚠️ Формат: /purge \"Категория\"|* [\"*.zip\"] older=180d [larger=10MB] [dry]")
+        return
+    args, file_filter, dry = parsed
+    if file_filter.older_than is None and file_filter.larger_than is None and file_filter.smaller_than is None:
+        await message.reply("⚠️ Кемінде бір шарт керек: older=, larger= немесе smaller=")
+        return
+    if args[0] == "*":
+        categories = list(CATEGORIES)
+    else:
+        category_name = resolve_category(args[0])
+        if category_name is None:
+            await message.reply(f"❌ Категория табылмады: {args[0]}")
+            return
+        categories = [category_name]
+    file_filter.patterns = args[1:]
+    now = time.time()
+    selection = {category: file_filter.select(catalog.entries(category), now) for category in categories}
+    await start_bulk_job(message, ACTION_DELETE, selection, None, dry, "Тазалау")
+
+
+# Каталогты қоймамен қайта салыстыру (боттан тыс өзгерген файлдар үшін)
+@dp.message(Command("reindex"))
+async def reindex_cmd(message: Message):
+    if message.from_user.id not in ADMIN_IDS: return
+    status_message = await message.reply("⏳ Каталог қайта сканерленуде...")
+    try:
+        changes = await file_store.run(functools.partial(catalog.refresh, list(CATEGORIES), force=True))
+        await file_store.run(catalog.save)
+        await status_message.edit_text(f"✅ Каталог жаңартылды: {changes} өзгеріс.")
+    except Exception as e:
+        logger.error(f"Каталогты қайта сканерлеу қатесі: {e}")
+        await status_message.edit_text(f"❌ Каталогты қайта сканерлеу кезінде қате: {e}")
+
+
 # Категория қосу (әкімшілер үшін)
 @dp.message(Command("addcategory"))
 async def add_category_cmd_start(message: Message, state: FSMContext):  # add_category_command -> add_category_cmd_start
@@ -741,6 +1352,40 @@ async def process_category_name_input(message: Message,
     await process_add_category(message, category_name)
 
 
+def load_config_categories() -> List[str]:
+    cfg = configparser.ConfigParser()
+    cfg.read(CONFIG_FILE, encoding='utf-8')
+    return [cat.strip() for cat in cfg.get('General', 'CATEGORIES', fallback="").split(',') if cat.strip()]
+
+
+def persist_categories(known: List[str]) -> List[str]:
+    # Файлдағы тізімге қосамыз (үстінен жазбаймыз): басқа жұмысшы қосқан категория жоғалмайды
+    cfg = configparser.ConfigParser()
+    cfg.read(CONFIG_FILE, encoding='utf-8')
+    if 'General' not in cfg: cfg['General'] = {}
+    categories = load_config_categories()
+    categories += [cat for cat in known if cat not in categories]
+    cfg['General']['CATEGORIES'] = ','.join(categories)
+    tmp_file = CONFIG_FILE.with_suffix(".tmp")  # Басқа жұмысшылар жартылай жазылған файлды оқымайды
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        cfg.write(f)
+    os.replace(tmp_file, CONFIG_FILE)
+    return categories
+
+
+def adopt_categories(categories: List[str]) -> List[str]:
+    """
+    config.ini-дағы категориялар ретін қабылдайды (callback_data индекстері барлық жұмысшыда
+    бірдей болуы үшін); файлда әлі жоқ жергілікті категориялар соңында қалады. Жаңаларын қайтарады.
+    """
+    merged = categories + [cat for cat in CATEGORIES if cat not in categories]
+    added = [cat for cat in merged if cat not in CATEGORIES]
+    if merged != CATEGORIES:
+        CATEGORIES[:] = merged
+        markup_cache.set_categories(CATEGORIES)
+    return added
+
+
 async def process_add_category(message: Message, category_name: str):  # add_category -> process_add_category
     global CATEGORIES
     if not category_name:
@@ -751,21 +1396,19 @@ async def process_add_category(message: Message, category_name: str):  # add_cat
         return
     try:
         CATEGORIES.append(category_name)
-        (FILES_DIR / category_name).mkdir(exist_ok=True, parents=True)
+        markup_cache.set_categories(CATEGORIES)
+        await file_store.mkdir(category_name)
+        await file_store.run(catalog.add_category, category_name)  # Жаңа каталогты сканерлеу
 
-        # Конфигурация файлын жаңарту
-        cfg = configparser.ConfigParser()
-        cfg.read(CONFIG_FILE, encoding='utf-8')
-        if 'General' not in cfg: cfg['General'] = {}
-        cfg['General']['CATEGORIES'] = ','.join(CATEGORIES)
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            cfg.write(f)
+        # Конфигурация файлын жаңарту: басқа жұмысшылар оны shared_state_sync-те оқиды
+        adopt_categories(await file_store.run(persist_categories, list(CATEGORIES)))
 
         await message.reply(f"✅ <b>{category_name}</b> категориясы қосылды.", reply_markup=main_menu_keyboard())
     except Exception as e:
         logger.error(f"Категория қосу қатесі ({category_name}): {e}")
         # Қате болса, тізімнен алып тастауға тырысу (егер қосылып үлгерсе)
         if category_name in CATEGORIES: CATEGORIES.remove(category_name)
+        markup_cache.set_categories(CATEGORIES)
         await message.reply(f"❌ Категорияны қосу кезінде қате: {str(e)}", reply_markup=main_menu_keyboard())
 
 
@@ -777,16 +1420,22 @@ async def show_help_cmd(message: Message):  # show_help -> show_help_cmd
     if message.from_user.id in ADMIN_IDS:
         admin_help = (
             f"\n\n{hbold('👨‍💻 Әкімші командалары:')}\n"
-            f"/allstats - Барлық статистика\n"
+            f"/allstats [7|30] - Барлық статистика (немесе соңғы 7/30 күн)\n"
             f"/addcategory [аты] - Жаңа категория қосу\n"
             f"/delete \"Кат. аты\" \"Файл аты\" - Файлды жою\n"
             f"/delete Кат.Индексі \"Файл аты\" - Файлды жою\n"
+            f"/bulkdelete \"Кат.\" \"*.docx\" ... - Бірнеше файлды жою\n"
+            f"/move \"Кат.\" \"Жаңа кат.\" \"*.pdf\" - Файлдарды көшіру\n"
+            f"/purge \"Кат.\"|* older=180d [larger=10MB] - Ескі/үлкен файлдарды тазалау\n"
+            f"/reindex - Каталогты қайта сканерлеу\n"
+            f"(dry қосылса - тек тізім көрсетіледі)\n"
         )
     help_text = (
         f"📚 {hbold('StudyShareBot Көмек')}\n\n"
         f"📤 Файл жүктеу - Оқу материалдарын жүктеу\n"
         f"📋 Файлдар тізімі - Категориялар бойынша файлдарды көру\n"
         f"🔍 Іздеу - Файлдарды аты бойынша іздеу\n"
+        f"📦 Барлығын жүктеу - Категорияны не іздеу нәтижесін zip архивімен алу\n"
         f"📊 Статистика - Жеке статистиканы көру\n"
         f"ℹ️ Көмек - Осы хабарлама"
         f"{admin_help}"
@@ -819,10 +1468,113 @@ async def handle_unknown_cmd(message: Message):  # handle_unknown -> handle_unkn
 
 
 # Ботты іске қосу функциялары
+async def catalog_autosave():
+    # Каталог индексін мезгіл-мезгіл дискіге жазу (әр жүктеуде емес)
+    while True:
+        await asyncio.sleep(CATALOG_SAVE_INTERVAL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, catalog.save)
+        except Exception as e:
+            logger.error(f"Каталог индексін автосақтау қатесі: {e}")
+
+
+async def shared_state_sync():
+    # Басқа webhook жұмысшылары қосқан/жойған файлдар мен статистиканы жадқа оқу
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SHARED_STATE_SYNC_INTERVAL)
+        try:
+            added = adopt_categories(await loop.run_in_executor(None, load_config_categories))
+            if added:  # Басқа жұмысшыда /addcategory: жаңа категория refresh()-те сканерленеді
+                logger.info(f"Басқа жұмысшы қосқан категориялар: {added}")
+            await file_store.run(catalog.refresh, list(CATEGORIES))
+            await loop.run_in_executor(None, stats_store.sync)
+        except Exception as e:
+            logger.error(f"Жұмысшылар арасындағы синхрондау қатесі: {e}")
+
+
+async def stats_autocompact():
+    # Статистика журналын мезгіл-мезгіл снапшотқа біріктіру
+    while True:
+        await asyncio.sleep(STATS_COMPACT_INTERVAL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, stats_store.compact)
+        except Exception as e:
+            logger.error(f"Статистика журналын біріктіру қатесі: {e}")
+
+
+metrics_runner = None  # Бөлек /metrics сервері (Metrics PORT көрсетілсе)
+maintenance_tasks = set()  # Мерзімдік фондық тапсырмалар (тоқтағанда болдырылмайды)
+
+
+def start_maintenance(coro):
+    task = asyncio.create_task(coro)
+    maintenance_tasks.add(task)
+    task.add_done_callback(maintenance_tasks.discard)
+
+
+async def init_storage():
+    global metrics_runner
+    await file_store.ensure_dirs(CATEGORIES)
+    await asyncio.get_running_loop().run_in_executor(archive_cache.executor, archive_cache.prepare)
+    is_primary = worker_index == 0
+    await file_store.run(catalog.load, CATEGORIES)
+    if is_primary:  # Каталог индексін тек бір жұмысшы жазады
+        start_maintenance(catalog_autosave())
+    await asyncio.get_running_loop().run_in_executor(None, stats_store.load)
+    start_maintenance(stats_autocompact())
+    if WEBHOOK_WORKERS > 1:
+        start_maintenance(shared_state_sync())
+    loop_monitor.start()
+    outbound_queue.start()
+    if config['metrics_port']:  # Әр жұмысшының өз порты: PORT + жұмысшы нөмірі
+        metrics_runner = await start_metrics_server(metrics, config['metrics_host'],
+                                                    config['metrics_port'] + worker_index)
+    # Аяқталмаған Drive тапсырмаларын тек негізгі жұмысшы жалғастырады
+    await drive_queue.start(resume_pending=is_primary)
+    # Клиентті құру (credentials оқу, discovery) циклді бөгемеуі үшін executor-да
+    drive_client = await asyncio.get_running_loop().run_in_executor(None, get_drive_service)
+    if drive_client and is_primary:
+        start_maintenance(warm_drive_folders(drive_client))
+
+
+async def warm_drive_folders(client):
+    # Барлық категориялардың Drive папкаларын алдын ала дайындау; қате жүктеу кезінде қайталанады
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, client.warm, list(CATEGORIES))
+    except Exception as e:
+        logger.error(f"Drive папкаларын алдын ала дайындау қатесі: {e}")
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    loop_monitor.stop()
+    for task in list(maintenance_tasks):  # Соңғы сақтау төменде тікелей орындалады
+        task.cancel()
+    await asyncio.gather(*maintenance_tasks, return_exceptions=True)
+    for task in list(bulk_tasks):  # Аяқталмаған жаппай тапсырма: орындалған топтар сақталады
+        task.cancel()
+    await asyncio.gather(*bulk_tasks, return_exceptions=True)
+    for task in list(archive_jobs.values()):
+        task.cancel()
+    await asyncio.gather(*archive_jobs.values(), return_exceptions=True)
+    await asyncio.gather(*drive_sync_tasks, return_exceptions=True)
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    await drive_queue.stop()
+    await outbound_queue.stop()  # Drive хабарламаларынан кейін: кезектегі жіберулерді аяқтау
+    if worker_index == 0:
+        catalog.save()
+    file_registry.close()
+    file_store.close()
+    archive_cache.close()
+    content_store.close()
+    stats_store.close()
+    await dp.storage.close()
+    logger.info("Каталог индексі сақталды")
+
+
 async def on_startup_polling(dispatcher: Dispatcher):
-    FILES_DIR.mkdir(exist_ok=True, parents=True)
-    for category in CATEGORIES:
-        (FILES_DIR / category).mkdir(exist_ok=True, parents=True)
+    await init_storage()
     await bot.delete_webhook(drop_pending_updates=True)
     logger.info("Bot polling режимінде іске қосылды")
     logger.info(f"Категориялар: {CATEGORIES}")
@@ -830,9 +1582,9 @@ async def on_startup_polling(dispatcher: Dispatcher):
 
 
 async def on_startup_webhook(dispatcher: Dispatcher):
-    FILES_DIR.mkdir(exist_ok=True, parents=True)
-    for category in CATEGORIES:
-        (FILES_DIR / category).mkdir(exist_ok=True, parents=True)
+    await init_storage()
+    if worker_index != 0:  # Webhook-ты Telegram-да тек негізгі жұмысшы тіркейді
+        return
     webhook_url = f"{config['webhook_host']}/webhook/{TOKEN}"
     await bot.set_webhook(url=webhook_url, drop_pending_updates=True, allowed_updates=dp.resolve_used_update_types())
     logger.info(f"Bot webhook режимінде іске қосылды: {webhook_url}")
@@ -840,35 +1592,63 @@ async def on_startup_webhook(dispatcher: Dispatcher):
     logger.info(f"Админ ID: {ADMIN_IDS}")
 
 
-async def main():
-    # dp.startup.register(on_startup_polling) # Polling үшін
-    # await dp.start_polling(bot)
-
+async def webhook_main(index: int = 0, workers: int = 1, secret: str = ""):
     # Webhook үшін (егер config.ini-да webhook_host көрсетілсе)
-    if config['webhook_host']:
-        from aiohttp import web
-        dp.startup.register(on_startup_webhook)
+    global worker_index
+    worker_index = index
+    if workers > 1:
+        metrics.const_labels["worker"] = index
+        # Әр жұмысшының өз лог файлы: ротация бір файлды бірнеше процесс бөліскенде бүлінеді
+        base_name, ext = os.path.splitext(config['log_file'])
+        configure_logging(f"{base_name}.worker{index}{ext}")
+    dp.startup.register(on_startup_webhook)
+    dp.shutdown.register(on_shutdown)
+
+    # Маршрутты TOKEN арқылы емес, басқа жолмен қорғауға болады, мысалы /
+    # Бірақ TOKEN-мен маршрут қарапайымдау
+    webhook_path = f"/webhook/{TOKEN}"
+    # Telegram-ға жауап бірден қайтарылады, жаңартулар чат бойынша реттелген ішкі кезекте өңделеді
+    server = WebhookServer(lambda raw: dp.feed_raw_update(bot, raw), webhook_path,
+                           config['webhook_listen'], config['webhook_port'],
+                           worker_index=index, workers=workers, internal_port=config['webhook_internal_port'],
+                           secret=secret, max_pending=config['webhook_queue_size'],
+                           extra_routes=[("/metrics", metrics_handler(metrics))] if config['metrics_enabled'] else [])
+    metrics.gauge("webhook_pending_updates", "Ішкі кезектегі өңделмеген жаңартулар",
+                  func=lambda: server.fanout.pending)
+    stop_event = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+    except NotImplementedError:  # Windows
+        pass
+    # Webhook режимінде startup/shutdown оқиғаларын өзіміз шақырамыз
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await server.start()
+        logger.info(f"AIOHTTP сервері іске қосылды: {config['webhook_listen']}:{config['webhook_port']}")
+        await stop_event.wait()  # Сервердің тоқтауын күту
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
 
-        app = web.Application()
-        # Маршрутты TOKEN арқылы емес, басқа жолмен қорғауға болады, мысалы /
-        # Бірақ TOKEN-мен маршрут қарапайымдау
-        webhook_path = f"/webhook/{TOKEN}"
 
-        async def telegram_webhook_handler(request: web.Request):
-            update = types.Update(**await request.json())
-            await dp.feed_update(bot=bot, update=update)
-            return web.Response()
+def run_webhook_worker(index: int, workers: int, secret: str):
+    # Жеке процестегі webhook жұмысшысының кіру нүктесі (run_workers шақырады)
+    try:
+        asyncio.run(webhook_main(index, workers, secret))
+    except KeyboardInterrupt:
+        pass
 
-        app.router.add_post(webhook_path, telegram_webhook_handler)
 
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(runner, host=config['webhook_listen'], port=config['webhook_port'])
-        await site.start()
-        logger.info(f"AIOHTTP сервері іске қосылды: {config['webhook_listen']}:{config['webhook_port']}")
-        await asyncio.Event().wait()  # Сервердің тоқтауын күту
+async def main():
+    # dp.startup.register(on_startup_polling) # Polling үшін
+    # await dp.start_polling(bot)
+
+    if config['webhook_host']:
+        await webhook_main()
     else:  # Polling режимі
         dp.startup.register(on_startup_polling)
+        dp.shutdown.register(on_shutdown)
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
@@ -880,7 +1660,11 @@ if __name__ == "__main__":
         logger.warning("Әкімші ID-лары config.ini файлында көрсетілмеген! Кейбір функциялар жұмыс істемеуі мүмкін.")
 
     try:
-        asyncio.run(main())
+        if WEBHOOK_WORKERS > 1:
+            logger.info(f"Webhook режимі: {WEBHOOK_WORKERS} жұмысшы процесс")
+            run_workers(run_webhook_worker, WEBHOOK_WORKERS, WEBHOOK_WORKERS, secrets.token_hex(16))
+        else:
+            asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot тоқтатылды.")
     except Exception as e:
@@ -0,0 +1,68 @@
+# StudyShareBot: дайын батырмалар (markup) кэші - категориялар мәзірі және файлдар беттері
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+
+class MarkupCache:
+    """
+    Жиі жіберілетін inline-батырмаларды бір рет құрастырып, қайта қолданады.
+    Категориялар мәзірі категориялар тізімі өзгергенде (set_categories) қайта құрылады.
+    Файлдар беттері (мәтін + батырмалар) LRU-да каталог нұсқасымен бірге сақталады: категория
+    өзгерсе, нұсқа өседі де ескі бет келесі сұраныста қайта құрастырылады.
+    """
+
+    def __init__(self, max_pages: int = 2048):
+        self.max_pages = max_pages
+        self._categories: Tuple[str, ...] = ()
+        self._menus: Dict[str, InlineKeyboardMarkup] = {}
+        self._pages: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Метрикалар
+        self.hits = 0
+        self.misses = 0
+
+    def set_categories(self, categories: Sequence[str]):
+        """Категориялар тізімі өзгергенде шақырылады: мәзірлер мен беттер қайта құрастырылады."""
+        with self._lock:
+            self._categories = tuple(categories)
+            self._menus.clear()
+            self._pages.clear()
+
+    def category_menu(self, callback_prefix: str) -> InlineKeyboardMarkup:
+        """Категориялар батырмалары, callback_data = <callback_prefix><категория индексі>."""
+        markup = self._menus.get(callback_prefix)
+        if markup is None:
+            builder = InlineKeyboardBuilder()
+            for i, cat_name in enumerate(self._categories):
+                builder.button(text=cat_name, callback_data=f"{callback_prefix}{i}")
+            builder.adjust(2)
+            markup = self._menus[callback_prefix] = builder.as_markup()
+        return markup
+
+    def page(self, key: Hashable, version: int, build: Callable[[], Any]) -> Any:
+        """
+        key бойынша сақталған бетті қайтарады; жоқ болса не нұсқасы ескірсе, build() арқылы
+        құрастырады. version бет құрастырылмай тұрып оқылуы керек (әйтпесе жаңа нұсқа
+        астында ескі мазмұн сақталып қалуы мүмкін).
+        """
+        with self._lock:
+            item = self._pages.get(key)
+            if item is not None and item[0] == version:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return item[1]
+        value = build()
+        with self._lock:
+            self.misses += 1
+            self._pages[key] = (version, value)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._pages)
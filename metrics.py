@@ -0,0 +1,228 @@
+# StudyShareBot: жеңіл Prometheus-үйлесімді метрикалар (санауыштар, гистограммалар, middleware)
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DRIVE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], const: str = "", extra: str = "") -> str:
+    pairs = [const] if const else []
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # Drive жұмысшы ағындарынан да жаңартылады
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self, const: str = "") -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k, const)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Мәні тікелей қойылатын немесе әр оқуда func() арқылы есептелетін көрсеткіш."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 func: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def render(self, const: str = "") -> List[str]:
+        if self.func is not None:
+            try:
+                return self.header() + [f"{self.name}{_format_labels((), (), const)} {float(self.func())}"]
+            except Exception as e:
+                logger.warning(f"Метриканы есептеу қатесі ({self.name}): {e}")
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, k, const)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> ([әр бакеттегі (кумулятивті емес) сан..., +Inf], [қосынды])
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def render(self, const: str = "") -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        bounds = [repr(b) for b in self.buckets] + ["+Inf"]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, const, 'le="' + bound + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels, const)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels, const)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "studyshare_", const_labels: Optional[Dict[str, Any]] = None):
+        self.prefix = prefix
+        self.const_labels = const_labels or {}
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              func: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(self.prefix + name, documentation, labelnames, func))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        # Тұрақты белгілер (мысалы, webhook жұмысшысының нөмірі) барлық жолдарға қосылады
+        const = ",".join(f'{k}="{_escape(v)}"' for k, v in self.const_labels.items())
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(const))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Ішкі (handler деңгейіндегі) middleware: әр handler-дің кідірісін, қателерін және бір уақытта
+    орындалып жатқан шақыруларын санайды. Тек time.perf_counter() және бір dict жаңартуы - ыстық
+    жолға әсері шамалы.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.latency = registry.histogram("handler_latency_seconds", "Handler орындалу уақыты", ("handler",))
+        self.errors = registry.counter("handler_errors_total", "Handler-дегі өңделмеген қателер", ("handler",))
+        self.in_flight = registry.gauge("handler_in_flight", "Қазір орындалып жатқан handler-лер", ("handler",))
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+        self.in_flight.inc(name)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors.inc(name)
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - started, name)
+            self.in_flight.dec(name)
+
+
+class EventLoopMonitor:
+    """Event loop кідірісін өлшейді: interval секундтық ұйқының нақты ұзақтығынан артық уақыт."""
+
+    def __init__(self, registry: MetricsRegistry, interval: float = 0.5):
+        self.interval = interval
+        self.lag = registry.histogram("event_loop_lag_seconds", "Event loop кідірісі", buckets=LOOP_LAG_BUCKETS)
+        self.last_lag = registry.gauge("event_loop_lag_last_seconds", "Соңғы өлшенген event loop кідірісі")
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.lag.observe(lag)
+            self.last_lag.set(lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def metrics_handler(registry: MetricsRegistry) -> Callable[[web.Request], Awaitable[web.Response]]:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+    return handle
+
+
+async def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> web.AppRunner:
+    """Polling режимінде /metrics үшін бөлек шағын aiohttp сервері."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler(registry))
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Метрикалар сервері іске қосылды: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,187 @@
+# StudyShareBot: файл аттары бойынша инвертирленген іздеу индексі
+import bisect
+import heapq
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from catalog import CatalogEntry
+
+# Сөзге бөлу: әріптер мен сандар ғана (файл аттарындағы '_', '.', '-' бөлгіш болып саналады)
+TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+MIN_PREFIX_LEN = 2
+
+
+def fold_text(text: str) -> str:
+    """Қазақ/орыс/ағылшын мәтінін регистрге тәуелсіз түрге келтіру."""
+    return text.casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(fold_text(text))
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Doc:
+    __slots__ = ("category", "name", "mtime", "folded", "tokens", "grams")
+
+    def __init__(self, category: str, entry: CatalogEntry):
+        self.category = category
+        self.name = entry.name
+        self.mtime = entry.mtime
+        self.folded = fold_text(entry.name)
+        self.tokens = set(TOKEN_RE.findall(self.folded))
+        self.grams = trigrams(self.folded)
+
+
+class SearchIndex:
+    """
+    Файл аттары мен категориялар бойынша инвертирленген индекс (сөздер + триграммалар).
+    FileCatalog тыңдаушысы ретінде жүктеу/жою кезінде автоматты түрде жаңартылады.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: Dict[int, _Doc] = {}
+        self._doc_ids: Dict[Tuple[str, str], int] = {}
+        self._next_id = 0
+        self._token_postings: Dict[str, Set[int]] = {}
+        self._sorted_tokens: List[str] = []  # префикс бойынша іздеу үшін
+        self._gram_postings: Dict[str, Set[int]] = {}
+        self._category_docs: Dict[str, Set[int]] = {}
+
+    # --- FileCatalog тыңдаушысы ---
+    def on_catalog_add(self, category: str, entry: CatalogEntry):
+        with self._lock:
+            self._remove(category, entry.name)
+            doc_id = self._next_id
+            self._next_id += 1
+            doc = _Doc(category, entry)
+            self._docs[doc_id] = doc
+            self._doc_ids[(category, entry.name)] = doc_id
+            self._category_docs.setdefault(category, set()).add(doc_id)
+            for token in doc.tokens:
+                postings = self._token_postings.get(token)
+                if postings is None:
+                    postings = self._token_postings[token] = set()
+                    bisect.insort(self._sorted_tokens, token)
+                postings.add(doc_id)
+            for gram in doc.grams:
+                self._gram_postings.setdefault(gram, set()).add(doc_id)
+
+    def on_catalog_remove(self, category: str, name: str):
+        with self._lock:
+            self._remove(category, name)
+
+    def _remove(self, category: str, name: str):
+        doc_id = self._doc_ids.pop((category, name), None)
+        if doc_id is None:
+            return
+        doc = self._docs.pop(doc_id)
+        self._category_docs.get(category, set()).discard(doc_id)
+        for token in doc.tokens:
+            postings = self._token_postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self._token_postings[token]
+                pos = bisect.bisect_left(self._sorted_tokens, token)
+                if pos < len(self._sorted_tokens) and self._sorted_tokens[pos] == token:
+                    del self._sorted_tokens[pos]
+        for gram in doc.grams:
+            postings = self._gram_postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._gram_postings[gram]
+
+    # --- Іздеу ---
+    def _prefix_docs(self, prefix: str) -> Set[int]:
+        result: Set[int] = set()
+        pos = bisect.bisect_left(self._sorted_tokens, prefix)
+        while pos < len(self._sorted_tokens) and self._sorted_tokens[pos].startswith(prefix):
+            result |= self._token_postings[self._sorted_tokens[pos]]
+            pos += 1
+        return result
+
+    def _substring_docs(self, folded_query: str) -> Set[int]:
+        grams = trigrams(folded_query)
+        if not grams:
+            return set()
+        postings = sorted((self._gram_postings.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates &= p
+            if not candidates:
+                break
+        return {d for d in candidates if folded_query in self._docs[d].folded}
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        (категория, файл аты) тізімін қайтарады. Рейтинг: сәйкес келген сөздер саны,
+        толық ішкі жол сәйкестігі, содан кейін жаңалығы (mtime). limit берілсе, тек ең үздік
+        limit нәтиже іріктеледі (барлық сәйкестіктерді толық сұрыптамай, O(n log limit)).
+        """
+        folded_query = fold_text(query.strip())
+        query_tokens = [t for t in set(TOKEN_RE.findall(folded_query)) if len(t) >= MIN_PREFIX_LEN]
+        with self._lock:
+            scores: Dict[int, int] = {}
+            for token in query_tokens:
+                for doc_id in self._prefix_docs(token):
+                    scores[doc_id] = scores.get(doc_id, 0) + 1
+            # Бұрынғы мінез-құлық: сұраныс файл атының немесе категория атының ішінде кездессе
+            for doc_id in self._substring_docs(folded_query):
+                scores[doc_id] = scores.get(doc_id, 0) + len(query_tokens) + 1
+            for category, doc_ids in self._category_docs.items():
+                if folded_query and folded_query in fold_text(category):
+                    for doc_id in doc_ids:
+                        scores[doc_id] = scores.get(doc_id, 0) + 1
+            docs = self._docs
+
+            def rank_key(item):
+                return -item[1], -docs[item[0]].mtime
+
+            if limit is not None and limit < len(scores):
+                ranked = heapq.nsmallest(limit, scores.items(), key=rank_key)
+            else:
+                ranked = sorted(scores.items(), key=rank_key)
+            return [(self._docs[doc_id].category, self._docs[doc_id].name) for doc_id, _ in ranked]
+
+
+class SearchResultCache:
+    """Іздеу нәтижелерін қысқа токен бойынша сақтайтын шектелген LRU/TTL кэш."""
+
+    def __init__(self, max_size: int = 500, ttl: float = 1800):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, str, list]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, query: str, results: list) -> str:
+        token = secrets.token_hex(4)
+        with self._lock:
+            while token in self._items:
+                token = secrets.token_hex(4)
+            self._items[token] = (time.monotonic(), query, results)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[Tuple[str, list]]:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None:
+                return None
+            created, query, results = item
+            if time.monotonic() - created > self.ttl:
+                del self._items[token]
+                return None
+            self._items.move_to_end(token)
+            return query, results
@@ -0,0 +1,252 @@
+# StudyShareBot: Telegram-ға шығыс сұраныстардың ортақ кезегі (чат бойынша рет, басымдық, retry-after) және HTTP пулы
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from aiohttp import ClientConnectorError
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (TelegramEntityTooLarge, TelegramNetworkError, TelegramRetryAfter,
+                                TelegramServerError)
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from metrics import MetricsRegistry, LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_TEXT = 0  # Қысқа мәтіндік жауаптар, хабарламаны өңдеу/жою
+PRIORITY_BULK = 1  # Құжаттар мен медиа (ұзақ жіберіледі)
+BULK_METHODS = frozenset({"SendDocument", "SendPhoto", "SendVideo", "SendAudio", "SendVoice", "SendAnimation",
+                          "SendMediaGroup", "SendSticker", "SendVideoNote"})
+QUEUED_METHOD_PREFIXES = ("Send", "Edit", "Copy", "Forward", "Delete")
+# Қайта жіберу көшірме хабарлама жасайтын әдістер: желі қатесінде сұраныс Telegram-ға жетіп үлгерген болуы мүмкін
+NON_IDEMPOTENT_PREFIXES = ("Send", "Copy", "Forward")
+SHUTDOWN_DRAIN_TIMEOUT = 10
+MAX_BACKOFF = 30.0
+
+
+class PooledAiohttpSession(AiohttpSession):
+    """
+    Қосылымдар пулы бапталған aiohttp сессиясы: қосылымдар саны шектелген, keep-alive ұзағырақ
+    (әр сұранысқа жаңа TLS қосылымы ашылмайды), DNS нәтижесі кэштеледі. Коннекторды aiogram өзі
+    жасайды (прокси да), біз тек оның параметрлерін толықтырамыз.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 60, **kwargs: Any):
+        self.connector_options = dict(limit=limit, limit_per_host=limit_per_host,
+                                      keepalive_timeout=keepalive_timeout, ttl_dns_cache=3600)
+        super().__init__(**kwargs)
+        self._connector_init.update(self.connector_options)
+
+    def _setup_proxy_connector(self, proxy: Any) -> None:
+        # Прокси орнатылғанда aiogram коннектор параметрлерін қайта құрады
+        super()._setup_proxy_connector(proxy)
+        self._connector_init.update(self.connector_options)
+
+
+def create_bot_session(limit: int = 100, limit_per_host: int = 0, keepalive_timeout: float = 60,
+                       timeout: float = 60) -> AiohttpSession:
+    """Bot үшін қосылымдар пулы бапталған сессия (PooledAiohttpSession)."""
+    return PooledAiohttpSession(limit, limit_per_host, keepalive_timeout, timeout=timeout)
+
+
+class _Item:
+    __slots__ = ("priority", "seq", "call", "future", "name", "enqueued", "attempts")
+
+    def __init__(self, priority: int, seq: int, call: Callable[[], Awaitable[Any]], name: str):
+        self.priority = priority
+        self.seq = seq
+        self.call = call
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.name = name
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class OutboundQueue:
+    """
+    Шығыс сұраныстар кезегі. Бір чаттың сұраныстары келген ретімен, бірінен соң бірі орындалады;
+    әртүрлі чаттардың арасында басымдығы жоғары (мәтіндік) сұраныстар құжаттардан бұрын алынады.
+    TelegramRetryAfter кезінде Telegram көрсеткен уақыт күтіледі, желі/сервер қателері
+    экспоненциалды кідіріспен қайталанады (Send*/Copy/Forward желі қатесінде тек қосылым
+    орнамаған болса); басқа қателер шақырушыға бірден қайтарылады.
+    Күту кезінде жұмысшы ұйықтамайды: чат "ерте емес" уақытымен кейінге қалдырылады, ал
+    жұмысшы басқа чаттардың сұраныстарын жібере береді.
+    """
+
+    def __init__(self, workers: int = 16, max_attempts: int = 5, base_delay: float = 1.0,
+                 registry: Optional[MetricsRegistry] = None):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self._chains: Dict[Hashable, Deque[_Item]] = {}
+        self._ready: List[Tuple[int, int, Hashable]] = []  # (басымдық, рет нөмірі, чат) үйіндісі
+        self._delayed: List[Tuple[float, int, int, Hashable]] = []  # (ерте емес уақыты, басымдық, рет нөмірі, чат)
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+        if registry is not None:
+            self.latency = registry.histogram("send_latency_seconds", "Кезекке қойылғаннан жіберілгенге дейінгі уақыт",
+                                              ("method",), buckets=LATENCY_BUCKETS)
+            self.retries = registry.counter("send_retries_total", "Қайталанған жіберулер", ("reason",))
+            self.failures = registry.counter("send_failures_total", "Сәтсіз жіберулер", ("method",))
+            registry.gauge("send_queue_depth", "Жіберу кезегіндегі сұраныстар", func=lambda: self._pending)
+        else:
+            self.latency = self.retries = self.failures = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        self._cond = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, chat_key: Hashable, call: Callable[[], Awaitable[Any]], priority: int = PRIORITY_TEXT,
+                     name: str = "") -> Any:
+        """call() нәтижесін қайтарады; call чаттың алдыңғы сұраныстары орындалғаннан кейін шақырылады."""
+        item = _Item(priority, next(self._seq), call, name)
+        self._pending += 1
+        chain = self._chains.get(chat_key)
+        if chain is not None:
+            chain.append(item)  # Чат кезекте не орындалуда: ретімен кейін алынады
+        else:
+            self._chains[chat_key] = deque([item])
+            async with self._cond:
+                heapq.heappush(self._ready, (item.priority, item.seq, chat_key))
+                self._cond.notify()
+        return await item.future
+
+    async def _next_chat(self) -> Hashable:
+        async with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, priority, seq, chat_key = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (priority, seq, chat_key))
+                if self._ready:
+                    return heapq.heappop(self._ready)[2]
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            chat_key = await self._next_chat()
+            chain = self._chains[chat_key]
+            item = chain[0]
+            delay = None
+            try:
+                delay = await self._execute(item)
+            finally:
+                async with self._cond:
+                    if delay is not None:  # Чаттың келесі сұраныстары қайталанатын сұранысты күтеді
+                        heapq.heappush(self._delayed, (time.monotonic() + delay, item.priority, item.seq, chat_key))
+                    else:
+                        chain.popleft()
+                        self._pending -= 1
+                        if chain:
+                            heapq.heappush(self._ready, (chain[0].priority, chain[0].seq, chat_key))
+                        else:
+                            del self._chains[chat_key]
+                    self._cond.notify()
+
+    async def _execute(self, item: _Item) -> Optional[float]:
+        """Сұранысты бір рет орындайды; қайталау керек болса, оған дейінгі кідірісті (секунд) қайтарады."""
+        if item.future.cancelled():  # Шақырушы күтуді тоқтатты
+            return None
+        item.attempts += 1
+        try:
+            result = await item.call()
+        except TelegramRetryAfter as e:
+            if item.attempts >= self.max_attempts:
+                self._fail(item, e)
+                return None
+            self._count_retry("retry_after")
+            logger.warning(f"Telegram {e.retry_after}s күтуді сұрады ({item.name})")
+            return e.retry_after
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if isinstance(e, TelegramEntityTooLarge) or item.attempts >= self.max_attempts \
+                    or (isinstance(e, TelegramNetworkError) and not self._safe_to_resend(item, e)):
+                self._fail(item, e)
+                return None
+            self._count_retry("network" if isinstance(e, TelegramNetworkError) else "server")
+            return min(MAX_BACKOFF, self.base_delay * 2 ** (item.attempts - 1))
+        except Exception as e:
+            self._fail(item, e)
+            return None
+        if self.latency is not None:
+            self.latency.observe(time.monotonic() - item.enqueued, item.name)
+        if not item.future.done():
+            item.future.set_result(result)
+        return None
+
+    @staticmethod
+    def _safe_to_resend(item: _Item, error: TelegramNetworkError) -> bool:
+        # Timeout не үзілген жауап: хабарлама жіберілген болуы мүмкін, қайталасақ көшірме шығады.
+        # Қосылым орнамаған болса (connection refused, DNS), сұраныс жетпеген - қайталау қауіпсіз
+        return not item.name.startswith(NON_IDEMPOTENT_PREFIXES) or isinstance(error.__context__,
+                                                                                ClientConnectorError)
+
+    def _count_retry(self, reason: str):
+        if self.retries is not None:
+            self.retries.inc(reason)
+
+    def _fail(self, item: _Item, error: BaseException):
+        if self.failures is not None:
+            self.failures.inc(item.name)
+        if not item.future.done():
+            item.future.set_exception(error)
+
+    async def stop(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        """Кезектегі сұраныстарды жіберуге timeout секунд береді, содан кейін жұмысшыларды тоқтатады."""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"Жіберу кезегі: {self._pending} сұраныс жіберілмей қалды")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for chain in self._chains.values():
+            for item in chain:
+                if not item.future.done():
+                    item.future.cancel()
+        self._chains.clear()
+        self._ready.clear()
+        self._delayed.clear()
+        self._pending = 0
+
+
+class QueuedSendMiddleware(BaseRequestMiddleware):
+    """
+    Bot сессиясының request middleware-і: чатқа жіберілетін әдістерді OutboundQueue арқылы
+    өткізеді, сондықтан барлық handler-лер өзгеріссіз retry-after, қайталау және чат бойынша
+    ретті алады. Кезек іске қосылмаған болса (мысалы, startup кезінде), сұраныс тікелей жіберіледі.
+    """
+
+    def __init__(self, queue: OutboundQueue):
+        self.queue = queue
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]):
+        name = type(method).__name__
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not self.queue.running or not name.startswith(QUEUED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+        priority = PRIORITY_BULK if name in BULK_METHODS else PRIORITY_TEXT
+        return await self.queue.submit(chat_id, lambda: make_request(bot, method), priority, name)
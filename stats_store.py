@@ -0,0 +1,351 @@
+# StudyShareBot: жадтағы статистика + append-only оқиғалар журналы + атомды снапшоттар
+import heapq
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: бірнеше процесті режим қолжетімсіз
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+DAILY_BUCKETS_KEEP = 31  # Ең ұзын терезе (30 күн) + бүгін
+
+
+def _empty_user() -> Dict[str, Any]:
+    return {"username": "", "files_uploaded": 0, "last_activity": ""}
+
+
+class Leaderboard:
+    """
+    Топ-N пайдаланушылар. Жүктемелер саны тек өседі, сондықтан жаңартуға тек топтағы
+    ең кіші мәнмен салыстыру жеткілікті: әр оқиға O(N), оқу O(N).
+    """
+
+    def __init__(self, size: int = 10):
+        self.size = size
+        self._top: List[str] = []
+        self.users_with_uploads = 0
+        self.total_uploads = 0
+
+    def rebuild(self, users: Dict[str, Dict[str, Any]]):
+        counts = {uid: u.get("files_uploaded", 0) for uid, u in users.items()}
+        self._top = heapq.nlargest(self.size, (uid for uid, c in counts.items() if c > 0), key=counts.get)
+        self.users_with_uploads = sum(1 for c in counts.values() if c > 0)
+        self.total_uploads = sum(counts.values())
+
+    def on_increment(self, uid: str, new_count: int, users: Dict[str, Dict[str, Any]]):
+        if new_count == 1:
+            self.users_with_uploads += 1
+        self.total_uploads += 1
+        count_of = lambda u: users[u].get("files_uploaded", 0)
+        if uid not in self._top:
+            if len(self._top) >= self.size and new_count <= count_of(self._top[-1]):
+                return
+            self._top.append(uid)
+        self._top.sort(key=count_of, reverse=True)
+        del self._top[self.size:]
+
+    def top(self) -> List[str]:
+        return list(self._top)
+
+
+class WindowCounter:
+    """
+    Соңғы `days` күндегі (бүгінді қоса) жүктемелер және олардың топ-N-і. Оқиға O(1) қосылады,
+    топ Leaderboard сияқты O(N) жаңартылады; күн ауысқанда тек терезеден шыққан күндердің
+    санауыштары шегеріліп, топ бір рет қайта таңдалады (санауыштар кемуі мүмкін). Толық қайта
+    есептеу тек алшақтық терезеден ұзын болса не күндік санауыштар қайта жүктелгенде болады.
+    """
+
+    def __init__(self, days: int, size: int = 10):
+        self.days = days
+        self.size = size
+        self.start: Optional[date] = None  # Терезенің бірінші күні; None - қайта есептеу керек
+        self.counts: Dict[str, int] = {}
+        self.total = 0
+        self._top: List[str] = []
+
+    def rebuild(self, daily: Dict[str, Dict[str, int]], today: date):
+        self.start = today - timedelta(days=self.days - 1)
+        self.counts, self.total = {}, 0
+        for offset in range(self.days):
+            for uid, count in daily.get((self.start + timedelta(days=offset)).isoformat(), {}).items():
+                self._add(uid, count)
+        self._select_top()
+
+    def advance(self, daily: Dict[str, Dict[str, int]], today: date):
+        new_start = today - timedelta(days=self.days - 1)
+        if self.start is None or new_start < self.start or (new_start - self.start).days >= self.days:
+            self.rebuild(daily, today)
+            return
+        if self.start == new_start:
+            return
+        while self.start < new_start:
+            for uid, count in daily.get(self.start.isoformat(), {}).items():
+                self._add(uid, -count)
+            self.start += timedelta(days=1)
+        self._select_top()  # Күніне бір рет
+
+    def add(self, uid: str, day: str, today: date):
+        if self.start is None:
+            return
+        if day > today.isoformat():  # Сағаты алда тұрған процесс: сол күн келгенде қайта есептейміз
+            self.start = None
+        elif day >= self.start.isoformat():
+            self._add(uid, 1)
+            self._promote(uid)
+
+    def top(self) -> List[str]:
+        return list(self._top)
+
+    def _add(self, uid: str, amount: int):
+        count = self.counts.get(uid, 0) + amount
+        if count > 0:
+            self.counts[uid] = count
+        else:
+            self.counts.pop(uid, None)
+        self.total += amount
+
+    def _select_top(self):
+        self._top = heapq.nlargest(self.size, self.counts, key=self.counts.get)
+
+    def _promote(self, uid: str):
+        # Санауыш тек өсті: топтағы ең кіші мәнмен салыстыру жеткілікті
+        if uid not in self._top:
+            if len(self._top) >= self.size and self.counts[uid] <= self.counts[self._top[-1]]:
+                return
+            self._top.append(uid)
+        self._top.sort(key=self.counts.get, reverse=True)
+        del self._top[self.size:]
+
+
+class StatsStore:
+    """
+    Пайдаланушылар статистикасы жадта сақталады. Әр жүктеу журналға бір жол болып
+    қосылады (O(1)), ал мезгіл-мезгіл компакция журналды user_stats.json снапшотына
+    атомды түрде (tmp + fsync + os.replace) біріктіреді. Оқу ешқашан дискіге жүгінбейді.
+
+    shared=True болса (бірнеше webhook жұмысшысы), журналға жазу мен компакция ортақ
+    файл құлпымен (flock) қорғалады, ал sync() басқа процестер қосқан оқиғаларды жадқа оқиды.
+    """
+
+    def __init__(self, snapshot_file: Path, log_file: Path, compact_every: int = 1000, shared: bool = False):
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        self.compact_every = compact_every
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._log = None
+        self._log_offset = 0  # Журналдың осы процесс жадқа оқыған бөлігі (байт)
+        self._log_ino: Optional[int] = None
+        self._lock_file = None
+        self._events_since_compact = 0
+        self.leaderboard = Leaderboard()
+        # Уақыт терезелері үшін күндік санауыштар: {"2025-05-10": {user_id: count}}
+        self._daily: Dict[str, Dict[str, int]] = {}
+        # Сұралған терезелер (7, 30 күн) оқиға сайын жаңартылады: оқу күндер санына тәуелсіз
+        self._windows: Dict[int, WindowCounter] = {}
+
+    def load(self):
+        if self.shared and fcntl is not None and self._lock_file is None:
+            self._lock_file = open(self.log_file.with_suffix(".lock"), "a")
+        with self._lock, self._file_lock():
+            replayed = self._reload()
+        if replayed:
+            self.compact()
+
+    @contextmanager
+    def _file_lock(self):
+        # Процестер арасындағы құлып; бір процесті режимде тек threading құлпы жеткілікті
+        if self._lock_file is None:
+            yield
+            return
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _reload(self) -> int:
+        """Снапшотты оқып, журналды қайта ойнату. Қайта ойнатылған оқиғалар санын қайтарады."""
+        self._users = {}
+        if self.snapshot_file.exists():
+            try:
+                with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                    self._users = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Статистиканы жүктеу қатесі: {e}")
+        self._rebuild_aggregates()
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_file, "a", encoding="utf-8")
+        self._log_ino = os.fstat(self._log.fileno()).st_ino
+        self._log_offset = 0
+        replayed = self._read_log_tail()
+        self._events_since_compact = replayed
+        return replayed
+
+    def _read_log_tail(self) -> int:
+        applied = 0
+        with open(self.log_file, "rb") as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Басқа процесс әлі жазып жатқан жол
+                self._log_offset += len(line)
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # Апат кезінде жартылай жазылған соңғы жол
+                    logger.warning("Статистика журналында бүлінген жол өткізілді")
+                    continue
+                self._apply(event)
+                applied += 1
+        return applied
+
+    def _catch_up(self):
+        # Басқа процесс компакция жасаса, журнал жаңа файлмен ауыстырылады (inode өзгереді)
+        try:
+            log_ino = os.stat(self.log_file).st_ino
+        except FileNotFoundError:
+            log_ino = None
+        if log_ino != self._log_ino:
+            self._reload()
+        else:
+            self._events_since_compact += self._read_log_tail()
+
+    def sync(self):
+        """Басқа процестер журналға жазған оқиғаларды жадқа оқу."""
+        with self._lock, self._file_lock():
+            if self._log is not None:
+                self._catch_up()
+
+    def _rebuild_aggregates(self):
+        self.leaderboard.rebuild(self._users)
+        self._daily = {}
+        for uid, user_s in self._users.items():
+            for day, count in user_s.get("daily", {}).items():
+                self._daily.setdefault(day, {})[uid] = count
+        for window in self._windows.values():
+            window.start = None
+
+    def _apply(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        uid = event["user_id"]
+        user_s = self._users.setdefault(uid, _empty_user())
+        user_s["username"] = event["username"]
+        user_s["files_uploaded"] = user_s.get("files_uploaded", 0) + 1
+        user_s["last_activity"] = event["ts"]
+        day = event["ts"][:10]
+        if self._windows:  # Терезелер алдымен бүгінге жылжытылады, содан кейін оқиға қосылады
+            today = date.today()
+            for window in self._windows.values():
+                window.advance(self._daily, today)
+                window.add(uid, day, today)
+        daily = user_s.setdefault("daily", {})
+        daily[day] = daily.get(day, 0) + 1
+        self._daily.setdefault(day, {})[uid] = daily[day]
+        self.leaderboard.on_increment(uid, user_s["files_uploaded"], self._users)
+        return user_s
+
+    def _prune_daily(self):
+        today = date.today()
+        for window in self._windows.values():  # Шығатын күндер жойылмай тұрып шегеріледі
+            window.advance(self._daily, today)
+        oldest = (today - timedelta(days=DAILY_BUCKETS_KEEP)).isoformat()
+        for day in [d for d in self._daily if d < oldest]:
+            for uid in self._daily.pop(day):
+                self._users.get(uid, {}).get("daily", {}).pop(day, None)
+
+    def record_upload(self, user_id: int, username: str, ts: str) -> Dict[str, Any]:
+        event = {"user_id": str(user_id), "username": username, "ts": ts}
+        with self._lock, self._file_lock():
+            if self._log is not None:
+                self._catch_up()
+            user_s = self._apply(event)
+            if self._log is not None:
+                line = json.dumps(event, ensure_ascii=False) + "\n"
+                self._log.write(line)
+                self._log.flush()
+                self._log_offset += len(line.encode("utf-8"))
+            self._events_since_compact += 1
+            need_compact = self._events_since_compact >= self.compact_every
+        if need_compact:
+            self.compact()
+        return user_s
+
+    def compact(self):
+        """Снапшотты атомды түрде жазып, журналды тазалау."""
+        with self._lock, self._file_lock():
+            if self._log is not None:
+                self._catch_up()
+            if self._events_since_compact == 0 and self.snapshot_file.exists():
+                return
+            self._prune_daily()
+            tmp_file = self.snapshot_file.with_suffix(".tmp")
+            try:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(self._users, f, ensure_ascii=False, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.snapshot_file)
+                # Снапшот сақталды, енді журналды жаңа бос файлмен ауыстыруға болады
+                tmp_log = self.log_file.with_suffix(".log.tmp")
+                open(tmp_log, "w").close()
+                os.replace(tmp_log, self.log_file)
+                if self._log is not None:
+                    self._log.close()
+                self._log = open(self.log_file, "a", encoding="utf-8")
+                self._log_ino = os.fstat(self._log.fileno()).st_ino
+                self._log_offset = 0
+                self._events_since_compact = 0
+            except OSError as e:
+                logger.error(f"Статистиканы сақтау қатесі: {e}")
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._users.get(str(user_id))
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._users)
+
+    def top(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Барлық уақыттағы топ-N: [(user_id, user_stats), ...]."""
+        with self._lock:
+            return [(uid, self._users[uid]) for uid in self.leaderboard.top()]
+
+    def totals(self) -> Tuple[int, int]:
+        """(файл жүктеген пайдаланушылар, жалпы жүктемелер)."""
+        return self.leaderboard.users_with_uploads, self.leaderboard.total_uploads
+
+    def top_window(self, days: int) -> Tuple[List[Tuple[str, Dict[str, Any], int]], int, int]:
+        """
+        Соңғы `days` күндегі топ-N: ([(user_id, user_stats, count), ...], пайдаланушылар, жүктемелер).
+        Терезе санауыштары мен топ бірінші сұраудан кейін инкременттік жүргізіледі: оқу O(N).
+        """
+        with self._lock:
+            window = self._windows.get(days)
+            if window is None:
+                window = self._windows[days] = WindowCounter(days, self.leaderboard.size)
+            window.advance(self._daily, date.today())
+            return ([(uid, self._users[uid], window.counts[uid]) for uid in window.top()], len(window.counts),
+                    window.total)
+
+    def close(self):
+        self.compact()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
@@ -0,0 +1,456 @@
+# StudyShareBot: файл қоймасының бэкендтері (жергілікті диск және S3-үйлесімді объект қоймасы)
+import base64
+import hashlib
+import hmac
+import http.client
+import logging
+import os
+import threading
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Union
+from urllib.parse import quote, urlsplit
+
+from dedup_store import ContentStore, link_or_copy
+
+logger = logging.getLogger(__name__)
+
+S3_TIMEOUT = 60
+S3_LIST_PAGE_SIZE = 1000
+S3_DELETE_BATCH = 1000  # DeleteObjects бір сұранысындағы кілттер шегі
+# Категорияның нұсқа белгісі объектісі ("." атаулары тізімде көрінбейді, жүктеуге рұқсат етілмейді)
+S3_VERSION_MARKER = ".version"
+
+ChangeStamp = Union[float, str]  # Жергілікті дискіде mtime, S3-те белгі объектісінің ETag-і
+
+
+class StorageError(Exception):
+    pass
+
+
+class ObjectInfo(NamedTuple):
+    key: str  # "категория/файл"
+    size: int
+    mtime: float
+
+
+def split_key(key: str):
+    category, _, name = key.partition("/")
+    return category, name
+
+
+class StorageBackend:
+    """
+    Файлдар қоймасының интерфейсі. Кілттер "категория/файл" түрінде. Барлық әдістер
+    бұғаттайтын (синхронды) және AsyncFileStore пулында шақырылады; get() ағындық
+    (read(n) әдісі бар) файл объектісін қайтарады, мазмұн жадқа толық оқылмайды.
+    """
+
+    name = ""
+
+    def prepare(self, categories: Iterable[str]):
+        """Іске қосу кезінде категориялар үшін қажетті құрылымды дайындау."""
+
+    def put(self, key: str, source: Path, sha256: Optional[str] = None) -> bool:
+        """
+        source файлын key-ге жазады; мазмұн қоймада бұрыннан болса True қайтарады.
+        Атау бос болмаса (басқа процесс алса) FileExistsError көтерілуі мүмкін.
+        """
+        raise NotImplementedError
+
+    def get(self, key: str) -> BinaryIO:
+        """Ағындық оқу; объект табылмаса FileNotFoundError."""
+        raise NotImplementedError
+
+    def list(self, prefix: str) -> List[ObjectInfo]:
+        """prefix ("категория/") ішіндегі тікелей объектілер, уақытша (.) файлдарсыз."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        """Бірнеше объектіні жояды және шынымен жойылған кілттерді қайтарады."""
+        return [key for key in keys if self.delete(key)]
+
+    def move(self, src: str, dst: str):
+        """src объектісін dst-ға көшіреді (dst бос болуы керек); src табылмаса FileNotFoundError."""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.stat(key) is not None
+
+    def change_stamp(self, category: str) -> Optional[ChangeStamp]:
+        """
+        Категория өзгергенде өзгеретін арзан белгі (жергілікті дискіде - директория mtime,
+        S3-те нұсқа белгісі объектісінің ETag-і). None: белгі жоқ, каталог категорияны әр
+        жолы қайта сканерлейді.
+        """
+        return None
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Объект жергілікті дискіде болса, оның жолы (мысалы, Drive-ға көшіру үшін)."""
+        return None
+
+
+class LocalBackend(StorageBackend):
+    """
+    Бұрынғы орналасу: FILES_DIR/<категория>/<файл>. ContentStore берілсе, файлдар мазмұн
+    хэші бойынша дедупликацияланады (.blobs ішіндегі blob-қа hardlink).
+    """
+
+    name = "local"
+
+    def __init__(self, root: Path, content_store: Optional[ContentStore] = None):
+        self.root = root
+        self.content_store = content_store
+
+    def _path(self, key: str) -> Path:
+        category, name = split_key(key)
+        if not category or not name or "/" in name or name.startswith(".") or category.startswith("."):
+            raise StorageError(f"Жарамсыз кілт: {key}")
+        return self.root / category / name
+
+    def prepare(self, categories: Iterable[str]):
+        self.root.mkdir(exist_ok=True, parents=True)
+        for category in categories:
+            (self.root / category).mkdir(exist_ok=True, parents=True)
+
+    def put(self, key: str, source: Path, sha256: Optional[str] = None) -> bool:
+        dest = self._path(key)
+        dest.parent.mkdir(exist_ok=True, parents=True)
+        if self.content_store is not None and sha256:
+            return self.content_store.commit(source, sha256, dest)
+        # os.replace бар файлды үнсіз қайта жазар еді (атауды басқа жұмысшы алған болуы мүмкін)
+        link_or_copy(source, dest)
+        source.unlink()
+        return False
+
+    def get(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def list(self, prefix: str) -> List[ObjectInfo]:
+        result = []
+        try:
+            # DirEntry stat нәтижесін кэштейді: әр файлға бөлек stat шақыруы қажет емес
+            with os.scandir(self.root / prefix.rstrip("/")) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.startswith("."):  # уақытша файлдарды өткізу
+                        st = entry.stat()
+                        result.append(ObjectInfo(prefix + entry.name, st.st_size, st.st_mtime))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return result
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            if not path.is_file():
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        if self.content_store is not None:
+            self.content_store.release(*split_key(key))
+        return True
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        deleted = []
+        for key in keys:
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                continue
+            except OSError as e:  # EACCES, EBUSY: қалғандары бәрібір жойылады, нәтиже жоғалмайды
+                logger.error(f"Файлды жою қатесі ({key}): {e}")
+                continue
+            deleted.append(key)
+        if self.content_store is not None and deleted:
+            # Blob сілтемелері бір транзакцияда босатылады
+            self.content_store.release_many([split_key(key) for key in deleted])
+        return deleted
+
+    def move(self, src: str, dst: str):
+        src_path, dst_path = self._path(src), self._path(dst)
+        dst_path.parent.mkdir(exist_ok=True, parents=True)
+        link_or_copy(src_path, dst_path)  # Бір файлдық жүйеде көшірмесіз; dst бос болмаса FileExistsError
+        src_path.unlink()
+        if self.content_store is not None:
+            self.content_store.move_ref(*split_key(src), *split_key(dst))
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            st = self._path(key).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(key, st.st_size, st.st_mtime)
+
+    def exists(self, key: str) -> bool:
+        return os.path.lexists(self._path(key))
+
+    def change_stamp(self, category: str) -> Optional[ChangeStamp]:
+        try:
+            return (self.root / category).stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+
+def _sign(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _uri_encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+class S3Backend(StorageBackend):
+    """
+    S3-үйлесімді объект қоймасы (AWS S3, MinIO, Ceph RGW). Тек стандартты кітапхана: http.client
+    және AWS Signature V4, path-style адрестеу. Жүктеуде дене UNSIGNED-PAYLOAD ретінде ағынмен
+    жіберіледі, файл жадқа оқылмайды. Объект кілті: <prefix><категория>/<файл>.
+
+    S3-те директория mtime-ы жоқ, сондықтан әр өзгерістен кейін категорияның <категория>/.version
+    объектісі жаңа мазмұнмен қайта жазылады: change_stamp() тізімнің орнына бір HEAD сұранысы.
+    Боттан тыс құралдармен енгізілген өзгерістер белгіні өзгертпейді (/reindex арқылы көрінеді).
+    """
+
+    name = "s3"
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = "us-east-1", prefix: str = "", timeout: float = S3_TIMEOUT):
+        parts = urlsplit(endpoint)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise StorageError(f"S3 endpoint дұрыс емес: {endpoint}")
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.timeout = timeout
+        self._local = threading.local()  # Әр ағынның өз keep-alive қосылымы
+
+    # --- HTTP және қолтаңба ---
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def _object_path(self, key: str = "") -> str:
+        path = f"/{self.bucket}"
+        if key:
+            path += "/" + _uri_encode(self.prefix + key, safe="-_.~/")
+        return path
+
+    def _signed_headers(self, method: str, path: str, query: Dict[str, str],
+                        headers: Dict[str, str]) -> Dict[str, str]:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date = now.strftime("%Y%m%d")
+        headers = {k.lower(): str(v).strip() for k, v in headers.items()}
+        headers.setdefault("x-amz-content-sha256", "UNSIGNED-PAYLOAD")
+        headers["host"] = self.host
+        headers["x-amz-date"] = amz_date
+        signed = sorted(headers)
+        canonical_query = "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items()))
+        canonical_request = "\n".join([
+            method, path, canonical_query,
+            "".join(f"{name}:{headers[name]}\n" for name in signed),
+            ";".join(signed), headers["x-amz-content-sha256"],
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+        signing_key = _sign(_sign(_sign(_sign(("AWS4" + self.secret_key).encode("utf-8"), date),
+                                        self.region), "s3"), "aws4_request")
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed)}, Signature={signature}")
+        return headers
+
+    def _request(self, method: str, key: str = "", query: Optional[Dict[str, str]] = None, body=None,
+                 headers: Optional[Dict[str, str]] = None, stream: bool = False) -> http.client.HTTPResponse:
+        """
+        stream=True: жауап денесі шақырушыға ағын ретінде беріледі, сондықтан бөлек қосылым
+        ашылады (жауап жабылғанда ол да жабылады).
+        """
+        query = query or {}
+        path = self._object_path(key)
+        url = path + ("?" + "&".join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items()))
+                      if query else "")
+        for attempt in range(2):
+            conn = self._connect() if stream else getattr(self._local, "conn", None) or self._connect()
+            try:
+                signed = self._signed_headers(method, path, query, headers or {})
+                conn.request(method, url, body=body, headers=signed)
+                response = conn.getresponse()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                # Ескірген keep-alive қосылымы: бір рет қайталаймыз (денесі файл болса, басына ораламыз)
+                if attempt or stream or (body is not None and not hasattr(body, "seek")):
+                    raise
+                if body is not None:
+                    body.seek(0)
+                continue
+            if not stream:
+                self._local.conn = conn
+            return response
+        raise StorageError("S3 сұранысы орындалмады")
+
+    def _check(self, response: http.client.HTTPResponse, key: str, *ok_statuses: int) -> bytes:
+        data = response.read()
+        if response.status not in ok_statuses:
+            raise StorageError(f"S3 {response.status} ({key}): {data[:200].decode('utf-8', 'replace')}")
+        return data
+
+    def _check_created(self, response: http.client.HTTPResponse, key: str) -> bytes:
+        if response.status in (409, 412):  # If-None-Match: * шарты орындалмады (412) не қатар жазу (409)
+            response.read()
+            raise FileExistsError(key)
+        return self._check(response, key, 200)
+
+    # --- Категория нұсқасының белгісі ---
+    def _write_marker(self, category: str) -> Optional[str]:
+        marker = f"{category}/{S3_VERSION_MARKER}"
+        body = uuid.uuid4().hex.encode("ascii")  # Әр жазу жаңа ETag береді
+        response = self._request("PUT", marker, body=body,
+                                 headers={"content-length": str(len(body)), "content-type": "text/plain"})
+        self._check(response, marker, 200)
+        return response.getheader("ETag")
+
+    def _bump(self, *categories: str):
+        # Объект өзгерген соң шақырылады: белгіні бұрын оқыған процесс келесі refresh()-те қайта сканерлейді
+        for category in set(categories):
+            try:
+                self._write_marker(category)
+            except (StorageError, OSError, http.client.HTTPException) as e:
+                logger.warning(f"S3 категория белгісін жаңарту қатесі ({category}): {e}")
+
+    def change_stamp(self, category: str) -> Optional[ChangeStamp]:
+        marker = f"{category}/{S3_VERSION_MARKER}"
+        response = self._request("HEAD", marker)
+        response.read()
+        if response.status == 404:  # Жаңа категория не белгіге дейінгі қойма
+            return self._write_marker(category)
+        if response.status != 200:
+            raise StorageError(f"S3 {response.status} ({marker})")
+        return response.getheader("ETag")
+
+    # --- Интерфейс ---
+    def put(self, key: str, source: Path, sha256: Optional[str] = None) -> bool:
+        with open(source, "rb") as f:
+            # Шартты жазу: атауды басқа процесс алып үлгерсе, оның объектісін үстінен жазбаймыз
+            headers = {"content-length": str(os.fstat(f.fileno()).st_size),
+                       "content-type": "application/octet-stream", "if-none-match": "*"}
+            self._check_created(self._request("PUT", key, body=f, headers=headers), key)
+        os.unlink(source)
+        self._bump(split_key(key)[0])
+        return False
+
+    def get(self, key: str) -> BinaryIO:
+        response = self._request("GET", key, stream=True)
+        if response.status == 404:
+            response.close()
+            raise FileNotFoundError(key)
+        if response.status != 200:
+            self._check(response, key, 200)
+        return response
+
+    def list(self, prefix: str) -> List[ObjectInfo]:
+        result = []
+        query = {"list-type": "2", "prefix": self.prefix + prefix, "delimiter": "/",
+                 "max-keys": str(S3_LIST_PAGE_SIZE)}
+        while True:
+            data = self._check(self._request("GET", query=query), prefix, 200)
+            root = ET.fromstring(data)
+            ns = root.tag[:root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+            for item in root.iter(f"{ns}Contents"):
+                key = item.findtext(f"{ns}Key")[len(self.prefix):]
+                name = key[len(prefix):]
+                if not name or name.startswith("."):  # "директория" белгісі не уақытша файл
+                    continue
+                modified = datetime.fromisoformat(item.findtext(f"{ns}LastModified").replace("Z", "+00:00"))
+                result.append(ObjectInfo(key, int(item.findtext(f"{ns}Size")), modified.timestamp()))
+            token = root.findtext(f"{ns}NextContinuationToken")
+            if root.findtext(f"{ns}IsTruncated") != "true" or not token:
+                return result
+            query["continuation-token"] = token
+
+    def delete(self, key: str) -> bool:
+        # S3 жоқ объектіні жойғанда да 204 қайтарады, сондықтан алдымен бар-жоғын тексереміз
+        if self.stat(key) is None:
+            return False
+        self._check(self._request("DELETE", key), key, 200, 204)
+        self._bump(split_key(key)[0])
+        return True
+
+    def delete_many(self, keys: List[str]) -> List[str]:
+        # DeleteObjects: мыңға дейінгі кілт бір сұраныспен жойылады
+        deleted = []
+        for start in range(0, len(keys), S3_DELETE_BATCH):
+            chunk = keys[start:start + S3_DELETE_BATCH]
+            root = ET.Element("Delete")
+            ET.SubElement(root, "Quiet").text = "false"
+            for key in chunk:
+                ET.SubElement(ET.SubElement(root, "Object"), "Key").text = self.prefix + key
+            body = ET.tostring(root, encoding="utf-8")
+            headers = {"content-md5": base64.b64encode(hashlib.md5(body).digest()).decode("ascii"),
+                       "content-type": "application/xml"}
+            data = self._check(self._request("POST", query={"delete": ""}, body=body, headers=headers), "delete", 200)
+            result = ET.fromstring(data)
+            ns = result.tag[:result.tag.index("}") + 1] if result.tag.startswith("{") else ""
+            for item in result.iter(f"{ns}Deleted"):
+                deleted.append(item.findtext(f"{ns}Key")[len(self.prefix):])
+            for item in result.iter(f"{ns}Error"):
+                logger.error(f"S3 объектісін жою қатесі ({item.findtext(f'{ns}Key')}): {item.findtext(f'{ns}Code')}")
+        self._bump(*(split_key(key)[0] for key in deleted))
+        return deleted
+
+    def move(self, src: str, dst: str):
+        # S3-те атауды өзгерту жоқ: сервер жағында көшіру (CopyObject), содан кейін жою
+        # LocalBackend сияқты dst бос болмаса FileExistsError. If-None-Match-ты CopyObject үшін елемейтін
+        # серверлер бар, сондықтан алдымен stat та жасаймыз
+        if self.stat(dst) is not None:
+            raise FileExistsError(dst)
+        copy_source = _uri_encode(f"{self.bucket}/{self.prefix}{src}", safe="-_.~/")
+        response = self._request("PUT", dst, headers={"x-amz-copy-source": copy_source, "if-none-match": "*"})
+        if response.status == 404:
+            response.read()
+            raise FileNotFoundError(src)
+        self._check_created(response, dst)
+        self._check(self._request("DELETE", src), src, 200, 204)
+        self._bump(split_key(src)[0], split_key(dst)[0])
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        response = self._request("HEAD", key)
+        response.read()
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise StorageError(f"S3 {response.status} ({key})")
+        modified = parsedate_to_datetime(response.getheader("Last-Modified")).timestamp()
+        return ObjectInfo(key, int(response.getheader("Content-Length", "0")), modified)
+
+
+def create_storage_backend(backend: str, files_dir: Path, content_store: Optional[ContentStore] = None,
+                           s3_endpoint: str = "", s3_bucket: str = "", s3_access_key: str = "",
+                           s3_secret_key: str = "", s3_region: str = "us-east-1", s3_prefix: str = "") -> StorageBackend:
+    """config.ini [Storage] BACKEND мәні бойынша бэкендті таңдау: local (әдепкі) немесе s3."""
+    if backend.lower() == "s3":
+        if s3_endpoint and s3_bucket:
+            logger.info(f"Файл қоймасы: S3 ({s3_endpoint}/{s3_bucket}/{s3_prefix})")
+            return S3Backend(s3_endpoint, s3_bucket, s3_access_key, s3_secret_key, s3_region, s3_prefix)
+        logger.error("S3 қоймасы үшін ENDPOINT және BUCKET көрсетілмеген, жергілікті диск қолданылады")
+    logger.info(f"Файл қоймасы: жергілікті диск ({files_dir})")
+    return LocalBackend(files_dir, content_store)
@@ -0,0 +1,190 @@
+"""S3 орнына тесттерге арналған процесс ішіндегі HTTP сервері: SigV4 қолтаңбасын тексереді."""
+import hashlib
+import hmac
+import threading
+import time
+import xml.etree.ElementTree as ET
+from base64 import b64encode
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+class FakeS3:
+    """Бір bucket-ті S3 API-дің бот қолданатын бөлігі: объектілер, ListObjectsV2, CopyObject, DeleteObjects."""
+
+    def __init__(self, bucket: str = "bucket", access_key: str = "AKID", secret_key: str = "secret",
+                 region: str = "us-east-1"):
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.objects = {}  # кілт -> (мазмұн, mtime, etag)
+        self.requests = []  # (әдіс, жол, сұраныс жолы)
+        self.fail_next = []  # Келесі сұраныстарға қайтарылатын қате статустары
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        store = self
+
+        class Handler(_Handler):
+            s3 = store
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, method: str, query_key: str = None) -> int:
+        return sum(1 for m, _, query in self.requests if m == method and (query_key is None or query_key in query))
+
+    def expected_signature(self, method: str, raw_path: str, headers, signed: list, date: str, amz_date: str) -> str:
+        path, _, raw_query = raw_path.partition("?")
+        pairs = sorted((quote(k, safe="-_.~"), quote(v, safe="-_.~"))
+                       for k, v in parse_qsl(raw_query, keep_blank_values=True))
+        canonical_request = "\n".join([
+            method, path, "&".join(f"{k}={v}" for k, v in pairs),
+            "".join(f"{name}:{headers.get(name, '').strip()}\n" for name in signed),
+            ";".join(signed), headers.get("x-amz-content-sha256", ""),
+        ])
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                    hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+        key = _hmac(_hmac(_hmac(_hmac(("AWS4" + self.secret_key).encode("utf-8"), date), self.region), "s3"),
+                    "aws4_request")
+        return hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: бэкенд қосылымды қайта қолданады
+    s3: FakeS3
+
+    def log_message(self, *args):
+        pass
+
+    # --- Жауаптар ---
+    def _send(self, status: int, body: bytes = b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.command != "HEAD" or "Content-Length" not in (headers or {}):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        body = f"<?xml version='1.0'?><Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+        self._send(status, b"" if self.command == "HEAD" else body, {"Content-Type": "application/xml"})
+
+    # --- Сұранысты талдау ---
+    def _handle(self):
+        s3 = self.s3
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        s3.requests.append((self.command, unquote(parts.path), query))
+        if s3.fail_next:
+            return self._error(s3.fail_next.pop(0), "InternalError")
+        if not self._authorized():
+            return self._error(403, "SignatureDoesNotMatch")
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        if bucket != s3.bucket:
+            return self._error(404, "NoSuchBucket")
+        method = getattr(self, f"_{self.command.lower()}_{'object' if key else 'bucket'}")
+        with s3._lock:
+            method(key, query, body)
+
+    def _authorized(self) -> bool:
+        auth = self.headers.get("Authorization", "")
+        if not auth.startswith("AWS4-HMAC-SHA256 "):
+            return False
+        fields = dict(item.strip().split("=", 1) for item in auth[len("AWS4-HMAC-SHA256 "):].split(","))
+        access_key, date = fields["Credential"].split("/")[:2]
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        expected = self.s3.expected_signature(self.command, self.path, headers, fields["SignedHeaders"].split(";"),
+                                              date, headers.get("x-amz-date", ""))
+        return access_key == self.s3.access_key and hmac.compare_digest(expected, fields["Signature"])
+
+    do_GET = do_PUT = do_HEAD = do_DELETE = do_POST = _handle
+
+    # --- Объектілер ---
+    def _put_object(self, key, query, body):
+        if self.headers.get("If-None-Match") == "*" and key in self.s3.objects:
+            return self._error(412, "PreconditionFailed")
+        source = self.headers.get("x-amz-copy-source")
+        if source:
+            _, _, source_key = unquote(source).lstrip("/").partition("/")
+            if source_key not in self.s3.objects:
+                return self._error(404, "NoSuchKey")
+            body = self.s3.objects[source_key][0]
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        self.s3.objects[key] = (body, time.time(), etag)
+        self._send(200, b"", {"ETag": etag})
+
+    def _get_object(self, key, query, body):
+        if key not in self.s3.objects:
+            return self._error(404, "NoSuchKey")
+        data, _, etag = self.s3.objects[key]
+        self._send(200, data, {"ETag": etag, "Content-Type": "application/octet-stream"})
+
+    def _head_object(self, key, query, body):
+        if key not in self.s3.objects:
+            return self._error(404, "NoSuchKey")
+        data, mtime, etag = self.s3.objects[key]
+        self._send(200, b"", {"ETag": etag, "Content-Length": str(len(data)),
+                              "Last-Modified": formatdate(mtime, usegmt=True)})
+
+    def _delete_object(self, key, query, body):
+        self.s3.objects.pop(key, None)
+        self._send(204)
+
+    # --- Bucket ---
+    def _get_bucket(self, key, query, body):
+        prefix, delimiter = query.get("prefix", ""), query.get("delimiter", "")
+        max_keys = int(query.get("max-keys", "1000"))
+        after = query.get("continuation-token", "")
+        keys = sorted(k for k in self.s3.objects if k.startswith(prefix) and k > after
+                      and not (delimiter and delimiter in k[len(prefix):]))
+        page = keys[:max_keys]
+        root = ET.Element("ListBucketResult", xmlns=S3_NS)
+        for k in page:
+            data, mtime, etag = self.s3.objects[k]
+            item = ET.SubElement(root, "Contents")
+            ET.SubElement(item, "Key").text = k
+            ET.SubElement(item, "LastModified").text = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(mtime))
+            ET.SubElement(item, "Size").text = str(len(data))
+            ET.SubElement(item, "ETag").text = etag
+        ET.SubElement(root, "IsTruncated").text = "true" if len(keys) > max_keys else "false"
+        if len(keys) > max_keys:
+            ET.SubElement(root, "NextContinuationToken").text = page[-1]
+        self._send(200, ET.tostring(root, encoding="utf-8"), {"Content-Type": "application/xml"})
+
+    def _post_bucket(self, key, query, body):
+        if "delete" not in query:
+            return self._error(400, "InvalidRequest")
+        if self.headers.get("Content-MD5") != b64encode(hashlib.md5(body).digest()).decode():
+            return self._error(400, "InvalidDigest")
+        request = ET.fromstring(body)
+        result = ET.Element("DeleteResult", xmlns=S3_NS)
+        for item in request.iter("Key"):
+            self.s3.objects.pop(item.text, None)  # S3 жоқ кілтті де жойылды деп есептейді
+            ET.SubElement(ET.SubElement(result, "Deleted"), "Key").text = item.text
+        self._send(200, ET.tostring(result, encoding="utf-8"), {"Content-Type": "application/xml"})
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import zipfile
+
+import pytest
+
+from archive_cache import ENTRY_OVERHEAD, ArchiveCache, ArchiveItem, plan_parts
+from storage_backend import LocalBackend
+
+
+def item(name, size, category="math"):
+    return ArchiveItem(category, name, size, 1_700_000_000.0)
+
+
+def test_plan_parts_respects_part_size():
+    part_size = 1500
+    items = [item("a.pdf", 400), item("b.pdf", 400), item("c.pdf", 400), item("huge.pdf", 5000), item("d.pdf", 10)]
+    groups, skipped = plan_parts(items, part_size, flat=True)
+    assert [[i.name for i in group] for group in groups] == [["a.pdf", "b.pdf"], ["c.pdf", "d.pdf"]]
+    assert skipped == ["huge.pdf"]
+    for group in groups:
+        assert sum(i.size + ENTRY_OVERHEAD + 2 * len(i.name) for i in group) <= part_size
+
+
+def test_plan_parts_uses_category_in_nested_names():
+    _, skipped = plan_parts([item("big.pdf", 5000, "physics")], 1000, flat=False)
+    assert skipped == ["physics/big.pdf"]
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / "files"
+    backend = LocalBackend(root)
+    backend.prepare(["math"])
+    items = []
+    for i in range(6):
+        data = os.urandom(3000)  # Сығылмайтын мазмұн: бөлік өлшемі болжамға сай
+        (root / "math" / f"f{i}.bin").write_bytes(data)
+        items.append(item(f"f{i}.bin", len(data)))
+    return backend, items, tmp_path / "archives"
+
+
+def make_cache(backend, directory, part_size=8000):
+    cache = ArchiveCache(backend, directory, part_size=part_size)
+    cache.prepare()
+    return cache
+
+
+def test_archive_is_split_into_complete_zips(files):
+    backend, items, directory = files
+    cache = make_cache(backend, directory)
+    missing = item("gone.bin", 10)
+
+    async def scenario():
+        archive, cached = await cache.get("math", 1, items + [missing])
+        again, cached_again = await cache.get("math", 1, items)
+        return archive, cached, again, cached_again
+
+    archive, cached, again, cached_again = asyncio.run(scenario())
+    assert not cached and cached_again and again is archive
+    assert archive.files == 6 and archive.skipped == ["gone.bin"]
+    assert len(archive.parts) == 3
+    names = []
+    for part in archive.parts:
+        assert part.size <= 8000
+        with zipfile.ZipFile(part.path) as zf:  # Әр бөлік өз алдына ашылады
+            assert zf.testzip() is None
+            names.extend(zf.namelist())
+    assert names == [f"f{i}.bin" for i in range(6)]
+    cache.close()
+    assert os.listdir(directory) == []
+
+
+def gated(cache):
+    """Құрастыруды бірінші файлдың алдында тоқтатып тұрады."""
+    gate, started = threading.Event(), threading.Event()
+    write_entry = cache._write_entry
+
+    def slow_write(zf, archive_item, flat):
+        started.set()
+        gate.wait(5)
+        return write_entry(zf, archive_item, flat)
+
+    cache._write_entry = slow_write
+    return gate, started
+
+
+async def wait_for_thread(event):
+    while not event.is_set():
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_build(files):
+    backend, items, directory = files
+    cache = make_cache(backend, directory)
+    gate, started = gated(cache)
+
+    async def scenario():
+        first = asyncio.create_task(cache.get("math", 1, items))
+        second = asyncio.create_task(cache.get("math", 1, items))
+        await wait_for_thread(started)
+        first.cancel()
+        await asyncio.sleep(0.05)
+        gate.set()
+        archive, _ = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return archive
+
+    archive = asyncio.run(scenario())
+    assert archive.files == 6 and all(part.path.exists() for part in archive.parts)
+    cache.close()
+
+
+def test_build_stops_when_all_waiters_leave(files):
+    backend, items, directory = files
+    cache = make_cache(backend, directory)
+    gate, started = gated(cache)
+
+    async def scenario():
+        task = asyncio.create_task(cache.get("math", 1, items))
+        await wait_for_thread(started)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        gate.set()
+        await asyncio.get_running_loop().run_in_executor(cache.executor, lambda: None)  # Ағын аяқталды
+
+    asyncio.run(scenario())
+    assert os.listdir(directory) == []  # Жартылай жазылған бөліктер қалмады
+    assert not cache._building and not cache._archives
+    cache.close()
+
+
+def test_close_cancels_pending_discards(files, monkeypatch):
+    backend, items, directory = files
+    monkeypatch.setattr("archive_cache.DISCARD_GRACE", 0.05)
+    cache = make_cache(backend, directory)
+    errors = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        old, _ = await cache.get("math", 1, items)
+        await cache.get("math", 2, items[:2])  # Ескі нұсқа кейін жоюға қойылады
+        gate, started = gated(cache)
+        late = [asyncio.create_task(cache.get("math", version, items[:1])) for version in (3, 4)]
+        await wait_for_thread(started)
+        gate.set()
+        cache.close()  # Құрастырулар аяқталады, бірақ нәтижелері жабылған кэшке тек кейін түседі
+        replaced, _ = await late[0]
+        await late[1]  # 3-нұсқаны ығыстырады
+        await asyncio.sleep(0.1)  # Таймерлер уақыты өтті: жабылған пулға ештеңе жіберілмейді
+        return old, replaced
+
+    old, replaced = asyncio.run(scenario())
+    assert errors == []
+    assert not any(part.path.exists() for part in old.parts + replaced.parts)
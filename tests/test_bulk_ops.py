@@ -0,0 +1,121 @@
+import asyncio
+import os
+
+import pytest
+
+from bulk_ops import (ACTION_DELETE, ACTION_MOVE, BulkArgsError, BulkJob, FileFilter, parse_age, parse_bulk_args,
+                      parse_size)
+from catalog import CatalogEntry, FileCatalog
+from file_store import AsyncFileStore
+from storage_backend import LocalBackend
+
+DAY = 86400
+NOW = 1_700_000_000.0
+
+
+def entry(name, size=100, age_days=0.0):
+    return CatalogEntry(name, size, NOW - age_days * DAY, None)
+
+
+def test_parse_bulk_args():
+    positional, file_filter, dry = parse_bulk_args('"Математика" *.pdf "лекция [1].docx" older=30d larger=1.5MB dry')
+    assert positional == ["Математика", "*.pdf", "лекция [1].docx"]
+    assert file_filter.older_than == 30 * DAY
+    assert file_filter.larger_than == int(1.5 * 1024 ** 2)
+    assert file_filter.smaller_than is None
+    assert dry
+
+
+@pytest.mark.parametrize("text, expected", [("500", 500), ("10kb", 10 * 1024), ("20MB", 20 * 1024 ** 2),
+                                            ("1g", 1024 ** 3)])
+def test_parse_size(text, expected):
+    assert parse_size(text) == expected
+
+
+def test_parse_errors():
+    assert parse_age("12h") == 12 * 3600
+    assert parse_age("2") == 2 * DAY
+    with pytest.raises(BulkArgsError):
+        parse_size("ten")
+    with pytest.raises(BulkArgsError):
+        parse_age("3y")
+    with pytest.raises(BulkArgsError):
+        parse_bulk_args('"unterminated')
+
+
+def test_filter_patterns_and_limits():
+    entries = [entry("Lecture1.PDF", 5000, 40), entry("lecture [1].docx", 50, 40), entry("notes.txt", 500, 1)]
+    assert [e.name for e in FileFilter(["*.pdf"]).select(entries, NOW)] == ["Lecture1.PDF"]
+    # "[1]" glob-та таңбалар жиыны, бірақ нақты атау ретінде де сәйкес келеді
+    assert [e.name for e in FileFilter(["lecture [1].docx"]).select(entries, NOW)] == ["lecture [1].docx"]
+    assert [e.name for e in FileFilter(older_than=30 * DAY).select(entries, NOW)] == ["Lecture1.PDF",
+                                                                                      "lecture [1].docx"]
+    assert [e.name for e in FileFilter(larger_than=100, smaller_than=1000).select(entries, NOW)] == ["notes.txt"]
+    assert FileFilter().empty and not FileFilter(["*"]).empty
+
+
+@pytest.fixture
+def env(tmp_path):
+    root = tmp_path / "files"
+    backend = LocalBackend(root)
+    backend.prepare(["A", "B"])
+    for i in range(7):
+        (root / "A" / f"f{i}.pdf").write_bytes(b"x" * i)
+    (root / "A" / "keep.docx").write_bytes(b"keep")
+    (root / "B" / "f1.pdf").write_bytes(b"taken")
+    catalog = FileCatalog(backend, tmp_path / "catalog_index.json")
+    catalog.load(["A", "B"])
+    file_store = AsyncFileStore(backend, root / ".incoming", max_workers=2)
+    yield root, catalog, file_store
+    file_store.close()
+
+
+def run_job(file_store, catalog, action, selection, target=None):
+    synced = []
+
+    def drive_sync(action, category, target, changed):
+        synced.append((action, category, target, list(changed)))
+        return len(changed)
+
+    job = BulkJob(file_store, catalog, action, selection, target, drive_sync=drive_sync)
+    return asyncio.run(job.run()), synced
+
+
+def test_bulk_delete_in_batches(env, monkeypatch):
+    root, catalog, file_store = env
+    monkeypatch.setattr("bulk_ops.BATCH_SIZE", 3)
+    selection = {"A": FileFilter(["*.pdf"]).select(catalog.entries("A"))}
+    result, synced = run_job(file_store, catalog, ACTION_DELETE, selection)
+    assert (result.matched, result.done, result.failed, result.drive_synced) == (7, 7, 0, 7)
+    assert os.listdir(root / "A") == ["keep.docx"]
+    assert [e.name for e in catalog.entries("A")] == ["keep.docx"]
+    assert len(synced) == 1 and len(synced[0][3]) == 7  # Drive бір рет, барлық топтан кейін
+
+
+def test_bulk_move_renames_on_conflict(env):
+    root, catalog, file_store = env
+    selection = {"A": FileFilter(["f1.pdf", "f2.pdf"]).select(catalog.entries("A"))}
+    result, synced = run_job(file_store, catalog, ACTION_MOVE, selection, "B")
+    assert result.done == 2 and not result.errors
+    assert sorted(os.listdir(root / "B")) == ["f1.pdf", "f1_1.pdf", "f2.pdf"]
+    assert (root / "B" / "f1_1.pdf").read_bytes() == b"x"
+    assert [e.name for e in catalog.entries("B")] == ["f1.pdf", "f1_1.pdf", "f2.pdf"]
+    assert synced == [(ACTION_MOVE, "A", "B", [("f1.pdf", "f1_1.pdf"), ("f2.pdf", "f2.pdf")])]
+
+
+def test_catalog_follows_storage_when_update_fails(env, monkeypatch):
+    root, catalog, file_store = env
+    original = catalog.apply_batch
+
+    def broken(category, removed=(), added=()):
+        if category == "B":
+            raise RuntimeError("registry is locked")
+        return original(category, removed, added)
+
+    monkeypatch.setattr(catalog, "apply_batch", broken)
+    selection = {"A": FileFilter(["f3.pdf"]).select(catalog.entries("A"))}
+    result, synced = run_job(file_store, catalog, ACTION_MOVE, selection, "B")
+    # Файл көшірілді: каталог категорияны қайта сканерлеп, дискімен сәйкес келеді
+    assert result.done == 1 and result.errors
+    assert catalog.get("B", "f3.pdf") is not None and catalog.get("A", "f3.pdf") is None
+    assert synced and synced[0][3] == [("f3.pdf", "f3.pdf")]
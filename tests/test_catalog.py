@@ -0,0 +1,147 @@
+import os
+
+import pytest
+
+from catalog import CatalogEntry, FileCatalog
+from storage_backend import LocalBackend
+
+
+def touch(path, content=b"x", mtime=None):
+    path.write_bytes(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def bump_dir(path, stamp):
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / "files"
+    backend = LocalBackend(root)
+    backend.prepare(["math"])
+    return root, backend, tmp_path / "catalog_index.json"
+
+
+def test_full_scan_is_sorted(store):
+    root, backend, index_file = store
+    for name in ["c.pdf", "a.pdf", "b.pdf"]:
+        touch(root / "math" / name)
+    catalog = FileCatalog(backend, index_file)
+    catalog.load(["math"])
+    assert [e.name for e in catalog.entries("math")] == ["a.pdf", "b.pdf", "c.pdf"]
+    catalog.add("math", "aa.pdf", 1, 0.0)
+    assert [e.name for e in catalog.entries("math")] == ["a.pdf", "aa.pdf", "b.pdf", "c.pdf"]
+
+
+def test_snapshot_reused_when_directory_unchanged(store):
+    root, backend, index_file = store
+    touch(root / "math" / "a.pdf")
+    catalog = FileCatalog(backend, index_file)
+    catalog.load(["math"])
+    catalog.add("math", "a.pdf", 1, 0.0, uploader=42)
+    catalog.save()
+
+    # Индекс файлынан жүктелсе, жүктеуші сақталады (сканерлеуде ол белгісіз)
+    reloaded = FileCatalog(backend, index_file)
+    reloaded.load(["math"])
+    assert reloaded.get("math", "a.pdf").uploader == 42
+
+
+def test_snapshot_invalidated_by_external_change(store):
+    root, backend, index_file = store
+    touch(root / "math" / "a.pdf")
+    bump_dir(root / "math", 1_000_000)
+    catalog = FileCatalog(backend, index_file)
+    catalog.load(["math"])
+    catalog.save()
+
+    touch(root / "math" / "b.pdf")
+    bump_dir(root / "math", 2_000_000)
+    reloaded = FileCatalog(backend, index_file)
+    reloaded.load(["math"])
+    assert [e.name for e in reloaded.entries("math")] == ["a.pdf", "b.pdf"]
+
+
+def test_save_does_not_hide_external_change(store):
+    root, backend, index_file = store
+    touch(root / "math" / "a.pdf")
+    bump_dir(root / "math", 1_000_000)
+    catalog = FileCatalog(backend, index_file)
+    catalog.load(["math"])
+
+    # Басқа жұмысшы файл қосты, содан кейін бұл процесс өз өзгерісін сақтады
+    touch(root / "math" / "b.pdf")
+    bump_dir(root / "math", 2_000_000)
+    catalog.add("math", "c.pdf", 1, 0.0)
+    catalog.save()
+
+    assert catalog.refresh(["math"]) > 0  # Жадтағы белгі сканерлеу кезіндегі күйінде қалады
+    assert catalog.get("math", "b.pdf") is not None
+    catalog.save()
+    reloaded = FileCatalog(backend, index_file)
+    reloaded.load(["math"])
+    assert reloaded.get("math", "b.pdf") is not None
+
+
+def test_own_changes_do_not_force_rescan_on_restart(store, monkeypatch):
+    root, backend, index_file = store
+    touch(root / "math" / "a.pdf")
+    bump_dir(root / "math", 1_000_000)
+    catalog = FileCatalog(backend, index_file)
+    catalog.load(["math"])
+
+    touch(root / "math" / "b.pdf")  # Боттың өз жүктеуі: файл жазылады, содан кейін каталог жаңарады
+    bump_dir(root / "math", 2_000_000)
+    catalog.add("math", "b.pdf", 1, 0.0, uploader=7)
+    (root / "math" / "a.pdf").unlink()
+    bump_dir(root / "math", 3_000_000)
+    catalog.remove("math", "a.pdf")
+    catalog.save()
+
+    scanned = []
+    monkeypatch.setattr(FileCatalog, "_scan_category",
+                        lambda self, category, known: scanned.append(category))
+    reloaded = FileCatalog(backend, index_file)
+    reloaded.load(["math"])
+    assert scanned == []
+    assert [e.name for e in reloaded.entries("math")] == ["b.pdf"]
+    assert reloaded.get("math", "b.pdf").uploader == 7
+
+    # Боттың соңғы өзгерісінен кейінгі сыртқы өзгеріс әлі де байқалады
+    monkeypatch.undo()
+    touch(root / "math" / "c.pdf")
+    bump_dir(root / "math", 4_000_000)
+    reloaded = FileCatalog(backend, index_file)
+    reloaded.load(["math"])
+    assert [e.name for e in reloaded.entries("math")] == ["b.pdf", "c.pdf"]
+
+
+def test_refresh_bumps_version_and_notifies(store):
+    root, backend, index_file = store
+    touch(root / "math" / "a.pdf")
+    bump_dir(root / "math", 1_000_000)
+    catalog = FileCatalog(backend, index_file)
+    events = []
+
+    class Listener:
+        def on_catalog_add(self, category, entry):
+            events.append(("add", entry.name))
+
+        def on_catalog_remove(self, category, name):
+            events.append(("remove", name))
+
+    catalog.add_listener(Listener())
+    catalog.load(["math"])
+    version = catalog.version("math")
+    assert catalog.refresh(["math"]) == 0
+
+    (root / "math" / "a.pdf").unlink()
+    touch(root / "math" / "b.pdf")
+    bump_dir(root / "math", 2_000_000)
+    events.clear()
+    assert catalog.refresh(["math"]) == 2
+    assert sorted(events) == [("add", "b.pdf"), ("remove", "a.pdf")]
+    assert catalog.version("math") > version
+    assert isinstance(catalog.get("math", "b.pdf"), CatalogEntry)
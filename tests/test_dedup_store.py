@@ -0,0 +1,122 @@
+import errno
+import hashlib
+import os
+
+import pytest
+
+import dedup_store
+from dedup_store import ContentStore, link_or_copy
+from file_store import AsyncFileStore
+from storage_backend import LocalBackend
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_link_or_copy_never_overwrites(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.write_bytes(b"new")
+    dst.write_bytes(b"other worker")
+    with pytest.raises(FileExistsError):
+        link_or_copy(src, dst)
+    assert dst.read_bytes() == b"other worker"
+
+
+def test_link_or_copy_copies_when_links_unsupported(tmp_path, monkeypatch):
+    def no_link(src, dst):
+        raise OSError(errno.EXDEV, "cross-device link")
+
+    monkeypatch.setattr(dedup_store.os, "link", no_link)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.write_bytes(b"data")
+    link_or_copy(src, dst)
+    assert dst.read_bytes() == b"data" and not os.path.samefile(src, dst)
+    with pytest.raises(FileExistsError):
+        link_or_copy(src, dst)
+
+
+def test_link_or_copy_reraises_other_errors(tmp_path, monkeypatch):
+    def denied(src, dst):
+        raise OSError(errno.EACCES, "permission denied")
+
+    monkeypatch.setattr(dedup_store.os, "link", denied)
+    (tmp_path / "src").write_bytes(b"data")
+    with pytest.raises(PermissionError):
+        link_or_copy(tmp_path / "src", tmp_path / "dst")
+    assert not (tmp_path / "dst").exists()
+
+
+def test_commit_to_taken_name_leaves_store_unchanged(tmp_path):
+    store = ContentStore(tmp_path / "files", tmp_path / "content.db")
+    dest = tmp_path / "files" / "math" / "a.pdf"
+    dest.parent.mkdir(parents=True)
+    dest.write_bytes(b"other worker")
+    temp = store.new_incoming_path()
+    temp.write_bytes(b"mine")
+    with pytest.raises(FileExistsError):
+        store.commit(temp, sha(b"mine"), dest)
+    assert temp.exists() and dest.read_bytes() == b"other worker"
+    assert not store.has_blob(sha(b"mine")) and store.sha_for("math", "a.pdf") is None
+
+    assert store.commit(temp, sha(b"mine"), dest.with_name("a_1.pdf")) is False
+    assert os.path.samefile(store.blob_path(sha(b"mine")), dest.with_name("a_1.pdf"))
+    store.close()
+
+
+@pytest.mark.parametrize("dedup", [True, False])
+def test_commit_upload_picks_new_name_on_cross_process_collision(tmp_path, dedup):
+    root = tmp_path / "files"
+    content_store = ContentStore(root, tmp_path / "content.db") if dedup else None
+    backend = LocalBackend(root, content_store)
+    backend.prepare(["math"])
+    file_store = AsyncFileStore(backend, tmp_path / "scratch")
+    file_store.scratch_dir.mkdir()
+
+    # Басқа жұмысшы атауды exists() тексерісінен кейін, жазудан бұрын алады
+    real_exists, raced = backend.exists, []
+
+    def exists(key):
+        if key == "math/a.pdf" and not raced:
+            raced.append(key)
+            return False
+        return real_exists(key)
+
+    backend.exists = exists
+    (root / "math" / "a.pdf").write_bytes(b"other worker")
+
+    temp = file_store.new_incoming_path()
+    temp.write_bytes(b"mine")
+    stat, duplicate = file_store._commit_upload(temp, sha(b"mine"), "math", "a.pdf")
+    assert (stat.name, duplicate) == ("a_1.pdf", False)
+    assert (root / "math" / "a.pdf").read_bytes() == b"other worker"
+    assert (root / "math" / "a_1.pdf").read_bytes() == b"mine"
+    file_store.close()
+
+
+def test_delete_many_keeps_going_past_a_failed_unlink(tmp_path, monkeypatch):
+    root = tmp_path / "files"
+    content_store = ContentStore(root, tmp_path / "content.db")
+    backend = LocalBackend(root, content_store)
+    backend.prepare(["math"])
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        temp = content_store.new_incoming_path()
+        temp.write_bytes(name.encode())
+        backend.put(f"math/{name}", temp, sha(name.encode()))
+
+    real_unlink = type(root).unlink
+
+    def unlink(path, *args, **kwargs):
+        if path.name == "b.pdf":
+            raise PermissionError(errno.EACCES, "Permission denied", str(path))
+        return real_unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(type(root), "unlink", unlink)
+    assert backend.delete_many(["math/a.pdf", "math/b.pdf", "math/c.pdf"]) == ["math/a.pdf", "math/c.pdf"]
+    monkeypatch.undo()
+    # Жойылғандардың blob сілтемелері босатылды, жойылмағанынікі сақталды
+    assert content_store.sha_for("math", "a.pdf") is None and content_store.sha_for("math", "c.pdf") is None
+    assert content_store.sha_for("math", "b.pdf") == sha(b"b.pdf")
+    assert not content_store.has_blob(sha(b"a.pdf")) and content_store.has_blob(sha(b"b.pdf"))
+    assert sorted(os.listdir(root / "math")) == ["b.pdf"]
+    content_store.close()
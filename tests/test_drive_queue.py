@@ -0,0 +1,100 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from drive_queue import DriveUploadQueue, PermanentUploadError
+
+
+def run_queue(tmp_path, upload_func, jobs=1, max_attempts=3):
+    db_file = tmp_path / "drive_queue.db"
+    failed, done = [], []
+
+    async def main():
+        queue = DriveUploadQueue(db_file, upload_func, workers=1, max_attempts=max_attempts, base_delay=0.01)
+
+        async def on_failed(job, error):
+            failed.append(error)
+
+        async def on_done(job, drive_id):
+            done.append(drive_id)
+
+        queue.on_failed, queue.on_done = on_failed, on_done
+        await queue.start()
+        for i in range(jobs):
+            await queue.enqueue(f"/files/{i}.pdf", "math")
+        for _ in range(200):
+            if len(failed) + len(done) == jobs:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(main())
+    rows = sqlite3.connect(str(db_file)).execute(
+        "SELECT status, attempts, last_error, drive_id FROM drive_jobs ORDER BY id").fetchall()
+    return rows, failed, done
+
+
+def test_permanent_error_is_not_retried(tmp_path):
+    calls = []
+
+    def upload(job):
+        calls.append(job.id)
+        raise PermanentUploadError("File not found: parent folder")
+
+    rows, failed, _ = run_queue(tmp_path, upload)
+    assert len(calls) == 1
+    assert rows == [("failed", 1, "PermanentUploadError: File not found: parent folder", None)]
+    assert failed == ["PermanentUploadError: File not found: parent folder"]
+
+
+def test_transient_error_is_retried_and_recorded(tmp_path):
+    attempts = []
+
+    def upload(job):
+        attempts.append(job.attempts)
+        if len(attempts) < 3:
+            raise TimeoutError("timed out")
+        return "drive-id"
+
+    rows, failed, done = run_queue(tmp_path, upload, max_attempts=5)
+    assert attempts == [0, 1, 2]
+    assert rows == [("done", 3, "TimeoutError: timed out", "drive-id")]
+    assert done == ["drive-id"] and not failed
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    def upload(job):
+        raise ConnectionResetError("reset")
+
+    rows, failed, _ = run_queue(tmp_path, upload, max_attempts=2)
+    assert rows == [("failed", 2, "ConnectionResetError: reset", None)]
+    assert len(failed) == 1
+
+
+def test_stop_lets_running_upload_save_its_resume_uri(tmp_path):
+    db_file = tmp_path / "drive_queue.db"
+    uploading, chunks = threading.Event(), []
+
+    def upload(job):
+        for sent in range(1, 100):
+            uploading.set()
+            time.sleep(0.02)  # Бір бөлікті жіберу; сервер сессия URI-ін жаңартуы мүмкін
+            chunks.append(sent)
+            queue.save_resume_uri(job, f"https://upload/session-{sent}")
+            queue.report_progress(job, sent, 100)
+        return "drive-id"
+
+    async def main():
+        await queue.start()
+        await queue.enqueue("/files/big.pdf", "math")
+        while not uploading.is_set():
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    queue = DriveUploadQueue(db_file, upload, workers=1)
+    asyncio.run(main())
+    assert len(chunks) < 99  # Жүктеу келесі бөліктің алдында үзілді
+    rows = sqlite3.connect(str(db_file)).execute("SELECT status, resume_uri FROM drive_jobs").fetchall()
+    # Соңғы жіберілген бөліктің URI-і сақталды: келесі іске қосылуда сол жерден жалғасады
+    assert rows == [("pending", f"https://upload/session-{chunks[-1]}")]
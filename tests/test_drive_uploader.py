@@ -0,0 +1,124 @@
+import threading
+
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpMockSequence
+
+import drive_uploader
+from drive_uploader import DriveClient, MULTIPART_THRESHOLD
+
+
+class FakeClient:
+    def __init__(self, credentials_file, folder_map_file=None):
+        self.credentials_file = credentials_file
+        self.folder_map_file = folder_map_file
+
+
+def test_client_cache_is_keyed_on_arguments(monkeypatch, tmp_path):
+    monkeypatch.setattr(drive_uploader, "DriveClient", FakeClient)
+    monkeypatch.setattr(drive_uploader, "_clients", {})
+    service_account = tmp_path / "service_account.json"
+    first = drive_uploader.get_drive_client(service_account, tmp_path / "folders.json")
+    assert drive_uploader.get_drive_client(str(service_account), str(tmp_path / "folders.json")) is first
+    default = drive_uploader.get_drive_client()
+    assert default is not first
+    assert default.credentials_file.endswith(drive_uploader.SERVICE_ACCOUNT_FILE)
+    assert first.credentials_file == str(service_account)
+
+
+def test_upload_to_drive_uses_the_given_client(monkeypatch, tmp_path):
+    monkeypatch.setattr(drive_uploader, "_clients", {})
+    monkeypatch.setattr(drive_uploader, "SERVICE_ACCOUNT_FILE", str(tmp_path / "missing.json"))
+    calls = []
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"x" * 10)
+    assert drive_uploader.upload_to_drive(str(path), "notes.pdf", client=make_client(calls)) == "small-id"
+    assert calls == ["multipart"] and drive_uploader._clients == {}  # Әдепкі клиент жасалмады
+
+
+def make_client(calls):
+    client = object.__new__(DriveClient)
+    client.upload = lambda path, name, parent: calls.append("multipart") or "small-id"
+    client.upload_resumable = lambda *args: calls.append("resumable") or "big-id"
+    return client
+
+
+def test_small_files_use_single_multipart_request(tmp_path):
+    calls, progress = [], []
+    small = tmp_path / "small.pdf"
+    small.write_bytes(b"x" * 1024)
+    client = make_client(calls)
+    assert client.upload_file(str(small), "small.pdf", "folder",
+                              on_progress=lambda sent, total: progress.append((sent, total))) == "small-id"
+    assert calls == ["multipart"] and progress == [(1024, 1024)]
+
+
+def test_large_or_resumed_uploads_use_resumable_session(tmp_path):
+    calls = []
+    big = tmp_path / "big.pdf"
+    with open(big, "wb") as f:
+        f.truncate(MULTIPART_THRESHOLD + 1)
+    small = tmp_path / "small.pdf"
+    small.write_bytes(b"x")
+    client = make_client(calls)
+    assert client.upload_file(str(big), "big.pdf", "folder") == "big-id"
+    assert client.upload_file(str(small), "small.pdf", "folder", resume_uri="https://upload/session") == "big-id"
+    assert calls == ["resumable", "resumable"]
+
+
+def resumable_client(responses):
+    """Drive API-ге желісіз сұраныстар: жауаптар ретімен беріледі, сұраныстар жазылады."""
+    http = HttpMockSequence(responses)
+    client = object.__new__(DriveClient)
+    client._local = threading.local()
+    client._local.http = http
+    client._local.service = build("drive", "v3", http=http, cache_discovery=False, static_discovery=True)
+    return client, http
+
+
+SESSION = "https://www.googleapis.com/upload/drive/v3/files?upload_id=abc"
+
+
+def test_resume_queries_status_and_continues_from_received_offset(tmp_path):
+    source = tmp_path / "big.bin"
+    source.write_bytes(bytes(range(256)) * 4096)  # 1 MB
+    client, http = resumable_client([
+        ({"status": "308", "range": "bytes=0-262143"}, b""),
+        ({"status": "200"}, b'{"id": "file-1"}'),
+    ])
+    progress = []
+    file_id = client.upload_resumable(str(source), "big.bin", "folder", chunk_size=1024 * 1024,
+                                      resume_uri=SESSION, on_progress=lambda s, t: progress.append((s, t)))
+    assert file_id == "file-1"
+    (status_uri, status_method, _, status_headers), (_, chunk_method, _, chunk_headers) = http.request_sequence
+    assert (status_uri, status_method) == (SESSION, "PUT")
+    assert status_headers["Content-Range"] == "bytes */1048576"
+    assert chunk_method == "PUT"
+    assert chunk_headers["Content-Range"] == "bytes 262144-1048575/1048576"
+    assert progress[-1] == (1048576, 1048576)
+
+
+def test_resume_of_completed_upload_returns_file_id_without_sending(tmp_path):
+    source = tmp_path / "done.bin"
+    source.write_bytes(b"x" * 1000)
+    client, http = resumable_client([({"status": "200"}, b'{"id": "file-2"}')])
+    assert client.upload_resumable(str(source), "done.bin", "folder", resume_uri=SESSION) == "file-2"
+    assert len(http.request_sequence) == 1
+
+
+def test_expired_session_restarts_upload(tmp_path):
+    source = tmp_path / "small.bin"
+    source.write_bytes(b"x" * 1000)
+    client, http = resumable_client([
+        ({"status": "404"}, b"Not Found"),
+        ({"status": "200", "location": SESSION + "2"}, b""),
+        ({"status": "200"}, b'{"id": "file-3"}'),
+    ])
+    saved = []
+    assert client.upload_resumable(str(source), "small.bin", "folder", resume_uri=SESSION,
+                                   on_resume_uri=saved.append) == "file-3"
+    assert saved == [None, SESSION + "2"]
+
+
+def test_upload_status_without_range_means_nothing_received():
+    client, _ = resumable_client([({"status": "308"}, b"")])
+    assert client.upload_status(SESSION, 10) == (0, None)
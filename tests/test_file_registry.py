@@ -0,0 +1,70 @@
+from catalog import FileCatalog
+from file_registry import FileRegistry
+from storage_backend import LocalBackend
+
+
+def make_catalog(tmp_path, registry):
+    backend = LocalBackend(tmp_path / "files")
+    backend.prepare(["math", "physics"])
+    catalog = FileCatalog(backend, tmp_path / "catalog_index.json")
+    catalog.add_listener(registry)
+    return backend, catalog
+
+
+def test_ids_survive_restart_and_stale_records_are_dropped(tmp_path):
+    registry = FileRegistry(tmp_path / "registry.db")
+    backend, catalog = make_catalog(tmp_path, registry)
+    catalog.load(["math", "physics"])
+    catalog.add("math", "a.pdf", 10, 1.0)
+    catalog.add("physics", "b.pdf", 20, 2.0)
+    a_id, b_id = registry.id_for("math", "a.pdf"), registry.id_for("physics", "b.pdf")
+    assert a_id != b_id
+    record = registry.get(a_id)
+    assert (record.category, record.name, record.size) == ("math", "a.pdf", 10)
+    registry.close()
+
+    # Қайта іске қосылу: a.pdf дискіде бар, b.pdf боттан тыс жойылды
+    (tmp_path / "files" / "math" / "a.pdf").write_bytes(b"x" * 10)
+    registry = FileRegistry(tmp_path / "registry.db")
+    assert registry.get(b_id) is not None  # Каталог жүктелгенге дейін жазбалар SQLite-тан оқылады
+    _, catalog = make_catalog(tmp_path, registry)
+    catalog.load(["math", "physics"])
+    assert registry.id_for("math", "a.pdf") == a_id
+    assert registry.get(b_id) is None and registry.id_for("physics", "b.pdf") is None
+    registry.close()
+
+
+def test_removed_name_gets_a_new_id(tmp_path):
+    registry = FileRegistry(tmp_path / "registry.db")
+    _, catalog = make_catalog(tmp_path, registry)
+    catalog.load(["math"])
+    catalog.add("math", "a.pdf", 10, 1.0)
+    old_id = registry.id_for("math", "a.pdf")
+    catalog.remove("math", "a.pdf")
+    assert registry.get(old_id) is None
+    catalog.add("math", "a.pdf", 10, 1.0)
+    assert registry.id_for("math", "a.pdf") != old_id  # Ескі батырма басқа файлды жүктемейді
+    registry.close()
+
+
+def test_tg_file_id_is_kept_until_the_file_changes(tmp_path):
+    registry = FileRegistry(tmp_path / "registry.db")
+    _, catalog = make_catalog(tmp_path, registry)
+    catalog.load(["math"])
+    catalog.add("math", "a.pdf", 10, 1.0)
+    record_id = registry.id_for("math", "a.pdf")
+    registry.set_tg_file_id(record_id, "tg-1")
+    catalog.add("math", "a.pdf", 10, 1.0)  # Сол мазмұн: file_id қайта қолданылады
+    assert registry.get(record_id).tg_file_id == "tg-1"
+    registry.close()
+
+    registry = FileRegistry(tmp_path / "registry.db")
+    assert registry.get(record_id).tg_file_id == "tg-1"
+    _, catalog = make_catalog(tmp_path, registry)
+    catalog.add("math", "a.pdf", 12, 3.0)  # Файл ауыстырылды: ескі file_id басқа мазмұнды жіберер еді
+    assert registry.id_for("math", "a.pdf") == record_id
+    assert registry.get(record_id).tg_file_id is None
+    registry.close()
+    registry = FileRegistry(tmp_path / "registry.db")
+    assert registry.get(record_id).tg_file_id is None
+    registry.close()
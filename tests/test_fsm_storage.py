@@ -0,0 +1,143 @@
+import asyncio
+import builtins
+
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+from fsm_storage import SQLiteStorage, create_fsm_storage
+
+
+class Upload(StatesGroup):
+    choosing_category = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=100)
+OTHER = StorageKey(bot_id=1, chat_id=11, user_id=101)
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(fsm_storage.time, "time", clock.time)
+    return clock
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def round_trip(storage):
+    await storage.set_state(KEY, Upload.choosing_category)
+    await storage.set_data(KEY, {"chosen_category_name": "Математика", "idx": 3})
+    result = (await storage.get_state(KEY), await storage.get_data(KEY),
+              await storage.get_state(OTHER), await storage.get_data(OTHER))
+    await storage.set_state(KEY, None)
+    result += (await storage.get_state(KEY), await storage.get_data(KEY))
+    await storage.set_data(KEY, {})
+    result += (await storage.get_data(KEY),)
+    return result
+
+
+def test_sqlite_round_trip(tmp_path, clock):
+    async def main():
+        storage = SQLiteStorage(tmp_path / "fsm.db", ttl=60)
+        try:
+            return await round_trip(storage)
+        finally:
+            await storage.close()
+
+    assert run(main()) == ("Upload:choosing_category", {"chosen_category_name": "Математика", "idx": 3},
+                           None, {}, None, {"chosen_category_name": "Математика", "idx": 3}, {})
+
+
+def test_sqlite_state_survives_restart(tmp_path, clock):
+    async def write():
+        storage = SQLiteStorage(tmp_path / "fsm.db", ttl=60)
+        await storage.set_state(KEY, Upload.choosing_category)
+        await storage.set_data(KEY, {"a": 1})
+        await storage.close()
+
+    async def read():
+        storage = SQLiteStorage(tmp_path / "fsm.db", ttl=60)
+        try:
+            return await storage.get_state(KEY), await storage.get_data(KEY)
+        finally:
+            await storage.close()
+
+    run(write())
+    assert run(read()) == ("Upload:choosing_category", {"a": 1})
+
+
+def test_sqlite_ttl_expiry(tmp_path, clock):
+    async def main():
+        storage = SQLiteStorage(tmp_path / "fsm.db", ttl=60)
+        try:
+            await storage.set_state(KEY, Upload.choosing_category)
+            await storage.set_data(KEY, {"a": 1})
+            clock.now += 30
+            await storage.set_data(KEY, {"a": 2})  # Жазу мерзімді жаңартады
+            clock.now += 45
+            alive = await storage.get_state(KEY), await storage.get_data(KEY)
+            clock.now += 61
+            expired = await storage.get_state(KEY), await storage.get_data(KEY)
+            # Мерзімі өткен жолға жаңа күй жазылса, ескі деректер қайта тірілмейді
+            await storage.set_state(KEY, "Upload:waiting_for_file")
+            fresh = await storage.get_state(KEY), await storage.get_data(KEY)
+            clock.now += 61
+            purged = storage.purge_expired()
+            return alive, expired, fresh, purged
+        finally:
+            await storage.close()
+
+    alive, expired, fresh, purged = run(main())
+    assert alive == ("Upload:choosing_category", {"a": 2})
+    assert expired == (None, {})
+    assert fresh == ("Upload:waiting_for_file", {})
+    assert purged == 1
+
+
+def test_redis_falls_back_to_sqlite_without_package(tmp_path, monkeypatch):
+    real_import = builtins.__import__
+
+    def no_redis(name, *args, **kwargs):
+        if name.startswith("aiogram.fsm.storage.redis") or name == "redis" or name.startswith("redis."):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_redis)
+    storage = create_fsm_storage("redis", tmp_path / "fsm.db", "redis://localhost:6379/0", ttl=60)
+    assert isinstance(storage, SQLiteStorage)
+    run(storage.close())
+
+
+def test_redis_round_trip_and_ttl():
+    # Redis орнына fakeredis: протокол деңгейіндегі жалған сервер (TTL-ді де қолдайды)
+    pytest.importorskip("redis")
+    fakeredis = pytest.importorskip("fakeredis")
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    async def main():
+        redis = fakeredis.FakeAsyncRedis()
+        storage = RedisStorage(redis, state_ttl=60, data_ttl=60)
+        try:
+            result = await round_trip(storage)
+            await storage.set_state(KEY, Upload.choosing_category)
+            ttl = await redis.ttl(storage.key_builder.build(KEY, "state"))
+            return result, ttl
+        finally:
+            await storage.close()
+
+    result, ttl = run(main())
+    assert result == ("Upload:choosing_category", {"chosen_category_name": "Математика", "idx": 3},
+                      None, {}, None, {"chosen_category_name": "Математика", "idx": 3}, {})
+    assert 0 < ttl <= 60
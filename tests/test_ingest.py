@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from aiogram.client.telegram import TelegramAPIServer
+
+from ingest import IngestError, ingest_file, sniff_matches
+
+PDF = b"%PDF-1.7\n" + b"x" * 5000
+
+
+class FakeBot:
+    """Bot-тың ingest қолданатын бөлігі: get_file және сессияның ағындық жүктеуі."""
+
+    def __init__(self, content: bytes, local_path=None, chunk_size=1000):
+        self.token = "42:TOKEN"
+        self.content = content
+        self.chunk_size = chunk_size
+        self.streamed = 0
+        self.closed = False
+        self.session = SimpleNamespace(stream_content=self.stream_content,
+                                       api=TelegramAPIServer.from_base("http://api", is_local=local_path is not None))
+        self.local_path = local_path
+
+    async def get_file(self, file_id):
+        return SimpleNamespace(file_path=str(self.local_path) if self.local_path else f"documents/{file_id}")
+
+    async def stream_content(self, url, timeout, chunk_size):
+        try:
+            for start in range(0, len(self.content), self.chunk_size):
+                self.streamed += 1
+                yield self.content[start:start + self.chunk_size]
+        finally:
+            self.closed = True
+
+
+def test_streamed_file_is_hashed_and_written(tmp_path):
+    target = tmp_path / "incoming.part"
+    digest, size = asyncio.run(ingest_file(FakeBot(PDF), "f1", target, ".pdf", max_size=10_000))
+    assert (digest, size) == (hashlib.sha256(PDF).hexdigest(), len(PDF))
+    assert target.read_bytes() == PDF
+
+
+def test_local_bot_api_file_is_read_from_disk(tmp_path):
+    source = tmp_path / "server" / "doc.pdf"
+    source.parent.mkdir()
+    source.write_bytes(PDF)
+    bot = FakeBot(b"", local_path=source)
+    digest, size = asyncio.run(ingest_file(bot, "f1", tmp_path / "incoming.part", ".pdf", max_size=10_000,
+                                           chunk_size=1024))
+    assert (digest, size) == (hashlib.sha256(PDF).hexdigest(), len(PDF))
+    assert bot.streamed == 0  # HTTP арқылы жүктелмеді
+
+
+def test_oversized_upload_stops_early(tmp_path):
+    bot = FakeBot(PDF * 10)
+    with pytest.raises(IngestError):
+        asyncio.run(ingest_file(bot, "f1", tmp_path / "incoming.part", ".pdf", max_size=3000))
+    assert bot.streamed == 4 and bot.closed  # Шектен асқан бөліктен кейін ағын жабылды
+
+
+@pytest.mark.parametrize("content, ext", [(b"PK\x03\x04" + b"x" * 100, ".pdf"), (b"MZ", ".pdf"),
+                                          (b"text\x00binary" * 10, ".txt")])
+def test_content_must_match_extension(tmp_path, content, ext):
+    with pytest.raises(IngestError):
+        asyncio.run(ingest_file(FakeBot(content), "f1", tmp_path / "incoming.part", ext, max_size=10_000))
+
+
+def test_sniff_matches():
+    assert sniff_matches(".docx", b"PK\x03\x04rest")
+    assert sniff_matches(".txt", b"plain text")
+    assert sniff_matches(".unknown", b"\x00\x01")
+    assert not sniff_matches(".png", b"%PDF-1.4")
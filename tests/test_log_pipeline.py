@@ -0,0 +1,57 @@
+import json
+import logging
+
+import pytest
+
+from log_pipeline import SamplingFilter, setup_logging, stop_logging
+
+
+def record(name="bot", level=logging.INFO, msg="x"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_sampling_is_per_logger_and_keeps_warnings():
+    sampling = SamplingFilter(0.25)
+    assert [sampling.filter(record("a")) for _ in range(8)] == [True, False, False, False] * 2
+    assert sampling.filter(record("b"))  # Әр logger-дің өз санауышы
+    assert all(sampling.filter(record("a", logging.WARNING)) for _ in range(5))
+
+    one = record("c")
+    assert sampling.filter(one) and sampling.filter(one)  # Бір жазба екінші өңдеушіде қайта саналмайды
+    assert not sampling.filter(record("c"))
+
+    silent = SamplingFilter(0)
+    assert not silent.filter(record()) and silent.filter(record(level=logging.ERROR))
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_queued_json_log_with_sampling(tmp_path, restore_root_logger):
+    log_file = tmp_path / "bot.log"
+    setup_logging(str(log_file), json_format=True, info_sample_rate=0.5)
+    logger = logging.getLogger("studyshare.test")
+    for i in range(10):
+        logger.info(f"info {i}")
+    logger.warning("сақталады")
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("қате")
+    stop_logging()  # Кезектегі жазбалар дискіге жазылады
+
+    rows = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert [row["message"] for row in rows] == [f"info {i}" for i in range(0, 10, 2)] + ["сақталады", "қате"]
+    assert rows[-2]["level"] == "WARNING" and rows[-2]["logger"] == "studyshare.test"
+    assert "ValueError: boom" in rows[-1]["exc"]
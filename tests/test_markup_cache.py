@@ -0,0 +1,51 @@
+from catalog import FileCatalog
+from markup_cache import MarkupCache
+from storage_backend import LocalBackend
+
+
+def make_catalog(tmp_path):
+    backend = LocalBackend(tmp_path / "files")
+    backend.prepare(["math", "physics"])
+    catalog = FileCatalog(backend, tmp_path / "catalog_index.json")
+    catalog.load(["math", "physics"])
+    return catalog
+
+
+def test_page_is_rebuilt_after_catalog_change(tmp_path):
+    catalog = make_catalog(tmp_path)
+    cache = MarkupCache()
+    builds = []
+
+    def show(category):
+        def build():
+            names = [e.name for e in catalog.entries(category)]
+            builds.append(names)
+            return names
+        return cache.page((category, 1), catalog.version(category), build)
+
+    catalog.add("math", "a.pdf", 1, 0.0)
+    assert show("math") == ["a.pdf"]
+    assert show("math") == ["a.pdf"] and len(builds) == 1
+    catalog.add("math", "b.pdf", 1, 0.0)  # Нұсқа өсті: ескі бет қайтарылмайды
+    assert show("math") == ["a.pdf", "b.pdf"]
+    assert show("physics") == []
+    catalog.add("physics", "c.pdf", 1, 0.0)
+    assert show("math") == ["a.pdf", "b.pdf"]  # Басқа категорияның өзгерісі бұл бетке әсер етпейді
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_pages_are_bounded_and_categories_reset_menus():
+    cache = MarkupCache(max_pages=2)
+    for page in (1, 2, 3):
+        cache.page(("math", page), 0, lambda: page)
+    assert len(cache) == 2
+    assert cache.page(("math", 1), 0, lambda: "rebuilt") == "rebuilt"  # Ең ескісі ығыстырылды
+
+    cache.set_categories(["math", "physics"])
+    menu = cache.category_menu("list_idx_")
+    assert cache.category_menu("list_idx_") is menu
+    assert [b.callback_data for row in menu.inline_keyboard for b in row] == ["list_idx_0", "list_idx_1"]
+    cache.set_categories(["math", "physics", "history"])
+    assert len(cache) == 0
+    rebuilt = cache.category_menu("list_idx_")
+    assert rebuilt is not menu and [b.text for row in rebuilt.inline_keyboard for b in row][-1] == "history"
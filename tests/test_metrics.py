@@ -0,0 +1,84 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import ClientSession
+
+from metrics import CONTENT_TYPE, MetricsMiddleware, MetricsRegistry, start_metrics_server
+
+
+def test_exposition_format():
+    registry = MetricsRegistry(const_labels={"worker": 1})
+    downloads = registry.counter("downloads_total", "Жүктеулер", ("source",))
+    downloads.inc("cache")
+    downloads.inc("cache")
+    downloads.inc('di"sk', amount=3)
+    registry.gauge("queue_depth", "Кезек", func=lambda: 7)
+    latency = registry.histogram("latency_seconds", "Кідіріс", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP studyshare_downloads_total Жүктеулер", "# TYPE studyshare_downloads_total counter"]
+    assert 'studyshare_downloads_total{worker="1",source="cache"} 2.0' in lines
+    assert 'studyshare_downloads_total{worker="1",source="di\\"sk"} 3.0' in lines
+    assert 'studyshare_queue_depth{worker="1"} 7.0' in lines
+    # Бакеттер кумулятивті, +Inf барлық бақылауды қамтиды
+    assert [line for line in lines if line.startswith("studyshare_latency_seconds")] == [
+        'studyshare_latency_seconds_bucket{worker="1",le="0.1"} 1',
+        'studyshare_latency_seconds_bucket{worker="1",le="1.0"} 3',
+        'studyshare_latency_seconds_bucket{worker="1",le="+Inf"} 4',
+        'studyshare_latency_seconds_sum{worker="1"} 6.05',
+        'studyshare_latency_seconds_count{worker="1"} 4',
+    ]
+
+
+def test_failing_gauge_is_skipped():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Қате", func=lambda: 1 / 0)
+    registry.counter("ok_total", "Жұмыс істейді").inc()
+    assert registry.render().splitlines()[-1] == "studyshare_ok_total 1.0"
+
+
+def test_middleware_counts_latency_and_errors():
+    registry = MetricsRegistry()
+    middleware = MetricsMiddleware(registry)
+
+    async def show_files(event, data):
+        return "ok"
+
+    async def broken(event, data):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        await middleware(show_files, None, {"handler": SimpleNamespace(callback=show_files)})
+        with pytest.raises(RuntimeError):
+            await middleware(broken, None, {"handler": SimpleNamespace(callback=broken)})
+
+    asyncio.run(scenario())
+    text = registry.render()
+    assert 'studyshare_handler_latency_seconds_count{handler="show_files"} 1' in text
+    assert 'studyshare_handler_errors_total{handler="broken"} 1.0' in text
+    assert 'studyshare_handler_in_flight{handler="broken"} 0.0' in text
+
+
+def test_metrics_server_serves_registry():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Сұраныстар").inc()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    async def scenario():
+        runner = await start_metrics_server(registry, "127.0.0.1", port)
+        try:
+            async with ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    return resp.status, resp.headers["Content-Type"], await resp.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200 and content_type == CONTENT_TYPE
+    assert "studyshare_requests_total 1.0" in body
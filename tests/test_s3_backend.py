@@ -0,0 +1,146 @@
+import pytest
+
+import storage_backend
+from catalog import FileCatalog
+from storage_backend import S3Backend, StorageError
+from tests.s3_stub import FakeS3
+
+
+@pytest.fixture
+def s3():
+    server = FakeS3().start()
+    yield server
+    server.stop()
+
+
+def backend_for(s3, secret=None, prefix="bot"):
+    return S3Backend(s3.endpoint, s3.bucket, s3.access_key, secret or s3.secret_key, s3.region, prefix)
+
+
+def put_bytes(backend, tmp_path, key, data):
+    source = tmp_path / "upload.part"
+    source.write_bytes(data)
+    backend.put(key, source)
+    assert not source.exists()
+
+
+def test_put_get_stat_and_list(s3, tmp_path):
+    backend = backend_for(s3)
+    put_bytes(backend, tmp_path, "Математика/конспект 1 (final).pdf", b"x" * 100)
+    put_bytes(backend, tmp_path, "Математика/b.pdf", b"y")
+    put_bytes(backend, tmp_path, "Физика/c.pdf", b"z")
+
+    assert "bot/Математика/конспект 1 (final).pdf" in s3.objects  # prefix + UTF-8 кілт
+    with backend.get("Математика/конспект 1 (final).pdf") as body:
+        assert body.read() == b"x" * 100
+    info = backend.stat("Математика/b.pdf")
+    assert (info.key, info.size) == ("Математика/b.pdf", 1)
+    assert backend.stat("Математика/missing.pdf") is None
+    listed = sorted((i.key, i.size) for i in backend.list("Математика/"))
+    assert listed == [("Математика/b.pdf", 1), ("Математика/конспект 1 (final).pdf", 100)]
+
+
+def test_list_follows_continuation_tokens(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_backend, "S3_LIST_PAGE_SIZE", 2)
+    backend = backend_for(s3)
+    for i in range(5):
+        put_bytes(backend, tmp_path, f"math/{i}.pdf", b"x")
+    requests_before = s3.count("GET", "list-type")
+    assert sorted(i.key for i in backend.list("math/")) == [f"math/{i}.pdf" for i in range(5)]
+    # .version белгісі тізімде жоқ, бірақ бетке кіреді: 6 кілт / 2 = 3 бет
+    assert s3.count("GET", "list-type") - requests_before == 3
+
+
+def test_wrong_secret_is_rejected_by_signature_check(s3, tmp_path):
+    with pytest.raises(StorageError, match="403"):
+        backend_for(s3, secret="wrong").list("math/")
+    # Дұрыс кілтпен ерекше таңбалары бар сұраныс жолы да қолтаңбаға сәйкес келеді
+    backend = backend_for(s3)
+    put_bytes(backend, tmp_path, "math/a+b=c&d.pdf", b"1")
+    assert [i.key for i in backend.list("math/")] == ["math/a+b=c&d.pdf"]
+
+
+def test_server_errors_surface_as_storage_error(s3, tmp_path):
+    backend = backend_for(s3)
+    s3.fail_next = [500]
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"data")
+    with pytest.raises(StorageError, match="500"):
+        backend.put("math/a.pdf", source)
+    assert source.exists()  # Сәтсіз жүктеуде уақытша файл жойылмайды
+    s3.fail_next = [503]
+    with pytest.raises(StorageError, match="503"):
+        backend.stat("math/a.pdf")
+
+
+def test_get_missing_raises_file_not_found(s3):
+    with pytest.raises(FileNotFoundError):
+        backend_for(s3).get("math/missing.pdf")
+
+
+def test_delete_delete_many_and_move(s3, tmp_path):
+    backend = backend_for(s3)
+    for name in ("a.pdf", "b.pdf", "c.pdf", "d.pdf"):
+        put_bytes(backend, tmp_path, f"math/{name}", name.encode())
+    assert backend.delete("math/a.pdf") is True
+    assert backend.delete("math/a.pdf") is False
+    assert sorted(backend.delete_many(["math/b.pdf", "math/c.pdf"])) == ["math/b.pdf", "math/c.pdf"]
+    backend.move("math/d.pdf", "physics/d_1.pdf")
+    assert [i.key for i in backend.list("math/")] == []
+    with backend.get("physics/d_1.pdf") as body:
+        assert body.read() == b"d.pdf"
+    with pytest.raises(FileNotFoundError):
+        backend.move("math/missing.pdf", "physics/missing.pdf")
+
+
+def test_put_and_move_never_overwrite(s3, tmp_path, monkeypatch):
+    backend = backend_for(s3)
+    put_bytes(backend, tmp_path, "math/a.pdf", b"first")
+    put_bytes(backend, tmp_path, "math/b.pdf", b"second")
+    source = tmp_path / "late.part"
+    source.write_bytes(b"late")
+    with pytest.raises(FileExistsError):
+        backend.put("math/a.pdf", source)
+    assert source.exists()  # Шақырушы келесі атаумен қайта жазады
+    with pytest.raises(FileExistsError):
+        backend.move("math/b.pdf", "math/a.pdf")
+    # stat пен көшірудің арасында атауды басқа процесс алса, шартты CopyObject ұстайды
+    monkeypatch.setattr(backend, "stat", lambda key: None)
+    with pytest.raises(FileExistsError):
+        backend.move("math/b.pdf", "math/a.pdf")
+    assert s3.objects["bot/math/a.pdf"][0] == b"first"
+    assert s3.objects["bot/math/b.pdf"][0] == b"second"
+
+
+def test_change_stamp_tracks_writes_per_category(s3, tmp_path):
+    backend = backend_for(s3)
+    math_stamp, physics_stamp = backend.change_stamp("math"), backend.change_stamp("physics")
+    assert math_stamp and backend.change_stamp("math") == math_stamp  # Белгі жасалды және тұрақты
+
+    put_bytes(backend, tmp_path, "math/a.pdf", b"1")
+    after_put = backend.change_stamp("math")
+    assert after_put != math_stamp and backend.change_stamp("physics") == physics_stamp
+
+    backend.move("math/a.pdf", "physics/a.pdf")
+    assert backend.change_stamp("math") != after_put
+    assert backend.change_stamp("physics") != physics_stamp
+
+    before_delete = backend.change_stamp("physics")
+    backend.delete_many(["physics/a.pdf"])
+    assert backend.change_stamp("physics") != before_delete
+
+
+def test_catalog_refresh_uses_marker_instead_of_listing(s3, tmp_path):
+    worker_a, worker_b = backend_for(s3), backend_for(s3)
+    put_bytes(worker_a, tmp_path, "math/a.pdf", b"1")
+    catalog = FileCatalog(worker_a, tmp_path / "catalog_index.json")
+    catalog.load(["math", "physics"])
+
+    lists = s3.count("GET", "list-type")
+    assert catalog.refresh(["math", "physics"]) == 0
+    assert s3.count("GET", "list-type") == lists  # Өзгеріс жоқ: тек HEAD сұраныстары
+
+    put_bytes(worker_b, tmp_path, "math/b.pdf", b"2")  # Басқа жұмысшы
+    assert catalog.refresh(["math", "physics"]) == 1
+    assert s3.count("GET", "list-type") == lists + 1
+    assert catalog.get("math", "b.pdf") is not None
@@ -0,0 +1,23 @@
+from catalog import CatalogEntry
+from search_engine import SearchIndex
+
+
+def build(names):
+    index = SearchIndex()
+    for i, (category, name) in enumerate(names):
+        index.on_catalog_add(category, CatalogEntry(name, 1, float(i)))
+    return index
+
+
+def test_limit_returns_top_ranked_prefix():
+    names = [("math", f"algebra_{i}.pdf") for i in range(50)] + [("math", "linear_algebra_notes.pdf")]
+    index = build(names)
+    full = index.search("algebra")
+    assert len(full) == 51
+    assert index.search("algebra", limit=5) == full[:5]
+    assert index.search("algebra", limit=100) == full
+
+
+def test_newer_files_rank_first_on_equal_score():
+    index = build([("math", "exam_2020.pdf"), ("math", "exam_2021.pdf")])
+    assert index.search("exam", limit=1) == [("math", "exam_2021.pdf")]
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import ClientConnectorError
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.methods import SendMessage
+
+from metrics import MetricsRegistry
+from send_queue import PRIORITY_BULK, PRIORITY_TEXT, OutboundQueue, PooledAiohttpSession
+
+METHOD = SendMessage(chat_id=1, text="x")
+
+
+def run_queue(scenario, **kwargs):
+    async def run():
+        queue = OutboundQueue(**kwargs)
+        queue.start()
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.stop(timeout=1)
+
+    return asyncio.run(run())
+
+
+def recorder(log, tag, delay=0.01):
+    async def call():
+        await asyncio.sleep(delay)
+        log.append(tag)
+        return tag
+    return call
+
+
+def test_chat_order_and_text_priority():
+    log = []
+
+    async def scenario(queue):
+        tasks = [asyncio.create_task(queue.submit("A", recorder(log, "A1", 0.05), PRIORITY_BULK)),
+                 asyncio.create_task(queue.submit("A", recorder(log, "A2"), PRIORITY_BULK))]
+        await asyncio.sleep(0.01)  # A1 жіберілуде
+        tasks.append(asyncio.create_task(queue.submit("B", recorder(log, "B1"), PRIORITY_TEXT)))
+        return await asyncio.gather(*tasks)
+
+    assert run_queue(scenario, workers=1) == ["A1", "A2", "B1"]
+    # Бір жұмысшы: A1 жіберіліп жатқанда келген мәтіндік B1 A чатының келесі құжатынан бұрын кетеді
+    assert log == ["A1", "B1", "A2"]
+
+
+def test_retry_after_does_not_hold_the_worker():
+    log, attempts = [], []
+
+    async def limited():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise TelegramRetryAfter(method=METHOD, message="Too Many Requests", retry_after=0.3)
+        log.append("A1")
+        return "A1"
+
+    async def scenario(queue):
+        first = asyncio.create_task(queue.submit("A", limited))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(queue.submit("A", recorder(log, "A2")))
+        other = asyncio.create_task(queue.submit("B", recorder(log, "B1")))
+        return await asyncio.gather(first, second, other)
+
+    registry = MetricsRegistry()
+    assert run_queue(scenario, workers=1, registry=registry) == ["A1", "A2", "B1"]
+    # Жалғыз жұмысшы A чатын күтіп тұрмай, B-ны жіберді; A2 қайталанған A1-ден кейін ғана
+    assert log == ["B1", "A1", "A2"]
+    assert attempts[1] - attempts[0] >= 0.3
+
+
+def test_server_errors_are_retried_with_backoff():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TelegramServerError(method=METHOD, message="Bad Gateway")
+        return "ok"
+
+    assert run_queue(lambda queue: queue.submit("C", flaky), base_delay=0.01) == "ok"
+    assert len(attempts) == 3
+
+
+def test_errors_reach_the_caller():
+    attempts = []
+
+    async def bad():
+        attempts.append(1)
+        raise TelegramBadRequest(method=METHOD, message="chat not found")
+
+    async def always_busy():
+        attempts.append(1)
+        raise TelegramRetryAfter(method=METHOD, message="Too Many Requests", retry_after=0)
+
+    with pytest.raises(TelegramBadRequest):
+        run_queue(lambda queue: queue.submit("C", bad))
+    assert len(attempts) == 1
+
+    attempts.clear()
+    with pytest.raises(TelegramRetryAfter):
+        run_queue(lambda queue: queue.submit("C", always_busy), max_attempts=3)
+    assert len(attempts) == 3
+
+
+class Refused(ClientConnectorError):
+    def __init__(self):
+        OSError.__init__(self, "Connection refused")
+
+
+def network_failure(attempts, refused=False):
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            try:
+                if refused:
+                    raise Refused()
+                raise TimeoutError()
+            except Exception:
+                raise TelegramNetworkError(method=METHOD, message="Request timeout error")
+        return "ok"
+    return call
+
+
+def test_network_errors_do_not_resend_new_messages():
+    attempts = []
+    with pytest.raises(TelegramNetworkError):  # Хабарлама жетіп үлгерген болуы мүмкін: көшірме жібермейміз
+        run_queue(lambda queue: queue.submit("C", network_failure(attempts), name="SendDocument"), base_delay=0.01)
+    assert len(attempts) == 1
+
+    attempts.clear()
+    assert run_queue(lambda queue: queue.submit("C", network_failure(attempts), name="EditMessageText"),
+                     base_delay=0.01) == "ok"
+    assert len(attempts) == 2
+
+    attempts.clear()  # Қосылым орнамады: сұраныс жетпеген, қайталау қауіпсіз
+    assert run_queue(lambda queue: queue.submit("C", network_failure(attempts, refused=True), name="SendMessage"),
+                     base_delay=0.01) == "ok"
+    assert len(attempts) == 2
+
+
+def test_pooled_session_applies_connector_options():
+    async def scenario():
+        session = PooledAiohttpSession(limit=7, keepalive_timeout=90)
+        client = await session.create_session()
+        try:
+            assert await session.create_session() is client
+            assert client.connector.limit == 7
+            assert client.connector._keepalive_timeout == 90
+        finally:
+            await session.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,156 @@
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import stats_store
+from stats_store import StatsStore
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "user_stats.json", tmp_path / "user_stats.log"
+
+
+def ts(days_ago=0, today=None):
+    day = (today or date.today()) - timedelta(days=days_ago)
+    return datetime.combine(day, datetime.min.time()).replace(hour=12).isoformat()
+
+
+def open_store(paths, **kwargs):
+    store = StatsStore(*paths, **kwargs)
+    store.load()
+    return store
+
+
+def test_journal_is_replayed_after_crash(paths):
+    store = open_store(paths, compact_every=1000)
+    for i in range(5):
+        store.record_upload(1, "alice", ts())
+    store.record_upload(2, "bob", ts())
+    # close() шақырылмады: снапшот жоқ, тек журнал
+    assert not paths[0].exists()
+
+    reloaded = open_store(paths)
+    assert reloaded.get(1)["files_uploaded"] == 5
+    assert reloaded.totals() == (2, 6)
+    assert [uid for uid, _ in reloaded.top()] == ["1", "2"]
+    # Қайта ойнатылған журнал снапшотқа біріктірілді
+    assert json.loads(paths[0].read_text(encoding="utf-8"))["1"]["files_uploaded"] == 5
+    assert paths[1].read_text() == ""
+    reloaded.close()
+    store.close()
+
+
+def test_torn_last_line_is_skipped(paths):
+    store = open_store(paths, compact_every=1000)
+    store.record_upload(1, "alice", ts())
+    with open(paths[1], "a", encoding="utf-8") as f:
+        f.write('{"user_id": "1", "usern')
+    reloaded = open_store(paths)
+    assert reloaded.get(1)["files_uploaded"] == 1
+    reloaded.close()
+
+
+def test_compaction_every_n_events(paths):
+    store = open_store(paths, compact_every=3)
+    for _ in range(3):
+        store.record_upload(7, "carol", ts())
+    assert json.loads(paths[0].read_text(encoding="utf-8"))["7"]["files_uploaded"] == 3
+    assert paths[1].read_text() == ""
+    store.close()
+
+
+def brute_force_window(store, days, today):
+    counts = {}
+    for uid, user in store.all().items():
+        for day, count in user.get("daily", {}).items():
+            if (today - date.fromisoformat(day)).days < days:
+                counts[uid] = counts.get(uid, 0) + count
+    return counts
+
+
+def window_counts(store, days):
+    top, users, total = store.top_window(days)
+    return {uid: count for uid, _, count in top}, users, total
+
+
+def test_window_counts_are_incremental_and_match_full_scan(paths):
+    store = open_store(paths, compact_every=1000)
+    events = [(1, 0), (1, 3), (2, 6), (2, 7), (3, 20), (3, 29), (4, 30), (1, 1)]
+    for uid, days_ago in events:
+        store.record_upload(uid, f"user{uid}", ts(days_ago))
+    today = date.today()
+    for days in (7, 30):
+        expected = brute_force_window(store, days, today)
+        assert window_counts(store, days) == (expected, len(expected), sum(expected.values()))
+
+    # Терезелер бар: жаңа оқиғалар қайта есептеусіз қосылады
+    store.record_upload(4, "user4", ts())
+    store.record_upload(2, "user2", ts(2))
+    for days in (7, 30):
+        expected = brute_force_window(store, days, today)
+        assert window_counts(store, days)[0] == expected
+    store.close()
+
+
+def test_leaderboards_and_totals_follow_uploads(paths, monkeypatch):
+    today = date(2025, 5, 10)
+
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(stats_store, "date", FakeDate)
+    store = open_store(paths, compact_every=1000)
+    store.leaderboard.size = 3
+    # uid: (бұрынғы жүктемелер 6 күн бұрын, бүгінгі жүктемелер)
+    uploads = {1: (5, 0), 2: (0, 1), 3: (2, 0), 4: (0, 3), 5: (1, 0)}
+    for uid, (old, new) in uploads.items():
+        for _ in range(old):
+            store.record_upload(uid, f"user{uid}", ts(6, today))
+        for _ in range(new):
+            store.record_upload(uid, f"user{uid}", ts(0, today))
+
+    assert [(uid, user["files_uploaded"]) for uid, user in store.top()] == [("1", 5), ("4", 3), ("3", 2)]
+    assert store.totals() == (5, 12)
+    top, users, total = store.top_window(7)
+    assert [(uid, count) for uid, _, count in top] == [("1", 5), ("4", 3), ("3", 2)]
+    assert (users, total) == (5, 12)
+
+    for _ in range(4):  # Терезе бар: топ инкременттік жаңарады
+        store.record_upload(3, "user3", ts(0, today))
+    assert [(uid, count) for uid, _, count in store.top_window(7)[0]] == [("3", 6), ("1", 5), ("4", 3)]
+
+    today = date(2025, 5, 11)  # 6 күн бұрынғы жүктемелер терезеден шықты: 1 мен 5 топтан түседі
+    top, users, total = store.top_window(7)
+    assert [(uid, count) for uid, _, count in top] == [("3", 4), ("4", 3), ("2", 1)]
+    assert (users, total) == (3, 8)
+    assert [uid for uid, _ in store.top()] == ["3", "1", "4"]
+    assert store.totals() == (5, 16)  # Барлық уақыттағы жиынтық өзгермейді
+    store.close()
+
+
+def test_window_slides_when_the_day_changes(paths, monkeypatch):
+    today = date(2025, 5, 10)
+
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(stats_store, "date", FakeDate)
+    store = open_store(paths, compact_every=1000)
+    store.record_upload(1, "alice", ts(6, today))
+    store.record_upload(2, "bob", ts(0, today))
+    assert window_counts(store, 7) == ({"1": 1, "2": 1}, 2, 2)
+
+    today = date(2025, 5, 11)  # alice-тің жүктемесі терезеден шықты
+    assert window_counts(store, 7) == ({"2": 1}, 1, 1)
+    store.record_upload(1, "alice", ts(0, today))
+    assert window_counts(store, 7) == ({"2": 1, "1": 1}, 2, 2)
+
+    today = date(2025, 7, 1)  # Терезеден ұзын алшақтық: толық қайта есептеу
+    assert window_counts(store, 7) == ({}, 0, 0)
+    store.close()
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from aiogram.types import CallbackQuery, Chat, Document, Message, User
+
+import throttling
+from throttling import THROTTLED_TEXT, ThrottlingMiddleware
+
+USER = User(id=1, is_bot=False, first_name="Alice")
+CHAT = Chat(id=1, type="private")
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    sent = []
+
+    async def answer(self, text, *args, **kwargs):
+        sent.append((type(self).__name__, text))
+
+    monkeypatch.setattr(Message, "answer", answer)
+    monkeypatch.setattr(CallbackQuery, "answer", answer)
+    return sent
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(throttling.time, "monotonic", lambda: now[0])
+    return now
+
+
+def message(text="hi"):
+    return Message(message_id=1, date=datetime.now(), chat=CHAT, from_user=USER, text=text)
+
+
+def callback(data="cat:1"):
+    return CallbackQuery(id="1", from_user=USER, chat_instance="x", data=data, message=message())
+
+
+def feed(middleware, events):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    async def run():
+        for event in events:
+            await middleware(handler, event, {})
+
+    asyncio.run(run())
+    return handled
+
+
+def test_throttled_messages_get_one_notice_per_episode(answers, clock):
+    middleware = ThrottlingMiddleware(user_rate=1.0, user_burst=2)
+    assert len(feed(middleware, [message() for _ in range(5)])) == 2
+    assert answers == [("Message", THROTTLED_TEXT)]
+
+    clock[0] += 10  # Шелек толды: шектеу кезеңі аяқталады
+    assert len(feed(middleware, [message() for _ in range(4)])) == 2
+    assert answers == [("Message", THROTTLED_TEXT)] * 2
+
+
+def test_every_throttled_callback_is_answered(answers, clock):
+    middleware = ThrottlingMiddleware(user_rate=1.0, user_burst=1, debounce=0)
+    handled = feed(middleware, [callback(f"cat:{i}") for i in range(3)])
+    assert len(handled) == 1
+    assert answers == [("CallbackQuery", THROTTLED_TEXT)] * 2
+
+
+def test_duplicate_callback_is_coalesced(answers, clock):
+    middleware = ThrottlingMiddleware(user_burst=10, debounce=1.0)
+    assert len(feed(middleware, [callback(), callback()])) == 1
+    assert answers == [("CallbackQuery", "⏳ Өңделуде...")]
+    clock[0] += 2
+    assert len(feed(middleware, [callback()])) == 1
+
+
+def test_document_bursts_are_not_throttled(answers, clock):
+    middleware = ThrottlingMiddleware(user_rate=1.0, user_burst=5)
+    documents = [Message(message_id=i, date=datetime.now(), chat=CHAT, from_user=USER,
+                         document=Document(file_id=f"d{i}", file_unique_id=f"d{i}")) for i in range(10)]
+    assert len(feed(middleware, documents)) == 10
+    assert answers == []
+    assert len(feed(middleware, [message() for _ in range(5)])) == 5  # Құжаттар мәтін квотасын жұмсамайды
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from upload_scheduler import UploadQueueFull, UploadScheduler
+
+
+def test_waiters_are_served_round_robin():
+    scheduler = UploadScheduler(max_active=1, per_user=1, max_queue=10)
+    order, positions = [], {}
+
+    async def upload(tag, user_id):
+        async def queued(position):
+            positions[tag] = position
+
+        async with scheduler.slot(user_id, queued):
+            order.append(tag)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        tasks = []
+        for tag, user_id in [("A1", 1), ("A2", 1), ("A3", 1), ("A4", 1), ("B1", 2), ("C1", 3)]:
+            tasks.append(asyncio.create_task(upload(tag, user_id)))
+            await asyncio.sleep(0)  # Кезекке жіберілген ретімен тұрады
+        assert scheduler.queue_depth == 5 and scheduler.active == 1
+        assert scheduler.position(1) == 5  # A-ның соңғы файлы бәрінен кейін
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # Төрт файл жіберген A басқаларды бітемейді: B мен C A-ның екінші файлынан кейін бірден кетеді
+    assert order == ["A1", "A2", "B1", "C1", "A3", "A4"]
+    # Кезекке тұрғандағы орын нақты шығу ретімен сәйкес: B мен C A-ның барлық файлын күтпейді
+    assert positions == {"A2": 1, "A3": 2, "A4": 3, "B1": 2, "C1": 3}
+    assert scheduler.stats()["started_total"] == 6 and scheduler.active == 0
+
+
+def test_full_queue_rejects_new_uploads():
+    scheduler = UploadScheduler(max_active=1, per_user=1, max_queue=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold(user_id):
+            async with scheduler.slot(user_id):
+                await release.wait()
+
+        running = asyncio.create_task(hold(1))
+        waiting = asyncio.create_task(hold(2))
+        await asyncio.sleep(0)
+        with pytest.raises(UploadQueueFull):
+            async with scheduler.slot(3):
+                pass
+        release.set()
+        await asyncio.gather(running, waiting)
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["rejected_total"] == 1
+    assert scheduler.queue_depth == 0 and scheduler.active == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = UploadScheduler(max_active=1, per_user=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold(user_id):
+            async with scheduler.slot(user_id):
+                await release.wait()
+
+        running = asyncio.create_task(hold(1))
+        waiting = asyncio.create_task(hold(2))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.queue_depth == 0
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert scheduler.active == 0 and scheduler.stats()["started_total"] == 1
@@ -0,0 +1,96 @@
+import asyncio
+import socket
+
+from aiohttp import ClientSession
+
+from webhook_server import INTERNAL_PATH, INTERNAL_SECRET_HEADER, UpdateFanout, WebhookServer, update_chat_id
+
+
+def test_update_chat_id():
+    assert update_chat_id({"update_id": 1, "message": {"chat": {"id": -100}, "from": {"id": 5}}}) == -100
+    assert update_chat_id({"update_id": 2, "callback_query": {"from": {"id": 5},
+                                                              "message": {"chat": {"id": 7}}}}) == 7
+    assert update_chat_id({"update_id": 3, "inline_query": {"from": {"id": 5}}}) == 5
+    # Чаты да, пайдаланушысы да жоқ жаңартулар бір тізбекке жиналмайды
+    assert update_chat_id({"update_id": 4, "poll": {"id": "p"}}) == 4
+    assert update_chat_id({"update_id": 5, "poll": {"id": "p"}}) == 5
+
+
+def test_fanout_keeps_chat_order_and_rejects_overflow():
+    log = []
+
+    async def handler(raw):
+        await asyncio.sleep(raw["delay"])
+        log.append(raw["tag"])
+
+    async def scenario():
+        fanout = UpdateFanout(handler, max_pending=3)
+        assert fanout.submit(1, {"tag": "a1", "delay": 0.03})
+        assert fanout.submit(1, {"tag": "a2", "delay": 0})
+        assert fanout.submit(2, {"tag": "b1", "delay": 0})
+        assert not fanout.submit(3, {"tag": "c1", "delay": 0})  # Кезек толы: Telegram қайта жібереді
+        await fanout.stop(timeout=1)
+        return fanout.stats()
+
+    stats = asyncio.run(scenario())
+    assert log == ["b1", "a1", "a2"]  # b1 a1-ді күтпейді, a2 a1-ден кейін ғана
+    assert stats["processed_total"] == 3 and stats["rejected_total"] == 1 and stats["pending"] == 0
+
+
+def free_ports(count):
+    """Қатар тұрған count бос порттың біріншісі."""
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            sockets = []
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+
+
+def test_updates_are_routed_to_the_chat_owner():
+    received = {0: [], 1: []}
+    public, internal = free_ports(2), free_ports(2)
+
+    def make_server(index):
+        async def handler(raw):
+            received[index].append(update_chat_id(raw))
+
+        return WebhookServer(handler, "/hook", "127.0.0.1", public + index, worker_index=index, workers=2,
+                             internal_port=internal, secret="s3cret")
+
+    async def scenario():
+        servers = [make_server(0), make_server(1)]
+        for server in servers:
+            await server.start()
+        try:
+            async with ClientSession() as session:
+                for chat_id in (4, 3, 5):  # Барлығы 0-жұмысшыға түседі
+                    update = {"update_id": chat_id, "message": {"chat": {"id": chat_id}}}
+                    async with session.post(f"http://127.0.0.1:{public}/hook", json=update) as resp:
+                        assert resp.status == 200
+                async with session.post(f"http://127.0.0.1:{internal + 1}{INTERNAL_PATH}", json={},
+                                        headers={INTERNAL_SECRET_HEADER: "wrong"}) as resp:
+                    assert resp.status == 403
+                await servers[1].stop()  # Иесі қолжетімсіз: Telegram кейін қайта жіберуі үшін 503
+                servers.pop()
+                async with session.post(f"http://127.0.0.1:{public}/hook",
+                                        json={"update_id": 9, "message": {"chat": {"id": 7}}}) as resp:
+                    assert resp.status == 503
+        finally:
+            for server in servers:
+                await server.stop()
+
+    asyncio.run(scenario())
+    assert received == {0: [4], 1: [3, 5]}
@@ -0,0 +1,223 @@
+# StudyShareBot: кіріс жаңартуларды шектеу (token bucket), қайталанған callback-терді біріктіру және шығыс лимиті
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import CallbackQuery, Message
+
+from metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+BUCKET_IDLE_TTL = 600  # секунд, толық әрі қолданылмаған шелектер жадтан тазаланады
+PRUNE_EVERY = 1000  # әр N-ші сұраныста тазалау
+RECENT_CALLBACKS_LIMIT = 10000
+# Telegram шектеулері: жалпы ~30 хабарлама/с, бір чатқа ~1/с, топқа минутына 20
+TELEGRAM_GLOBAL_RATE = 30.0
+TELEGRAM_CHAT_RATE = 1.0
+TELEGRAM_GROUP_RATE = 20 / 60
+# Шығыс лимитіне жататын әдістер (AnswerCallbackQuery, GetFile т.б. шектелмейді)
+LIMITED_METHOD_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+THROTTLED_TEXT = "⏳ Тым жиі. Бір сәт күтіңіз."
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Токенді алдын ала алады (қарызға) және оны пайдалануға дейін күту керек уақытты қайтарады."""
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        return now - self.updated > BUCKET_IDLE_TTL and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """Кілт (пайдаланушы, чат) бойынша token bucket-тер жиыны; қолданылмайтын шелектер тазаланады."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._calls = 0
+
+    def bucket(self, key: Hashable, rate: Optional[float] = None) -> TokenBucket:
+        self._calls += 1
+        if self._calls % PRUNE_EVERY == 0:
+            now = time.monotonic()
+            for stale in [k for k, b in self._buckets.items() if b.idle(now)]:
+                del self._buckets[stale]
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate or self.rate, self.burst)
+        return bucket
+
+    def allow(self, key: Hashable) -> bool:
+        return self.bucket(key).try_acquire()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def _event_ids(event: Any) -> Tuple[Optional[int], Optional[int]]:
+    user = getattr(event, "from_user", None)
+    if isinstance(event, CallbackQuery):
+        chat = event.message.chat if event.message else None
+    else:
+        chat = getattr(event, "chat", None)
+    return (user.id if user else None), (chat.id if chat else None)
+
+
+def _is_upload(event: Any) -> bool:
+    # Файл жіберу шектелмейді: жүктеу кезегі (upload_scheduler) өзі әділ кезекпен тежейді
+    return isinstance(event, Message) and bool(event.document or event.photo or event.video or event.audio)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Сыртқы middleware (фильтрлерден бұрын): әр пайдаланушы мен чат үшін token bucket. Файлдар
+    бар хабарламалар шектелмейді (бір топ бірден 30 файл жібере алады).
+    Шектен асқан әр callback-ке қысқа ескерту беріледі (әйтпесе батырма "жүктелуде" күйінде
+    қалады), ал хабарламаларға шектеу кезеңінде бір рет қана жауап жіберіледі (әр артық
+    хабарламаға жауап беру шектеудің мәнін жояр еді). Бір пайдаланушының бірдей callback_data-сы
+    өңделіп жатқанда не өңделіп біткеннен кейін debounce секунд ішінде келген көшірмелері біріктіріледі:
+    пайдаланушы бірінші сұраныстың нәтижесін алады. (Webhook режимінде бір чаттың жаңартулары
+    ретімен өңделеді, сондықтан көшірме әдетте бірінші сұраныс аяқталғаннан кейін келеді.)
+    """
+
+    def __init__(self, user_rate: float = 1.0, user_burst: float = 5, chat_rate: float = 2.0, chat_burst: float = 10,
+                 debounce: float = 1.0, registry: Optional[MetricsRegistry] = None):
+        self.users = RateLimiter(user_rate, user_burst)
+        self.chats = RateLimiter(chat_rate, chat_burst)
+        self.debounce = debounce
+        self._in_flight: Set[Tuple[int, str]] = set()
+        self._recent: Dict[Tuple[int, str], float] = {}  # (пайдаланушы, data) -> өңдеу аяқталған уақыт
+        self._warned: Set[int] = set()  # Шектеу туралы хабарлама жіберілген пайдаланушылар (не чаттар)
+        self.throttled = registry.counter("throttled_updates_total", "Шектеуге түскен жаңартулар",
+                                          ("reason",)) if registry else None
+        self.coalesced = registry.counter("coalesced_callbacks_total",
+                                          "Өңделіп жатқан callback-тің біріктірілген көшірмелері") if registry else None
+
+    @staticmethod
+    async def _answer(event: Any, text: str):
+        if isinstance(event, (CallbackQuery, Message)):
+            try:
+                await event.answer(text)
+            except Exception as e:
+                logger.debug(f"Шектеу туралы жауап беру мүмкін болмады: {e}")
+
+    async def _reject(self, event: Any, reason: str, key: Optional[int]):
+        if self.throttled is not None:
+            self.throttled.inc(reason)
+        if isinstance(event, CallbackQuery):
+            await self._answer(event, THROTTLED_TEXT)
+        elif key not in self._warned:
+            if len(self._warned) >= RECENT_CALLBACKS_LIMIT:
+                self._warned.clear()  # Қайтып келмеген пайдаланушылар жинала бермеуі үшін
+            self._warned.add(key)
+            await self._answer(event, THROTTLED_TEXT)
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any,
+                       data: Dict[str, Any]) -> Any:
+        if _is_upload(event):
+            return await handler(event, data)
+        user_id, chat_id = _event_ids(event)
+        coalesce_key = None
+        if isinstance(event, CallbackQuery) and event.data and user_id is not None:
+            coalesce_key = (user_id, event.data)
+            finished = self._recent.get(coalesce_key)
+            if coalesce_key in self._in_flight or (finished is not None
+                                                   and time.monotonic() - finished < self.debounce):
+                if self.coalesced is not None:
+                    self.coalesced.inc()
+                await self._answer(event, "⏳ Өңделуде...")
+                return None
+        warn_key = user_id if user_id is not None else chat_id
+        if user_id is not None and not self.users.allow(user_id):
+            await self._reject(event, "user", warn_key)
+            return None
+        if chat_id is not None and chat_id != user_id and not self.chats.allow(chat_id):
+            await self._reject(event, "chat", warn_key)
+            return None
+        self._warned.discard(warn_key)  # Шектеу кезеңі аяқталды: келесі жолы қайта ескертеміз
+        if coalesce_key is None:
+            return await handler(event, data)
+        self._in_flight.add(coalesce_key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(coalesce_key)
+            self._remember(coalesce_key)
+
+    def _remember(self, key: Tuple[int, str]):
+        now = time.monotonic()
+        self._recent[key] = now
+        if len(self._recent) > RECENT_CALLBACKS_LIMIT:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < self.debounce}
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """
+    Bot сессиясының request middleware-і: жіберу әдістерін Telegram шектеулеріне сай жалпы және
+    чат бойынша token bucket арқылы өткізеді. Шектен асқан сұраныс қате алмайды - кезекте
+    (өз уақыт слотына дейін ұйықтап) күтеді, сондықтан 429 жауаптары сирейді.
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_rate: float = TELEGRAM_CHAT_RATE,
+                 group_rate: float = TELEGRAM_GROUP_RATE, chat_burst: float = 3,
+                 registry: Optional[MetricsRegistry] = None):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chats = RateLimiter(chat_rate, chat_burst)
+        self.group_rate = group_rate
+        self.waiting = 0
+        self.wait_seconds = registry.histogram("outbound_rate_wait_seconds", "Шығыс лимиті бойынша күту уақыты",
+                                               buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)) \
+            if registry else None
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]):
+        if type(method).__name__.startswith(LIMITED_METHOD_PREFIXES):
+            await self._wait_turn(getattr(method, "chat_id", None))
+        return await make_request(bot, method)
+
+    async def _wait_turn(self, chat_id: Any):
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            if chat_id is not None:
+                # Топтар мен арналар (теріс ID, @username) үшін лимит қатаңырақ
+                is_group = not isinstance(chat_id, int) or chat_id < 0
+                delay = self.chats.bucket(chat_id, self.group_rate if is_group else None).reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+            delay = self.global_bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting -= 1
+        if self.wait_seconds is not None:
+            self.wait_seconds.observe(time.monotonic() - started)
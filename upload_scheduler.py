@@ -0,0 +1,144 @@
+# StudyShareBot: пайдаланушы және жалпы деңгейдегі жүктеу шектеуі (әділ кезек, backpressure)
+import asyncio
+import time
+from collections import deque, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+
+class UploadQueueFull(Exception):
+    """Кезек толы: жаңа жүктеу қабылданбайды."""
+
+
+class _Waiter:
+    __slots__ = ("user_id", "future", "enqueued_at")
+
+    def __init__(self, user_id: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class UploadScheduler:
+    """
+    Бір уақытта орындалатын жүктемелерді шектейді: жалпы max_active және әр пайдаланушыға
+    per_user. Күтушілер пайдаланушылар бойынша round-robin тәртібімен шығарылады, сондықтан
+    30 файл жіберген пайдаланушы басқаларды бітеп тастамайды. Кезек max_queue-мен шектелген.
+    """
+
+    def __init__(self, max_active: int = 4, per_user: int = 1, max_queue: int = 100):
+        self.max_active = max_active
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self._active_total = 0
+        self._active_by_user: Dict[int, int] = {}
+        # user_id -> күтушілер; OrderedDict реті round-robin айналымын береді
+        self._waiting: "OrderedDict[int, Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        # Метрикалар
+        self.total_started = 0
+        self.total_rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    # --- Метрикалар ---
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active_total
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self._queued,
+            "active": self._active_total,
+            "started_total": self.total_started,
+            "rejected_total": self.total_rejected,
+            "avg_wait_seconds": self.total_wait_seconds / self.total_started if self.total_started else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    # --- Ішкі логика ---
+    def _can_start(self, user_id: int) -> bool:
+        return self._active_total < self.max_active and self._active_by_user.get(user_id, 0) < self.per_user
+
+    def _start(self, user_id: int, waited: float = 0.0):
+        self._active_total += 1
+        self._active_by_user[user_id] = self._active_by_user.get(user_id, 0) + 1
+        self.total_started += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def _release(self, user_id: int):
+        self._active_total -= 1
+        remaining = self._active_by_user.get(user_id, 1) - 1
+        if remaining > 0:
+            self._active_by_user[user_id] = remaining
+        else:
+            self._active_by_user.pop(user_id, None)
+        self._wake_next()
+
+    def _wake_next(self):
+        # Round-robin: бірінші сәйкес пайдаланушының күтушісін іске қосып, оны айналым соңына жылжыту
+        for user_id in list(self._waiting):
+            if self._active_total >= self.max_active:
+                return
+            if not self._can_start(user_id):
+                continue
+            waiters = self._waiting[user_id]
+            waiter = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting.move_to_end(user_id)
+            else:
+                del self._waiting[user_id]
+            if waiter.future.done():  # Болдырылмаған күтуші
+                continue
+            self._start(user_id, time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def position(self, user_id: int) -> int:
+        """Пайдаланушының соңғы күтушісінің кезектегі шамамен орны (round-robin бойынша)."""
+        own = len(self._waiting.get(user_id, ())) or 1
+        return sum(min(len(waiters), own) for waiters in self._waiting.values())
+
+    def _drop_waiter(self, waiter: _Waiter):
+        waiters = self._waiting.get(waiter.user_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del self._waiting[waiter.user_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+        """
+        Жүктеу орнын алу. Бос орын болмаса, күтеді; күту басталғанда on_queued(позиция)
+        шақырылады. Кезек толы болса, UploadQueueFull көтеріледі.
+        """
+        # Күтушілер тек лимитке тірелгенде ғана болады, сондықтан бос орын болса бірден бастаймыз
+        if self._can_start(user_id):
+            self._start(user_id)
+        else:
+            if self._queued >= self.max_queue:
+                self.total_rejected += 1
+                raise UploadQueueFull()
+            waiter = _Waiter(user_id, asyncio.get_running_loop().create_future())
+            self._waiting.setdefault(user_id, deque()).append(waiter)
+            self._queued += 1
+            try:
+                if on_queued is not None:
+                    await on_queued(self.position(user_id))
+                await waiter.future
+            except BaseException:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release(user_id)  # Орын берілгеннен кейін болдырылды
+                else:
+                    self._drop_waiter(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(user_id)
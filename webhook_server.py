@@ -0,0 +1,244 @@
+# StudyShareBot: көп процесті webhook сервері (SO_REUSEPORT) және чат бойынша реттелген жаңартулар кезегі
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import socket
+import time
+from collections import deque
+from multiprocessing.connection import wait as wait_processes
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Sequence, Tuple
+
+from aiohttp import web, ClientError, ClientSession, ClientTimeout
+
+logger = logging.getLogger(__name__)
+
+REUSE_PORT_SUPPORTED = hasattr(socket, "SO_REUSEPORT")
+INTERNAL_PATH = "/internal/update"
+INTERNAL_SECRET_HEADER = "X-StudyShare-Worker-Secret"
+FORWARD_TIMEOUT = 10
+SHUTDOWN_DRAIN_TIMEOUT = 30
+WORKER_RESTART_DELAY = 1
+
+
+def update_chat_id(raw: Dict[str, Any]) -> int:
+    """
+    Жаңартудың чат (болмаса пайдаланушы) ID-сы; Update моделін құрмай-ақ шикі JSON-нан алынады.
+    Екеуі де жоқ жаңартулар (мысалы, poll) update_id бойынша жұмысшылар мен тізбектерге таралады:
+    әйтпесе олардың бәрі 0-тізбекте бір жұмысшыда кезекке тұрар еді.
+    """
+    for key, value in raw.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return user["id"]
+    return raw.get("update_id", 0)
+
+
+class UpdateFanout:
+    """
+    Жаңартуларды шектелген ішкі кезекке қабылдап, фонда өңдейді. Әр чаттың жаңартулары
+    өз тізбегінде келген ретімен орындалады, ал әртүрлі чаттар бір-бірін күтпейді.
+    Кезек толы болса, submit() False қайтарады (Telegram жаңартуды кейін қайта жібереді).
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]], max_pending: int = 1000):
+        self.handler = handler
+        self.max_pending = max_pending
+        self._chains: Dict[int, Deque[Dict[str, Any]]] = {}
+        self._tasks = set()
+        self._pending = 0
+        # Метрикалар
+        self.total_processed = 0
+        self.total_rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._pending,
+            "active_chats": len(self._chains),
+            "processed_total": self.total_processed,
+            "rejected_total": self.total_rejected,
+        }
+
+    def submit(self, chat_id: int, raw: Dict[str, Any]) -> bool:
+        if self._pending >= self.max_pending:
+            self.total_rejected += 1
+            return False
+        self._pending += 1
+        chain = self._chains.get(chat_id)
+        if chain is not None:
+            chain.append(raw)  # Чат тізбегі әлі өңделуде: ретімен кейін орындалады
+            return True
+        self._chains[chat_id] = deque([raw])
+        task = asyncio.create_task(self._drain(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _drain(self, chat_id: int):
+        chain = self._chains[chat_id]
+        try:
+            while chain:
+                try:
+                    await self.handler(chain[0])
+                except Exception as e:
+                    logger.error(f"Жаңартуды өңдеу қатесі (чат {chat_id}): {e}", exc_info=True)
+                finally:
+                    chain.popleft()
+                    self._pending -= 1
+                    self.total_processed += 1
+        finally:
+            self._pending -= len(chain)
+            del self._chains[chat_id]
+
+    async def stop(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        """Кезектегі жаңартуларды өңдеп бітіруге timeout секунд береді, қалғанын тоқтатады."""
+        if not self._tasks:
+            return
+        _, still_running = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            logger.warning(f"Webhook кезегі: {len(still_running)} чаттың жаңартулары өңделмей қалды")
+            await asyncio.gather(*still_running, return_exceptions=True)
+
+
+class WebhookServer:
+    """
+    Бір жұмысшы процестің aiohttp сервері. Жаңартуды қабылдағаннан кейін Telegram-ға бірден
+    200 қайтарылады, өңдеу UpdateFanout-та жүреді. Бірнеше жұмысшы болса, барлығы бір портты
+    SO_REUSEPORT арқылы тыңдайды, ал әр чаттың "иесі" - chat_id % workers нөмірлі жұмысшы:
+    басқа жұмысшыға түскен жаңарту иесіне ішкі loopback порты арқылы жіберіледі, сондықтан
+    бір чаттың жаңартулары әрқашан бір процесте ретімен өңделеді.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]], path: str, host: str, port: int,
+                 worker_index: int = 0, workers: int = 1, internal_port: int = 18443, secret: str = "",
+                 max_pending: int = 1000, extra_routes: Sequence[Tuple[str, Callable]] = ()):
+        self.path = path
+        self.extra_routes = list(extra_routes)  # Қосымша GET маршруттары (мысалы, /metrics)
+        self.host = host
+        self.port = port
+        self.worker_index = worker_index
+        self.workers = max(1, workers)
+        self.internal_port = internal_port
+        self.secret = secret
+        self.fanout = UpdateFanout(handler, max_pending=max_pending)
+        self._runners = []
+        self._session: Optional[ClientSession] = None
+
+    def _accept(self, chat_id: int, raw: Dict[str, Any]) -> web.Response:
+        if not self.fanout.submit(chat_id, raw):
+            # 503: Telegram жаңартуды кейінірек қайта жібереді
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _handle_public(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        try:
+            raw = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        chat_id = update_chat_id(raw)
+        owner = chat_id % self.workers
+        if owner == self.worker_index:
+            return self._accept(chat_id, raw)
+        return await self._forward(owner, body)
+
+    async def _handle_internal(self, request: web.Request) -> web.Response:
+        if request.headers.get(INTERNAL_SECRET_HEADER) != self.secret:
+            return web.Response(status=403)
+        raw = await request.json()
+        return self._accept(update_chat_id(raw), raw)
+
+    async def _forward(self, owner: int, body: bytes) -> web.Response:
+        url = f"http://127.0.0.1:{self.internal_port + owner}{INTERNAL_PATH}"
+        try:
+            async with self._session.post(url, data=body, headers={INTERNAL_SECRET_HEADER: self.secret,
+                                                                   "Content-Type": "application/json"}) as resp:
+                return web.Response(status=resp.status)
+        except (ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Жаңартуды {owner}-жұмысшыға жіберу мүмкін болмады: {e}")
+            return web.Response(status=503)
+
+    async def _start_site(self, app: web.Application, host: str, port: int, reuse_port: bool):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host=host, port=port, reuse_port=reuse_port or None)
+        await site.start()
+        self._runners.append(runner)
+
+    async def start(self):
+        public_app = web.Application()
+        public_app.router.add_post(self.path, self._handle_public)
+        for route_path, route_handler in self.extra_routes:
+            public_app.router.add_get(route_path, route_handler)
+        await self._start_site(public_app, self.host, self.port, reuse_port=self.workers > 1)
+        if self.workers > 1:
+            internal_app = web.Application()
+            internal_app.router.add_post(INTERNAL_PATH, self._handle_internal)
+            await self._start_site(internal_app, "127.0.0.1", self.internal_port + self.worker_index, False)
+            self._session = ClientSession(timeout=ClientTimeout(total=FORWARD_TIMEOUT))
+        logger.info(f"Webhook жұмысшысы {self.worker_index + 1}/{self.workers} іске қосылды: {self.host}:{self.port}")
+
+    async def stop(self):
+        # Алдымен жаңа жаңартуларды қабылдауды тоқтатып, содан кейін кезекті өңдеп бітіреміз
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners = []
+        await self.fanout.stop()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def run_workers(target: Callable[..., Any], workers: int, *args):
+    """
+    target(worker_index, *args) функциясын workers жеке процесте іске қосып, оларды бақылайды:
+    күтпеген жерден тоқтаған жұмысшы қайта іске қосылады, SIGTERM/SIGINT барлығын тоқтатады.
+    Процестер "spawn" әдісімен жасалады: SQLite қосылымдары мен event loop fork арқылы мұраланбайды.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    processes: Dict[int, multiprocessing.Process] = {}
+    stopping = False
+
+    def start_worker(index: int):
+        process = ctx.Process(target=target, args=(index, *args), name=f"webhook-{index}")
+        process.start()
+        processes[index] = process
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    for index in range(workers):
+        start_worker(index)
+    try:
+        while processes:
+            wait_processes([p.sentinel for p in processes.values()])
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                del processes[index]
+                if not stopping:
+                    logger.error(f"Webhook жұмысшысы {index} тоқтап қалды (код {process.exitcode}), қайта іске қосылуда")
+                    time.sleep(WORKER_RESTART_DELAY)
+                    start_worker(index)
+    except KeyboardInterrupt:
+        # SIGINT барлық процестер тобына жіберіледі: жұмысшылар өздері тоқтайды
+        stopping = True
+        for process in processes.values():
+            process.join()